@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Backfill Histórico - Kommo Analytics
+Divide um período longo em blocos de datas (--chunk=7d) e roda o
+extract/transform/load de cada módulo por bloco, em paralelo (--workers).
+Todas as threads compartilham o token bucket da conta, então o limite da
+API do Kommo vale para o backfill inteiro. Cada bloco concluído é gravado em
+etl_backfill_ledger: um backfill interrompido retoma de onde parou.
+
+Uso:
+    python backfill_etls.py --from 2025-01-01 --to 2025-12-31 --chunk=7d --workers=3
+"""
+
+import os
+import re
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import mysql.connector
+from dotenv import load_dotenv
+
+# Permitir importar os módulos ETL
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'ETL'))
+LOG_DIR = os.path.join(PROJECT_ROOT, 'LOGS')
+
+from kommo_etl_modulo1_leads import KommoLeadsETL
+from kommo_etl_modulo2_funil import KommoFunnelETL
+from kommo_etl_modulo3_atividades import KommoActivityETL
+from kommo_etl_modulo4_conversao import KommoConversionETL
+from kommo_etl_rollup_dashboard import KommoDashboardRollupETL
+
+load_dotenv()
+
+# Configurar logging
+os.makedirs(LOG_DIR, exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(LOG_DIR, 'etl_backfill.log')),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Módulos com período explícito: (classe, execução de um bloco [início, fim]).
+# Os módulos 5 e 6 calculam janelas móveis a partir de hoje e não têm backfill;
+# o rollup do dashboard roda por bloco depois que os módulos de API do bloco terminam
+BACKFILL_MODULES = {
+    'modulo1_leads': (KommoLeadsETL, lambda etl, start, end: etl.run_backfill_chunk(start, end)),
+    'modulo2_funil': (KommoFunnelETL, lambda etl, start, end: etl.run_etl(start, end)),
+    'modulo3_atividades': (KommoActivityETL, lambda etl, start, end: etl.run_etl(start, end)),
+    'modulo4_conversao': (KommoConversionETL, lambda etl, start, end: etl.run_etl(start, end)),
+}
+ROLLUP_MODULE = 'rollup_dashboard'
+
+LEDGER_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS etl_backfill_ledger (
+    module VARCHAR(50) NOT NULL,
+    chunk_start DATE NOT NULL,
+    chunk_end DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    attempts INT DEFAULT 0,
+    started_at DATETIME,
+    finished_at DATETIME,
+    duration_seconds DECIMAL(10,1),
+    error TEXT,
+    PRIMARY KEY (module, chunk_start, chunk_end)
+)
+"""
+
+
+def parse_chunk(value: str) -> int:
+    """'7d', '2w' ou '10' -> tamanho do bloco em dias"""
+    match = re.fullmatch(r'(\d+)\s*([dw]?)', value.strip().lower())
+    if not match or int(match.group(1)) < 1:
+        raise argparse.ArgumentTypeError(f"Bloco inválido: {value} (use, por exemplo, 7d ou 2w)")
+    days = int(match.group(1))
+    return days * 7 if match.group(2) == 'w' else days
+
+
+def parse_day(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Data inválida: {value} (formato AAAA-MM-DD)")
+
+
+def split_chunks(start_day: datetime, end_day: datetime, chunk_days: int):
+    """Blocos [início 00:00:00, fim 23:59:59] consecutivos cobrindo o período"""
+    chunks = []
+    chunk_start = start_day.replace(hour=0, minute=0, second=0, microsecond=0)
+    while chunk_start.date() <= end_day.date():
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_day)
+        chunks.append((chunk_start, chunk_end.replace(hour=23, minute=59, second=59, microsecond=0)))
+        chunk_start += timedelta(days=chunk_days)
+    return chunks
+
+
+class BackfillRunner:
+    def __init__(self, modules: list, chunks: list, workers: int = 2, force: bool = False):
+        self.db_config = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': int(os.getenv('DB_PORT', 3306)),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('DB_PASSWORD'),
+            'database': os.getenv('DB_NAME', 'kommo_analytics')
+        }
+        self.modules = modules
+        self.chunks = chunks
+        self.workers = workers
+        self.force = force
+
+        # Extração estrita nos clientes dos módulos: paginação que falha faz o bloco
+        # falhar (e ser retomado) em vez de ser gravado como 'done' com dados parciais
+        os.environ['KOMMO_STRICT_EXTRACTION'] = 'true'
+
+    def ensure_ledger_table(self):
+        connection = mysql.connector.connect(**self.db_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(LEDGER_TABLE_DDL)
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
+
+    def completed_chunks(self) -> set:
+        """(módulo, início, fim) dos blocos já concluídos em execuções anteriores"""
+        connection = mysql.connector.connect(**self.db_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT module, chunk_start, chunk_end FROM etl_backfill_ledger WHERE status = 'done'")
+            done = {(module, chunk_start, chunk_end) for module, chunk_start, chunk_end in cursor.fetchall()}
+            cursor.close()
+            return done
+        finally:
+            connection.close()
+
+    def record(self, module: str, chunk: tuple, status: str, duration: float = None, error: str = None):
+        """Gravar o estado do bloco no ledger (running -> done/failed)"""
+        chunk_start, chunk_end = chunk[0].date(), chunk[1].date()
+        connection = mysql.connector.connect(**self.db_config)
+        try:
+            cursor = connection.cursor()
+            if status == 'running':
+                cursor.execute("""
+                INSERT INTO etl_backfill_ledger (module, chunk_start, chunk_end, status, attempts, started_at)
+                VALUES (%s, %s, %s, 'running', 1, NOW())
+                ON DUPLICATE KEY UPDATE
+                    status = 'running',
+                    attempts = attempts + 1,
+                    started_at = NOW(),
+                    finished_at = NULL,
+                    error = NULL
+                """, (module, chunk_start, chunk_end))
+            else:
+                cursor.execute("""
+                UPDATE etl_backfill_ledger
+                SET status = %s, finished_at = NOW(), duration_seconds = %s, error = %s
+                WHERE module = %s AND chunk_start = %s AND chunk_end = %s
+                """, (status, duration, error, module, chunk_start, chunk_end))
+            connection.commit()
+            cursor.close()
+        finally:
+            connection.close()
+
+    def run_chunk(self, module: str, chunk: tuple) -> bool:
+        """Executar um módulo em um bloco (roda em uma thread do pool, com instância própria)"""
+        self.record(module, chunk, 'running')
+        label = f"{module} [{chunk[0].date()} → {chunk[1].date()}]"
+        logger.info(f"🚀 {label}")
+
+        start = time.perf_counter()
+        try:
+            if module == ROLLUP_MODULE:
+                KommoDashboardRollupETL().run_etl(*chunk)
+            else:
+                etl_class, run = BACKFILL_MODULES[module]
+                run(etl_class(), *chunk)
+        except Exception as e:
+            duration = round(time.perf_counter() - start, 1)
+            self.record(module, chunk, 'failed', duration, str(e)[:2000])
+            logger.error(f"❌ {label}: {e}")
+            return False
+
+        duration = round(time.perf_counter() - start, 1)
+        self.record(module, chunk, 'done', duration)
+        logger.info(f"✅ {label} em {duration}s")
+        return True
+
+    def run_pending(self, jobs: list, done: set) -> dict:
+        """Executar os blocos ainda não concluídos em paralelo; retorna {(módulo, bloco): sucesso}"""
+        pending = [
+            (module, chunk) for module, chunk in jobs
+            if self.force or (module, chunk[0].date(), chunk[1].date()) not in done
+        ]
+        skipped = len(jobs) - len(pending)
+        if skipped:
+            logger.info(f"⏭️ {skipped} bloco(s) já concluídos no ledger")
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='backfill') as executor:
+            futures = {executor.submit(self.run_chunk, module, chunk): (module, chunk) for module, chunk in pending}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+        return results
+
+    def run(self) -> bool:
+        started = time.perf_counter()
+        logger.info("⏪ ======== INICIANDO BACKFILL HISTÓRICO ========")
+        logger.info(f"📅 {self.chunks[0][0].date()} até {self.chunks[-1][1].date()} | "
+                    f"{len(self.chunks)} bloco(s) | {len(self.modules)} módulo(s) | {self.workers} workers")
+
+        self.ensure_ledger_table()
+        done = self.completed_chunks()
+
+        # Blocos mais antigos primeiro, alternando módulos entre os workers
+        api_modules = [module for module in self.modules if module in BACKFILL_MODULES]
+        results = self.run_pending([(module, chunk) for chunk in self.chunks for module in api_modules], done)
+
+        # Rollup só dos blocos cujos módulos de API estão todos concluídos
+        if ROLLUP_MODULE in self.modules:
+            done = self.completed_chunks()
+            ready = [
+                chunk for chunk in self.chunks
+                if all((module, chunk[0].date(), chunk[1].date()) in done for module in api_modules)
+            ]
+            if len(ready) < len(self.chunks):
+                logger.warning(f"⚠️ Rollup pulado em {len(self.chunks) - len(ready)} bloco(s) com módulos pendentes")
+            results.update(self.run_pending([(ROLLUP_MODULE, chunk) for chunk in ready], done))
+
+        failed = [f"{module} {chunk[0].date()}" for (module, chunk), ok in results.items() if not ok]
+        logger.info(f"📊 Backfill: {len(results) - len(failed)}/{len(results)} bloco(s) executados com sucesso "
+                    f"em {round(time.perf_counter() - started, 1)}s")
+        if failed:
+            logger.error(f"❌ Blocos com falha (serão retomados na próxima execução): {', '.join(sorted(failed))}")
+        return not failed
+
+
+def main():
+    all_modules = list(BACKFILL_MODULES) + [ROLLUP_MODULE]
+
+    parser = argparse.ArgumentParser(description='Backfill histórico dos ETLs em blocos de datas, com retomada')
+    parser.add_argument('--from', dest='start', type=parse_day, required=True, help='Primeiro dia (AAAA-MM-DD)')
+    parser.add_argument('--to', dest='end', type=parse_day, required=True, help='Último dia (AAAA-MM-DD)')
+    parser.add_argument('--chunk', type=parse_chunk, default=7, help='Tamanho do bloco: 7d, 2w... (padrão 7d)')
+    parser.add_argument('--workers', type=int, default=2, help='Blocos executados em paralelo')
+    parser.add_argument('--modules', nargs='+', choices=all_modules, default=all_modules,
+                        help='Módulos do backfill (padrão: todos com período explícito e o rollup)')
+    parser.add_argument('--force', action='store_true', help='Reexecutar também os blocos já concluídos no ledger')
+    args = parser.parse_args()
+
+    if args.end < args.start:
+        parser.error('--to deve ser igual ou posterior a --from')
+
+    runner = BackfillRunner(
+        modules=args.modules,
+        chunks=split_chunks(args.start, args.end, args.chunk),
+        workers=max(1, args.workers),
+        force=args.force
+    )
+    sys.exit(0 if runner.run() else 1)
+
+
+if __name__ == "__main__":
+    main()
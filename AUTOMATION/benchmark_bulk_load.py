@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Benchmark da Carga em Lote - Kommo Analytics
+Compara a montagem das tuplas com DataFrame.iterrows() (antes) com a conversão
+vetorizada em blocos do bulk_loader (depois) em um DataFrame de leads sintético
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# Permitir importar os módulos ETL
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'ETL'))
+
+from bulk_loader import frame_to_rows, iter_row_chunks
+
+# Mesmas colunas de KommoLeadsETL.load_to_database
+LEADS_COLUMNS = [
+    ('lead_id', 'int', None),
+    ('created_date', 'raw', None),
+    ('created_datetime', 'raw', None),
+    ('primary_source', 'raw', None),
+    ('utm_source', 'raw', None),
+    ('utm_medium', 'raw', None),
+    ('utm_campaign', 'raw', None),
+    ('utm_content', 'raw', None),
+    ('utm_term', 'raw', None),
+    ('utm_referrer', 'raw', None),
+    ('referrer', 'raw', None),
+    ('lead_source_field', 'raw', None),
+    ('gclid', 'raw', None),
+    ('fbclid', 'raw', None),
+    ('gclientid', 'raw', None),
+    ('detailed_source', 'raw', None),
+    ('lead_value', 'float', 0),
+    ('lead_cost', 'float', None),
+    ('response_time_hours', 'float', None),
+    ('pipeline_id', 'int', None),
+    ('status_id', 'int', None),
+    ('responsible_user_id', 'int', None),
+    ('contact_count', 'int', 0),
+    ('updated_at', 'raw', None)
+]
+
+
+def generate_leads_frame(total: int, seed: int = 42) -> pd.DataFrame:
+    """Gera um DataFrame no formato de saída de transform_leads_data"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    sources = ['Google Ads', 'Meta Ads', 'Instagram', 'Website Direto', 'Origem Não Especificada']
+
+    records = []
+    for i in range(total):
+        created = now - timedelta(hours=rng.randint(0, 24 * 90))
+        source = rng.choice(sources)
+        records.append({
+            'lead_id': 10_000_000 + i,
+            'created_date': created.date(),
+            'created_datetime': created,
+            'primary_source': source,
+            'utm_source': rng.choice(['google', 'facebook', None]),
+            'utm_medium': rng.choice(['cpc', 'social', None]),
+            'utm_campaign': rng.choice([f'campanha_{rng.randint(1, 20)}', None]),
+            'utm_content': None,
+            'utm_term': None,
+            'utm_referrer': None,
+            'referrer': rng.choice(['https://google.com', None]),
+            'lead_source_field': rng.choice(['Instagram', 'Indicação', None]),
+            'gclid': rng.choice([f'gclid{i}', None]),
+            'fbclid': None,
+            'gclientid': None,
+            'detailed_source': source,
+            'lead_value': rng.choice([0, 500.0, 1500.0]),
+            'lead_cost': rng.choice([None, 35.0, 50.0]),
+            'response_time_hours': rng.choice([None, round(rng.uniform(0, 48), 2)]),
+            'pipeline_id': rng.choice([11146887, 11435023, None]),
+            'status_id': rng.randint(1, 10),
+            'responsible_user_id': rng.choice([rng.randint(1, 15), None]),
+            'contact_count': rng.randint(0, 3),
+            'updated_at': now
+        })
+
+    return pd.DataFrame(records)
+
+
+def iterrows_rows(df: pd.DataFrame):
+    """Montagem antiga das tuplas (cópia do loop de load_to_database)"""
+    data_to_insert = []
+    for _, row in df.iterrows():
+        data_to_insert.append((
+            int(row['lead_id']),
+            row['created_date'],
+            row['created_datetime'],
+            row['primary_source'],
+            row['utm_source'],
+            row['utm_medium'],
+            row['utm_campaign'],
+            row['utm_content'],
+            row['utm_term'],
+            row['utm_referrer'],
+            row['referrer'],
+            row['lead_source_field'],
+            row['gclid'],
+            row['fbclid'],
+            row['gclientid'],
+            row['detailed_source'],
+            float(row['lead_value']) if pd.notna(row['lead_value']) else 0,
+            float(row['lead_cost']) if pd.notna(row['lead_cost']) else None,
+            float(row['response_time_hours']) if pd.notna(row['response_time_hours']) else None,
+            int(row['pipeline_id']) if pd.notna(row['pipeline_id']) else None,
+            int(row['status_id']) if pd.notna(row['status_id']) else None,
+            int(row['responsible_user_id']) if pd.notna(row['responsible_user_id']) else None,
+            int(row['contact_count']) if pd.notna(row['contact_count']) else 0,
+            row['updated_at']
+        ))
+    return data_to_insert
+
+
+def normalize(value):
+    """NaN/NaT do caminho antigo equivalem a NULL"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def measure(label: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"   {label:<34} {elapsed:8.2f}s  pico {peak / 1024 / 1024:8.1f} MB")
+    return result, elapsed
+
+
+def run_benchmark(total: int, chunk_size: int):
+    df = generate_leads_frame(total)
+
+    print(f"\n📊 BENCHMARK CARGA - montagem das linhas de leads_metrics ({total} linhas)")
+    print("=" * 70)
+
+    old_rows, old_time = measure('iterrows (antes)', lambda: iterrows_rows(df))
+    new_rows, new_time = measure('vetorizado, tudo de uma vez', lambda: frame_to_rows(df, LEADS_COLUMNS))
+
+    def consume_chunks():
+        count = 0
+        for rows in iter_row_chunks(df, LEADS_COLUMNS, chunk_size):
+            count += len(rows)
+        return count
+
+    measure(f'vetorizado em blocos de {chunk_size}', consume_chunks)
+
+    if new_time > 0:
+        print(f"   🚀 Ganho: {old_time / new_time:.1f}x")
+
+    mismatches = sum(
+        1 for old, new in zip(old_rows, new_rows)
+        if tuple(normalize(value) for value in old) != tuple(normalize(value) for value in new)
+    )
+    if mismatches or len(old_rows) != len(new_rows):
+        print(f"❌ {mismatches} linhas divergentes entre iterrows e bulk_loader")
+        sys.exit(1)
+    print(f"✅ {len(new_rows)} linhas idênticas ao caminho antigo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da montagem das linhas para carga em lote')
+    parser.add_argument('--rows', type=int, default=100000, help='Quantidade de linhas sintéticas')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Linhas por bloco')
+    args = parser.parse_args()
+
+    run_benchmark(args.rows, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
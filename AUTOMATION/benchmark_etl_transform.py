@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Benchmark das Transformações dos ETLs - Kommo Analytics
+Mede a vazão (leads/segundo) das etapas de transformação com dados sintéticos
+e confere a classificação de atividades contra o arquivo golden
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict
+
+# Permitir importar os módulos ETL
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'ETL'))
+
+from kommo_etl_modulo1_leads import KommoLeadsETL
+from kommo_etl_modulo3_atividades import KommoActivityETL
+from kommo_etl_modulo4_conversao import KommoConversionETL
+from activity_classifier import ACTIVITY_CLASSIFIER
+
+GOLDEN_DIR = os.path.join(PROJECT_ROOT, 'AUTOMATION', 'golden')
+ACTIVITY_GOLDEN_FILE = os.path.join(GOLDEN_DIR, 'activity_classification_golden.jsonl')
+
+# Vocabulário das tarefas sintéticas: palavras-chave dos classificadores + ruído
+ACTIVITY_VOCABULARY = [
+    'ligar', 'Ligar', 'telefonar', 'call', 'telefone', 'contato telefônico', 'chamar', 'contatar',
+    'falar com', 'conversar com', 'reunião', 'Reunião', 'meeting', 'apresentação', 'demo',
+    'email', 'e-mail', 'enviar', 'whatsapp', 'wpp', 'zap', 'mensagem', 'follow', 'follow up',
+    'follow-up', 'followup', 'FUP', 'fup', 'retorno', 'retornar', 'acompanhar', 'acompanhamento',
+    'acompanha', 'proposta', 'orçamento', 'contrato', 'cotação', 'demonstração', 'visita',
+    'venda', 'comercial', 'cliente', 'cliente potencial', 'negócio', 'negociação', 'prospecção',
+    'prospeção', 'prospectar', 'prospect', 'lead', 'verificar', 'verificar retorno', 'checar',
+    'confirmar', 'confirma', 'validar', 'lembrar', 'lembrar de', 'lembrete', 'agendar', 'marcar',
+    'no show', 'não compareceu', 'ausente', 'falta', 'cancelou', 'desmarcou', 'tentativa',
+    'tentativa de', 'segunda tentativa', 'terceira tentativa', 'tentar novamente', '1º', '2º',
+    'primeira', 'segunda', 'nurturing', 'nurture', 'cuidar', 're-engajamento', 'reengajamento',
+    're-engajar', 'recontato', 're-contato', 'novo contato', 'entrar em contato', 'fazer contato',
+    'dia', 'dias', 'semana', 'próximo', 'seguinte', 'atualizar', 'sms', 'whats',
+    'o', 'a', 'de', 'com', 'para', 'paciente', 'documentos', 'processo', 'INSS', 'benefício',
+    'amanhã', 'hoje', 'às', '14h', 'sr.', 'sra.', 'Maria', 'João', 'urgente', 'ok', ''
+]
+
+
+def generate_synthetic_activities(total: int, seed: int = 7, text_pool: int = 0):
+    """
+    Gera tarefas e notas sintéticas no formato usado pelo transform do Módulo 3.
+    Com text_pool > 0 os textos são sorteados de um conjunto fixo de frases,
+    simulando os textos padronizados que se repetem no CRM.
+    """
+    rng = random.Random(seed)
+    created_base = int(datetime(2025, 1, 1).timestamp())
+
+    def random_sentence():
+        return ' '.join(rng.choice(ACTIVITY_VOCABULARY) for _ in range(rng.randint(0, 8))).strip()
+
+    if text_pool:
+        pool = [random_sentence() for _ in range(text_pool)]
+
+        def sentence():
+            return rng.choice(pool)
+    else:
+        sentence = random_sentence
+
+    activities = []
+    for i in range(total):
+        created_at = created_base + rng.randint(0, 90 * 86400)
+        activities.append({
+            'id': i,
+            'task_type': rng.choice([None, 1, 2, 3, 4, 4, 4, 5, 6]),
+            'text': sentence(),
+            'note_text': sentence() if rng.random() < 0.3 else '',
+            'note': sentence() if rng.random() < 0.3 else '',
+            'tags': [rng.choice(['follow', 'FUP', 'vip', 'novo'])] if rng.random() < 0.2 else [],
+            'note_type': rng.choice(['common', 'email_out', 'follow_up', 'reminder', 'task_note']),
+            'params': {'text': sentence()} if rng.random() < 0.5 else {},
+            'type': rng.choice(['task_completed', 'outgoing_call', 'incoming_sms', 'note_added', 'lead_status_changed']),
+            'entity_id': rng.randint(1, 5000),
+            'created_at': created_at,
+            'complete_till': created_at + rng.randint(0, 40 * 86400) if rng.random() < 0.7 else None
+        })
+
+    return activities
+
+
+def classify_activity(etl, activity):
+    """Aplica todos os classificadores de texto do Módulo 3 a uma atividade"""
+    return {
+        'category': etl.categorize_task_activity(activity['task_type'], activity['text']),
+        'followup_type': etl._classify_followup_type(activity['text'], activity['note_text']),
+        'contact_task': etl.classify_contact_type(activity, 'task'),
+        'contact_note': etl.classify_contact_type(activity, 'note'),
+        'contact_event': etl.classify_contact_type(activity, 'event'),
+        'is_follow_up_task': etl.classify_follow_up_intelligent(activity, 'task'),
+        'is_follow_up_note': etl.classify_follow_up_intelligent(activity, 'note'),
+        'segment_task': etl.segment_follow_ups(activity, 'task'),
+        'segment_note': etl.segment_follow_ups(activity, 'note')
+    }
+
+
+def generate_activity_golden(total: int = 500):
+    """Grava as saídas atuais dos classificadores como referência (golden, 1 atividade por linha)"""
+    etl = KommoActivityETL()
+    activities = generate_synthetic_activities(total)
+    records = [{'input': activity, 'expected': classify_activity(etl, activity)} for activity in activities]
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(ACTIVITY_GOLDEN_FILE, 'w', encoding='utf-8') as golden:
+        for record in records:
+            golden.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    print(f"✅ Golden gravado: {ACTIVITY_GOLDEN_FILE} ({len(records)} atividades)")
+
+
+def verify_activity_golden() -> bool:
+    """Confere os classificadores atuais contra o arquivo golden"""
+    etl = KommoActivityETL()
+    with open(ACTIVITY_GOLDEN_FILE, encoding='utf-8') as golden:
+        records = [json.loads(line) for line in golden if line.strip()]
+
+    mismatches = 0
+    for record in records:
+        result = json.loads(json.dumps(classify_activity(etl, record['input'])))
+        if result != record['expected']:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"❌ Divergência na atividade {record['input']['id']}: {result} != {record['expected']}")
+
+    if mismatches:
+        print(f"❌ GOLDEN: {mismatches}/{len(records)} atividades divergentes")
+        return False
+
+    print(f"✅ GOLDEN: {len(records)} atividades idênticas à referência")
+    return True
+
+
+def benchmark_activity_classifier(total: int):
+    """Mede a vazão dos classificadores de texto do Módulo 3"""
+    etl = KommoActivityETL()
+
+    print(f"\n📊 BENCHMARK MÓDULO 3 - classificadores de texto ({total} tarefas)")
+    print("=" * 60)
+
+    scenarios = [
+        ('textos únicos', 0),
+        ('textos repetidos (2000 frases)', 2000),
+    ]
+    for label, text_pool in scenarios:
+        activities = generate_synthetic_activities(total, seed=11, text_pool=text_pool)
+        ACTIVITY_CLASSIFIER.cache_clear()
+
+        start = time.perf_counter()
+        for activity in activities:
+            classify_activity(etl, activity)
+        elapsed = time.perf_counter() - start
+
+        rate = total / elapsed if elapsed > 0 else 0
+        cache = ACTIVITY_CLASSIFIER.cache_info()
+        hit_rate = cache.hits / (cache.hits + cache.misses) * 100 if cache.hits + cache.misses else 0
+        print(f"   {label:<32} {elapsed:8.2f}s  {rate:10.1f} tarefas/s  (cache {hit_rate:.0f}%)")
+
+
+def generate_synthetic_leads(total: int, seed: int = 42):
+    """Gera leads sintéticos no formato da API do Kommo"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    sources = ['google', 'facebook', 'instagram', 'linkedin', 'email', '']
+    mediums = ['cpc', 'social', 'organic', 'email', '']
+    pipelines = [11146887, 11435023, 11386583, 11730455]
+
+    leads = []
+    for i in range(total):
+        created_at = now - timedelta(hours=rng.randint(0, 24 * 30))
+        custom_fields = []
+        source = rng.choice(sources)
+        if source:
+            custom_fields.append({'field_id': 47286, 'field_name': 'utm_source', 'values': [{'value': source}]})
+            custom_fields.append({'field_id': 47282, 'field_name': 'utm_medium', 'values': [{'value': rng.choice(mediums)}]})
+            custom_fields.append({'field_id': 47284, 'field_name': 'utm_campaign', 'values': [{'value': f'campanha_{rng.randint(1, 20)}'}]})
+
+        leads.append({
+            'id': 10_000_000 + i,
+            'created_at': int(created_at.timestamp()),
+            'price': rng.choice([0, 500, 1500, 3000]),
+            'pipeline_id': rng.choice(pipelines),
+            'status_id': rng.randint(1, 10),
+            'responsible_user_id': rng.randint(1, 15),
+            'custom_fields_values': custom_fields,
+            '_embedded': {'contacts': [{'id': i}]}
+        })
+
+    return {'contacts': [], 'leads': leads, 'events': []}
+
+
+def benchmark_leads_transform(total: int):
+    """Compara transform_leads_data com busca por lead vs. busca em lote"""
+    etl = KommoLeadsETL()
+    raw_data = generate_synthetic_leads(total)
+
+    print(f"\n📊 BENCHMARK MÓDULO 1 - transform_leads_data ({total} leads)")
+    print("=" * 60)
+
+    results = {}
+    for label, batch in [('antes (1 query por lead)', False), ('depois (lote)', True)]:
+        start = time.perf_counter()
+        df = etl.transform_leads_data(raw_data, batch_response_time=batch)
+        elapsed = time.perf_counter() - start
+        rate = len(df) / elapsed if elapsed > 0 else 0
+        results[label] = rate
+        print(f"   {label:<28} {elapsed:8.2f}s  {rate:10.1f} leads/s")
+
+    before, after = results.values()
+    if before > 0:
+        print(f"   🚀 Ganho: {after / before:.1f}x")
+
+    cache = etl.get_source_cache_stats()
+    print(f"   🧠 Cache de origem: {cache['hits']} acertos | {cache['misses']} erros | "
+          f"{cache['size']} assinaturas | {cache['hit_rate']}% de acerto")
+
+
+# Status sintéticos do Módulo 4: id -> (nome, tipo)
+CONVERSION_STATUSES = {
+    1: ('Leads de entrada', 'lead'),
+    2: ('Qualificado', 'qualified'),
+    3: ('Reunião', 'meeting'),
+    4: ('Proposta', 'proposal'),
+    5: ('Negociação', 'negotiation'),
+    142: ('Venda ganha', 'won'),
+    143: ('Venda perdida', 'lost'),
+}
+
+
+def generate_synthetic_conversions(total: int, events_per_lead: int = 6, seed: int = 3):
+    """Gera leads e eventos lead_status_changed no formato da API (ordem dos eventos embaralhada)"""
+    rng = random.Random(seed)
+    created_base = int(datetime(2025, 1, 1).timestamp())
+    status_ids = list(CONVERSION_STATUSES)
+
+    leads, status_changes = [], []
+    for i in range(total):
+        lead_id = 20_000_000 + i
+        created_at = created_base + rng.randint(0, 60 * 86400)
+        updated_at = created_at + rng.randint(0, 60 * 86400)
+        leads.append({
+            'id': lead_id,
+            'status_id': rng.choice(status_ids),
+            'pipeline_id': 11146887,
+            'price': rng.choice([0, 1500, 3000]),
+            'responsible_user_id': rng.randint(1, 15),
+            'created_at': created_at,
+            'updated_at': updated_at,
+            '_embedded': {'contacts': [{'id': i}]}
+        })
+        for _ in range(rng.randint(0, events_per_lead * 2)):
+            value_after = [{'lead_status': {'id': rng.choice(status_ids), 'pipeline_id': 11146887}}]
+            status_changes.append({
+                'entity_id': lead_id,
+                'entity_type': 'lead',
+                'created_at': rng.randint(created_at, updated_at),
+                'value_after': value_after if rng.random() < 0.9 else value_after[0]
+            })
+
+    rng.shuffle(status_changes)
+    return {'leads': leads, 'status_changes': status_changes}
+
+
+def make_conversion_etl() -> KommoConversionETL:
+    etl = KommoConversionETL()
+    etl.status_cache = {
+        status_id: {'name': name, 'type': status_type}
+        for status_id, (name, status_type) in CONVERSION_STATUSES.items()
+    }
+    return etl
+
+
+def legacy_conversion_lookups(etl, raw_data: Dict):
+    """
+    Custo do caminho antigo: cada lead varria a lista inteira de eventos duas
+    vezes (calculate_sales_cycle e identify_proposal_stage)
+    """
+    status_changes = raw_data['status_changes']
+    for lead in raw_data['leads']:
+        lead_id = lead.get('id')
+        cycle_changes = [
+            change for change in status_changes
+            if change.get('entity_id') == lead_id and change.get('entity_type') == 'lead'
+        ]
+        proposal_changes = [change for change in status_changes if change.get('entity_id') == lead_id]
+        etl.calculate_sales_cycle(lead, etl.index_status_changes(cycle_changes).get(lead_id, []))
+        etl.identify_proposal_stage(lead, etl.index_status_changes(proposal_changes).get(lead_id, []))
+
+
+def benchmark_conversion_transform(sizes, legacy_max: int):
+    """Mede transform_conversion_data (eventos indexados por lead) em vários volumes"""
+    etl = make_conversion_etl()
+    pipeline_data = {'won_statuses': [142], 'proposal_statuses': [4]}
+
+    print("\n📊 BENCHMARK MÓDULO 4 - transform_conversion_data")
+    print("=" * 60)
+
+    previous_level = logging.getLogger('kommo_etl_modulo4_conversao').level
+    logging.getLogger('kommo_etl_modulo4_conversao').setLevel(logging.WARNING)
+    try:
+        for total in sizes:
+            raw_data = generate_synthetic_conversions(total)
+            events = len(raw_data['status_changes'])
+
+            if total <= legacy_max:
+                start = time.perf_counter()
+                legacy_conversion_lookups(etl, raw_data)
+                legacy_elapsed = time.perf_counter() - start
+                print(f"   {total:>7} leads / {events:>7} eventos  antes (varredura por lead) {legacy_elapsed:8.2f}s")
+
+            start = time.perf_counter()
+            df = etl.transform_conversion_data(raw_data, pipeline_data)
+            elapsed = time.perf_counter() - start
+            rate = len(df) / elapsed if elapsed > 0 else 0
+            print(f"   {total:>7} leads / {events:>7} eventos  depois (indexado)         {elapsed:8.2f}s  {rate:10.1f} leads/s")
+    finally:
+        logging.getLogger('kommo_etl_modulo4_conversao').setLevel(previous_level)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark das transformações dos ETLs')
+    parser.add_argument('--leads', type=int, default=2000, help='Quantidade de leads sintéticos')
+    parser.add_argument('--activities', type=int, default=100000, help='Quantidade de tarefas sintéticas')
+    parser.add_argument('--conversions', type=int, nargs='+', default=[10000, 50000, 100000],
+                        help='Volumes de leads do benchmark do Módulo 4')
+    parser.add_argument('--legacy-max', type=int, default=2000,
+                        help='Maior volume em que o caminho antigo (quadrático) também é medido')
+    parser.add_argument('--generate-golden', action='store_true',
+                        help='Regravar o golden da classificação de atividades com as regras atuais')
+    args = parser.parse_args()
+
+    if args.generate_golden:
+        generate_activity_golden()
+        return
+
+    benchmark_leads_transform(args.leads)
+
+    golden_ok = verify_activity_golden()
+    benchmark_activity_classifier(args.activities)
+    benchmark_conversion_transform(args.conversions, args.legacy_max)
+
+    if not golden_ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark da Extração Paginada - Kommo Analytics
+Sobe um servidor stub local que simula a API do Kommo (latência + paginação)
+e compara a paginação sequencial antiga com a paginação concorrente do KommoClient
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Permitir importar os módulos ETL
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'ETL'))
+
+from kommo_client import KommoClient
+
+
+def make_stub_handler(total_records: int, latency: float):
+    """Cria handler que responde /api/v4/<entidade> paginado como o Kommo"""
+
+    class KommoStubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            query = parse_qs(parsed.query)
+            entity = parsed.path.rstrip('/').split('/')[-1]
+            page = int(query.get('page', ['1'])[0])
+            limit = int(query.get('limit', ['250'])[0])
+
+            time.sleep(latency)
+
+            start = (page - 1) * limit
+            end = min(start + limit, total_records)
+            if start >= total_records:
+                # O Kommo responde 204 quando não há mais páginas
+                self.send_response(204)
+                self.end_headers()
+                return
+
+            body = json.dumps({
+                '_page': page,
+                '_embedded': {entity: [{'id': i, 'name': f'Registro {i}'} for i in range(start, end)]}
+            }).encode('utf-8')
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return KommoStubHandler
+
+
+def run_benchmark(total_records: int, latency: float, rate_limit: float, concurrency: int):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_stub_handler(total_records, latency))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"\n📊 BENCHMARK EXTRAÇÃO - {total_records} registros | latência {latency * 1000:.0f} ms | "
+          f"limite {rate_limit} req/s")
+    print("=" * 70)
+
+    scenarios = [
+        ('sequencial + sleep(0.5) (antes)', {'concurrency': 1, 'delay': 0.5}),
+        ('sequencial sem sleep', {'concurrency': 1}),
+        (f'concorrente x{concurrency} (depois)', {'concurrency': concurrency}),
+    ]
+
+    timings = {}
+    try:
+        for label, options in scenarios:
+            client = KommoClient(base_url, 'stub-token', rate_limit=rate_limit)
+            start = time.perf_counter()
+            records = client.fetch_all('/api/v4/leads', **options)
+            elapsed = time.perf_counter() - start
+            timings[label] = elapsed
+
+            requests_made = sum(stats['requests'] for stats in client.get_stats().values())
+            print(f"   {label:<34} {elapsed:7.2f}s  {len(records):>6} registros  {requests_made:>3} req")
+            client.close()
+    finally:
+        server.shutdown()
+
+    baseline = timings[scenarios[0][0]]
+    best = timings[scenarios[-1][0]]
+    if best > 0:
+        print(f"   🚀 Ganho: {baseline / best:.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da paginação da API do Kommo com servidor stub')
+    parser.add_argument('--records', type=int, default=5000, help='Total de registros no stub')
+    parser.add_argument('--latency', type=float, default=0.3, help='Latência simulada por página (s)')
+    parser.add_argument('--rate-limit', type=float, default=7.0, help='Limite de requisições por segundo')
+    parser.add_argument('--concurrency', type=int, default=4, help='Páginas buscadas em paralelo')
+    args = parser.parse_args()
+
+    run_benchmark(args.records, args.latency, args.rate_limit, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
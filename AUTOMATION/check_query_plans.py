@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Verificação de Planos de Execução - Kommo Analytics
+Roda EXPLAIN nas agregações quentes dos ETLs e do rollup do dashboard e falha (exit 1)
+se alguma voltar a fazer varredura completa de tabela: predicado de data
+não-sargável (DATE(coluna), DATE_FORMAT(coluna)) ou índice de cobertura ausente
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime, timedelta
+
+import mysql.connector
+from dotenv import load_dotenv
+
+# Permitir importar os módulos ETL
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'ETL'))
+
+from query_layer import day_bounds, ensure_indexes, explain_full_scans, month_bounds, range_bounds
+from kommo_etl_modulo2_funil import KommoFunnelETL
+from kommo_etl_modulo6_forecast_integrado import KommoForecastIntegradoETL
+from kommo_etl_rollup_dashboard import DAILY_ROLLUPS, PERIOD_DISTINCT_METRICS
+
+load_dotenv()
+
+MAIN_PIPELINE_ID = 11146887
+
+def hot_queries(reference_date: datetime):
+    """(nome, SQL, parâmetros) de cada agregação verificada"""
+    mes_ano = reference_date.strftime('%Y-%m')
+    period_start = (reference_date - timedelta(days=30)).date()
+
+    queries = [
+        ('modulo1_daily_metrics_range', """
+        SELECT created_date, primary_source, COUNT(*), SUM(response_time_hours),
+               COUNT(response_time_hours), SUM(lead_value), SUM(lead_cost)
+        FROM leads_metrics
+        WHERE created_date BETWEEN %s AND %s
+        GROUP BY created_date, primary_source
+        """, (period_start, reference_date.date())),
+        ('modulo2_main_funnel_metrics', KommoFunnelETL.MAIN_FUNNEL_METRICS_QUERY,
+         (MAIN_PIPELINE_ID, *day_bounds(reference_date))),
+        ('modulo2_delete_periodo', """
+        DELETE FROM funnel_history
+        WHERE pipeline_id = %s
+        AND entry_date >= %s AND entry_date < %s
+        """, (MAIN_PIPELINE_ID, *range_bounds(period_start, reference_date))),
+        ('modulo4_conversion_metrics_range', """
+        SELECT updated_date, responsible_user_id, pipeline_id, COUNT(*)
+        FROM sales_conversions
+        WHERE updated_date BETWEEN %s AND %s
+        AND responsible_user_id IS NOT NULL
+        GROUP BY updated_date, responsible_user_id, pipeline_id
+        """, (period_start, reference_date.date())),
+    ]
+
+    for modulo, query in KommoForecastIntegradoETL.MODULOS_QUERIES.items():
+        queries.append((f'modulo6_{modulo}', query, month_bounds(mes_ano)))
+
+    # O dashboard lê apenas os resumos dash_*; as agregações sobre as tabelas
+    # brutas passaram para o rollup (kommo_etl_rollup_dashboard.py)
+    for table, (_, insert_select) in DAILY_ROLLUPS.items():
+        queries.append((f'rollup_{table}', insert_select, range_bounds(period_start, reference_date)))
+    for metric, (_, select_query) in PERIOD_DISTINCT_METRICS.items():
+        queries.append((f'rollup_distinct_{metric}', select_query, range_bounds(period_start, reference_date)))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Falha se uma agregação quente voltar a fazer full table scan')
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help='Varreduras completas estimadas abaixo disso são toleradas se houver índice utilizável')
+    parser.add_argument('--no-create-indexes', action='store_true',
+                        help='Apenas verificar, sem criar os índices de cobertura ausentes')
+    args = parser.parse_args()
+
+    connection = mysql.connector.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME', 'kommo_analytics')
+    )
+    cursor = connection.cursor()
+
+    try:
+        if not args.no_create_indexes:
+            created = ensure_indexes(cursor)
+            print(f"🔧 Índices de cobertura criados: {len(created)}")
+
+        print("\n🔍 VERIFICAÇÃO DE PLANOS (EXPLAIN)")
+        print("=" * 60)
+
+        failures = 0
+        for name, query, params in hot_queries(datetime.now()):
+            try:
+                full_scans = explain_full_scans(cursor, query, params, args.min_rows)
+            except mysql.connector.Error as e:
+                if e.errno == 1146:  # Tabela inexistente neste banco
+                    print(f"   ⚠️ {name}: pulada ({e.msg})")
+                    continue
+                raise
+
+            if full_scans:
+                failures += 1
+                for step in full_scans:
+                    print(f"   ❌ {name}: full scan em {step.get('table')} "
+                          f"(possible_keys={step.get('possible_keys')}, rows={step.get('rows')})")
+            else:
+                print(f"   ✅ {name}")
+
+        if failures:
+            print(f"\n❌ {failures} agregação(ões) com varredura completa")
+            sys.exit(1)
+        print("\n✅ Nenhuma varredura completa nas agregações verificadas")
+    finally:
+        cursor.close()
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
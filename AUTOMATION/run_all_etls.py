@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Orquestrador dos ETLs - Kommo Analytics
+Executa os 6 módulos e o rollup do dashboard como um DAG: os módulos 1-4
+(API do Kommo) rodam em paralelo, o 5 espera 1/3/4, o 6 espera todos e o
+rollup espera 1-4. Cada etapa tem timeout, retries e log próprio; ao final
+é gravado um relatório JSON da execução. O id da execução vai para os módulos
+em KOMMO_RUN_ID: as novas tentativas (e --run-id de uma execução interrompida)
+retomam a extração do checkpoint da última página baixada.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ETL_DIR = os.path.join(PROJECT_DIR, 'ETL')
+LOG_DIR = os.path.join(PROJECT_DIR, 'LOGS')
+
+# Configurar logging
+os.makedirs(LOG_DIR, exist_ok=True)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(LOG_DIR, 'etl_automation.log')),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# DAG dos módulos: script, dependências, uso da API do Kommo e timeout (s)
+ETL_STAGES = {
+    'modulo1_leads': {
+        'title': 'Módulo 1 - Leads',
+        'script': 'kommo_etl_modulo1_leads.py',
+        'depends_on': [],
+        'uses_api': True,
+        'timeout': 1800
+    },
+    'modulo2_funil': {
+        'title': 'Módulo 2 - Funil',
+        'script': 'kommo_etl_modulo2_funil.py',
+        'depends_on': [],
+        'uses_api': True,
+        'timeout': 1800
+    },
+    'modulo3_atividades': {
+        'title': 'Módulo 3 - Atividades',
+        'script': 'kommo_etl_modulo3_atividades.py',
+        'depends_on': [],
+        'uses_api': True,
+        'timeout': 1800
+    },
+    'modulo4_conversao': {
+        'title': 'Módulo 4 - Conversão',
+        'script': 'kommo_etl_modulo4_conversao.py',
+        'depends_on': [],
+        'uses_api': True,
+        'timeout': 1800
+    },
+    'modulo5_performance': {
+        'title': 'Módulo 5 - Performance',
+        'script': 'kommo_etl_modulo5_performance.py',
+        'depends_on': ['modulo1_leads', 'modulo3_atividades', 'modulo4_conversao'],
+        'uses_api': False,
+        'timeout': 900
+    },
+    'modulo6_forecast': {
+        'title': 'Módulo 6 - Forecast',
+        'script': 'kommo_etl_modulo6_forecast_integrado.py',
+        'depends_on': ['modulo1_leads', 'modulo2_funil', 'modulo3_atividades',
+                       'modulo4_conversao', 'modulo5_performance'],
+        'uses_api': False,
+        'timeout': 900
+    },
+    'rollup_dashboard': {
+        'title': 'Rollup do Dashboard',
+        'script': 'kommo_etl_rollup_dashboard.py',
+        'depends_on': ['modulo1_leads', 'modulo2_funil', 'modulo3_atividades', 'modulo4_conversao'],
+        'uses_api': False,
+        'timeout': 900
+    },
+}
+
+
+class ETLOrchestrator:
+    def __init__(self, stages: dict = None, max_workers: int = 4, retries: int = 1,
+                 retry_delay: float = 30.0, timeout: int = None, run_id: str = None):
+        self.stages = stages or ETL_STAGES
+        self.max_workers = max_workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.timeout_override = timeout
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.results = {}
+
+        self.validate_dag()
+
+    def validate_dag(self):
+        """Garantir que as dependências existem e que não há ciclos"""
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Ciclo no DAG de ETLs envolvendo {name}")
+            visiting.add(name)
+            for dependency in self.stages[name]['depends_on']:
+                if dependency not in self.stages:
+                    raise ValueError(f"{name} depende de etapa inexistente: {dependency}")
+                visit(dependency)
+            visiting.discard(name)
+            done.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def stage_env(self) -> dict:
+        """
+        Ambiente dos subprocessos. Os módulos de API rodam ao mesmo tempo em
+        processos separados, então o limite de requisições da conta é dividido
+        entre eles (cada processo tem o próprio token bucket).
+        """
+        env = dict(os.environ)
+        api_stages = sum(1 for stage in self.stages.values() if stage['uses_api'])
+        parallel_api = max(1, min(api_stages, self.max_workers))
+        account_rate = float(os.getenv('KOMMO_RATE_LIMIT', 7))
+        env['KOMMO_RATE_LIMIT'] = str(round(account_rate / parallel_api, 2))
+        # Mesmo id em todas as tentativas: a extração retoma do checkpoint
+        env['KOMMO_RUN_ID'] = self.run_id
+        return env
+
+    def run_stage(self, name: str) -> dict:
+        """Executar um módulo com timeout e retries (roda em uma thread do pool)"""
+        stage = self.stages[name]
+        timeout = self.timeout_override or stage['timeout']
+        log_file = os.path.join(LOG_DIR, f"{name}_{datetime.now().strftime('%Y%m%d')}.log")
+        result = {
+            'title': stage['title'],
+            'script': stage['script'],
+            'status': 'failed',
+            'attempts': 0,
+            'exit_code': None,
+            'started_at': datetime.now().isoformat(),
+            'finished_at': None,
+            'duration_seconds': 0.0,
+            'log_file': log_file,
+            'error': None
+        }
+
+        start = time.perf_counter()
+        for attempt in range(1, self.retries + 2):
+            result['attempts'] = attempt
+            logger.info(f"🚀 Iniciando {stage['title']} (tentativa {attempt})...")
+
+            try:
+                with open(log_file, 'a', encoding='utf-8') as log:
+                    log.write(f"\n===== {datetime.now().isoformat()} | execução {self.run_id} | tentativa {attempt} =====\n")
+                    log.flush()
+                    completed = subprocess.run(
+                        [sys.executable, stage['script']],
+                        cwd=ETL_DIR,
+                        env=self.stage_env(),
+                        stdout=log,
+                        stderr=subprocess.STDOUT,
+                        timeout=timeout
+                    )
+                result['exit_code'] = completed.returncode
+                if completed.returncode == 0:
+                    result['status'] = 'success'
+                    result['error'] = None
+                    break
+                result['status'] = 'failed'
+                result['error'] = f"código de saída {completed.returncode}"
+            except subprocess.TimeoutExpired:
+                result['status'] = 'timeout'
+                result['error'] = f"timeout de {timeout}s"
+            except OSError as e:
+                result['status'] = 'failed'
+                result['error'] = str(e)
+
+            logger.warning(f"⚠️ {stage['title']} falhou: {result['error']}")
+            if attempt <= self.retries:
+                time.sleep(self.retry_delay)
+
+        result['duration_seconds'] = round(time.perf_counter() - start, 1)
+        result['finished_at'] = datetime.now().isoformat()
+
+        if result['status'] == 'success':
+            logger.info(f"✅ {stage['title']} concluído em {result['duration_seconds']}s")
+        else:
+            logger.error(f"❌ {stage['title']}: {result['error']} - verificar {log_file}")
+        return result
+
+    def skip_stage(self, name: str, failed_dependencies: list):
+        self.results[name] = {
+            'title': self.stages[name]['title'],
+            'script': self.stages[name]['script'],
+            'status': 'skipped',
+            'attempts': 0,
+            'exit_code': None,
+            'started_at': None,
+            'finished_at': None,
+            'duration_seconds': 0.0,
+            'log_file': None,
+            'error': f"dependências falharam: {', '.join(failed_dependencies)}"
+        }
+        logger.warning(f"⏭️ {self.stages[name]['title']} pulado ({self.results[name]['error']})")
+
+    def run(self) -> dict:
+        """Executar o DAG, disparando cada módulo assim que suas dependências terminam"""
+        started_at = datetime.now()
+        start = time.perf_counter()
+        logger.info("🔄 ======== INICIANDO ORQUESTRAÇÃO DE ETLs ========")
+        logger.info(f"📍 Diretório: {PROJECT_DIR} | execução {self.run_id} | {self.max_workers} workers")
+
+        pending = set(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                # Pular etapas cujas dependências não tiveram sucesso
+                for name in sorted(pending):
+                    failed = [
+                        dependency for dependency in self.stages[name]['depends_on']
+                        if dependency in self.results and self.results[dependency]['status'] != 'success'
+                    ]
+                    if failed:
+                        self.skip_stage(name, failed)
+                        pending.discard(name)
+
+                # Disparar etapas prontas, na ordem de declaração do DAG
+                for name in [stage for stage in self.stages if stage in pending]:
+                    dependencies = self.stages[name]['depends_on']
+                    if all(self.results.get(dependency, {}).get('status') == 'success' for dependency in dependencies):
+                        running[executor.submit(self.run_stage, name)] = name
+                        pending.discard(name)
+
+                if not running:
+                    continue
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    self.results[name] = future.result()
+
+        succeeded = sum(1 for result in self.results.values() if result['status'] == 'success')
+        report = {
+            'run_id': self.run_id,
+            'status': 'success' if succeeded == len(self.stages) else 'partial' if succeeded else 'failed',
+            'started_at': started_at.isoformat(),
+            'finished_at': datetime.now().isoformat(),
+            'duration_seconds': round(time.perf_counter() - start, 1),
+            'succeeded': succeeded,
+            'total': len(self.stages),
+            'max_workers': self.max_workers,
+            'stages': {name: self.results[name] for name in self.stages}
+        }
+
+        self.write_report(report)
+        return report
+
+    def write_report(self, report: dict):
+        """Gravar relatório JSON e o status lido pelo dashboard/monitoramento"""
+        report_file = os.path.join(LOG_DIR, f"etl_run_report_{self.run_id}.json")
+        for path in (report_file, os.path.join(LOG_DIR, 'etl_run_report_latest.json')):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+        # Mesmo formato do run_all_etls.sh (a data de modificação invalida o cache do dashboard)
+        label = 'SUCCESS' if report['status'] == 'success' else 'PARTIAL'
+        with open(os.path.join(LOG_DIR, 'last_execution_status.txt'), 'w') as f:
+            f.write(f"{label}: {report['succeeded']}/{report['total']}\n")
+
+        logger.info("📊 ======== RESUMO DA EXECUÇÃO ========")
+        for name, result in report['stages'].items():
+            logger.info(f"   {result['title']:<26} {result['status']:<8} {result['duration_seconds']:>8.1f}s "
+                        f"({result['attempts']} tentativa(s))")
+        logger.info(f"✅ ETLs bem-sucedidos: {report['succeeded']}/{report['total']} "
+                    f"em {report['duration_seconds']}s")
+        logger.info(f"📄 Relatório: {report_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Orquestrador paralelo dos ETLs do Kommo Analytics')
+    parser.add_argument('--max-workers', type=int, default=4, help='Módulos executados em paralelo')
+    parser.add_argument('--retries', type=int, default=1, help='Novas tentativas por módulo após falha')
+    parser.add_argument('--retry-delay', type=float, default=30.0, help='Espera entre tentativas (s)')
+    parser.add_argument('--timeout', type=int, default=None, help='Timeout único para todos os módulos (s)')
+    parser.add_argument('--run-id', default=None,
+                        help='Reutilizar o id de uma execução interrompida (retoma os checkpoints de extração)')
+    args = parser.parse_args()
+
+    orchestrator = ETLOrchestrator(
+        max_workers=args.max_workers,
+        retries=args.retries,
+        retry_delay=args.retry_delay,
+        timeout=args.timeout,
+        run_id=args.run_id
+    )
+    report = orchestrator.run()
+    sys.exit(0 if report['status'] == 'success' else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Camada de dados do Dashboard - Kommo Analytics
+# Pool de conexões compartilhado (st.cache_resource) e resultados de queries
+# em cache (st.cache_data) por (SQL, parâmetros), invalidados a cada execução do ETL
+import os
+import streamlit as st
+import pandas as pd
+import mysql.connector
+from mysql.connector import pooling
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# TTL alinhado com o agendamento dos ETLs (cron a cada 4h)
+CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 4 * 60 * 60))
+POOL_SIZE = int(os.getenv('DASHBOARD_POOL_SIZE', 5))
+
+# Períodos do seletor; as contagens distintas de cada um são materializadas
+# pelo rollup do ETL (ETL/kommo_etl_rollup_dashboard.py lê a mesma variável)
+DASHBOARD_PERIODS = [int(days) for days in os.getenv('DASHBOARD_PERIODS', '7,15,30').split(',')]
+
+# Arquivo gravado ao final de cada execução dos ETLs; a data de modificação
+# entra na chave do cache, então uma nova execução invalida os resultados
+ETL_STATUS_FILE = os.getenv(
+    'ETL_STATUS_FILE', os.path.join(PROJECT_ROOT, 'LOGS', 'last_execution_status.txt')
+)
+
+
+def _db_config() -> dict:
+    """Configuração do banco: st.secrets primeiro, depois variáveis de ambiente"""
+    try:
+        return {
+            'host': st.secrets["DB_HOST"],
+            'port': int(st.secrets["DB_PORT"]),
+            'user': st.secrets["DB_USER"],
+            'password': st.secrets["DB_PASSWORD"],
+            'database': st.secrets["DB_NAME"],
+        }
+    except Exception:
+        return {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': int(os.getenv('DB_PORT', 3306)),
+            'user': os.getenv('DB_USER', 'root'),
+            'password': os.getenv('DB_PASSWORD', ''),
+            'database': os.getenv('DB_NAME', 'kommo_analytics'),
+        }
+
+
+@st.cache_resource(show_spinner=False)
+def get_connection_pool() -> pooling.MySQLConnectionPool:
+    """Pool de conexões criado uma única vez por processo do Streamlit"""
+    return pooling.MySQLConnectionPool(
+        pool_name='kommo_dashboard',
+        pool_size=POOL_SIZE,
+        autocommit=True,
+        charset='utf8mb4',
+        **_db_config()
+    )
+
+
+def get_etl_version() -> float:
+    """Versão dos dados = data de modificação do status da última execução do ETL"""
+    try:
+        return os.path.getmtime(ETL_STATUS_FILE)
+    except OSError:
+        return 0.0
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _cached_query(query: str, params: tuple, etl_version: float) -> pd.DataFrame:
+    """Executar a query em uma conexão do pool (resultado em cache por SQL/params/versão)"""
+    conn = get_connection_pool().get_connection()
+    try:
+        return pd.read_sql(query, conn, params=params or None)
+    finally:
+        # Em conexões do pool, close() devolve a conexão ao pool
+        conn.close()
+
+
+@st.cache_resource(show_spinner=False)
+def _seen_etl_version() -> dict:
+    return {'version': None}
+
+
+def invalidate_on_new_etl_run() -> float:
+    """
+    Limpar o cache de queries quando houver uma nova execução do ETL
+    (chamado uma vez por rerun, antes das queries)
+    """
+    version = get_etl_version()
+    seen = _seen_etl_version()
+    if seen['version'] is not None and seen['version'] != version:
+        _cached_query.clear()
+    seen['version'] = version
+    return version
+
+
+def clear_cache():
+    """Invalidação manual (botão do sidebar)"""
+    _cached_query.clear()
+
+
+def run_query(query, params=None):
+    try:
+        params = tuple(params) if params else ()
+        return _cached_query(query, params, get_etl_version())
+    except mysql.connector.Error as e:
+        st.error(f"Erro na conexão com banco: {e}")
+        return pd.DataFrame()
+    except Exception as e:
+        st.error(f"Erro na query: {e}")
+        return pd.DataFrame()
@@ -1,7 +1,6 @@
 # Dashboard Streamlit - Kommo Analytics (6 MÓDULOS ETL)
 import streamlit as st
 import pandas as pd
-import mysql.connector
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
@@ -11,60 +10,22 @@ warnings.filterwarnings('ignore')
 # Configuração da página
 st.set_page_config(page_title="Kommo Analytics", layout="wide")
 
-# Configuração do banco
-def init_connection():
-    try:
-        # Tentar usar st.secrets primeiro, depois variáveis de ambiente
-        try:
-            connection = mysql.connector.connect(
-                host=st.secrets["DB_HOST"],
-                port=int(st.secrets["DB_PORT"]),
-                user=st.secrets["DB_USER"],
-                password=st.secrets["DB_PASSWORD"],
-                database=st.secrets["DB_NAME"],
-                autocommit=True,
-                charset='utf8mb4'
-            )
-        except:
-            # Fallback para variáveis de ambiente
-            import os
-            from dotenv import load_dotenv
-            load_dotenv()
-            
-            connection = mysql.connector.connect(
-                host=os.getenv('DB_HOST', 'localhost'),
-                port=int(os.getenv('DB_PORT', 3306)),
-                user=os.getenv('DB_USER', 'root'),
-                password=os.getenv('DB_PASSWORD', ''),
-                database=os.getenv('DB_NAME', 'kommo_analytics'),
-                autocommit=True,
-                charset='utf8mb4'
-            )
-        return connection
-    except Exception as e:
-        st.error(f"Erro na conexão com banco: {e}")
-        return None
-
-def run_query(query, params=None):
-    try:
-        conn = init_connection()
-        if conn is None:
-            return pd.DataFrame()
-        
-        df = pd.read_sql(query, conn, params=params)
-        conn.close()
-        return df
-    except Exception as e:
-        st.error(f"Erro na query: {e}")
-        return pd.DataFrame()
+# Camada de dados: pool de conexões + cache de queries invalidado a cada execução do ETL
+from data_layer import run_query, clear_cache, invalidate_on_new_etl_run, DASHBOARD_PERIODS
+
+invalidate_on_new_etl_run()
 
 # Header
 st.title(" Kommo Analytics Dashboard -")
 
 # Sidebar
 st.sidebar.title(" Filtros")
-periodo = st.sidebar.selectbox("Período:", ["7 dias", "15 dias", "30 dias"], index=2)  # 30 dias por padrão
+# Períodos fixos: as contagens distintas de cada um são pré-calculadas pelo rollup (dash_period_distinct)
+periodo = st.sidebar.selectbox("Período:", [f"{d} dias" for d in DASHBOARD_PERIODS],
+                               index=len(DASHBOARD_PERIODS) - 1)  # maior período por padrão
 dias = int(periodo.split()[0])
+if st.sidebar.button("🔄 Recarregar dados"):
+    clear_cache()
 data_inicio = datetime.now() - timedelta(days=dias)
 
 # Data para queries
@@ -78,14 +39,13 @@ col1, col2, col3, col4 = st.columns(4)
 # KPIs principais
 kpis_query = f"""
 SELECT 
-    COUNT(DISTINCT l.lead_id) as total_leads,
-    COUNT(DISTINCT CASE WHEN fh.status_name = 'Venda ganha' THEN fh.lead_id END) as vendas,
-    COUNT(DISTINCT CASE WHEN fh.status_name = 'Venda perdida' THEN fh.lead_id END) as vendas_perdidas,
-    COALESCE(AVG(l.response_time_hours), 0) as tempo_resposta_medio,
-    COALESCE(SUM(l.lead_cost), 0) as custo_total
-FROM leads_metrics l
-LEFT JOIN funnel_history fh ON l.lead_id = fh.lead_id AND fh.pipeline_id = 11146887
-WHERE l.created_date >= '{data_inicio.date()}'
+    CAST(COALESCE(SUM(total_leads), 0) AS SIGNED) as total_leads,
+    CAST(COALESCE(SUM(leads_won), 0) AS SIGNED) as vendas,
+    CAST(COALESCE(SUM(leads_lost), 0) AS SIGNED) as vendas_perdidas,
+    COALESCE(SUM(response_time_sum) / NULLIF(SUM(response_time_count), 0), 0) as tempo_resposta_medio,
+    COALESCE(SUM(lead_cost_sum), 0) as custo_total
+FROM dash_leads_daily
+WHERE metric_date >= '{data_inicio.date()}'
 """
 
 kpis_df = run_query(kpis_query)
@@ -112,12 +72,12 @@ st.markdown("**Para saber de onde vêm os resultados e priorizar canais que conv
 leads_canal_query = f"""
 SELECT 
     COALESCE(primary_source, 'Não Classificado') as canal,
-    COUNT(*) as total_leads,
-    AVG(response_time_hours) as tempo_resposta_medio,
-    SUM(lead_cost) as custo_total,
-    AVG(lead_cost) as custo_medio
-FROM leads_metrics 
-WHERE created_date >= '{data_inicio.date()}'
+    CAST(SUM(total_leads) AS SIGNED) as total_leads,
+    SUM(response_time_sum) / NULLIF(SUM(response_time_count), 0) as tempo_resposta_medio,
+    CASE WHEN SUM(lead_cost_count) > 0 THEN SUM(lead_cost_sum) END as custo_total,
+    SUM(lead_cost_sum) / NULLIF(SUM(lead_cost_count), 0) as custo_medio
+FROM dash_leads_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY primary_source
 ORDER BY total_leads DESC
 """
@@ -222,12 +182,12 @@ st.subheader("🎯 Análise de Performance dos Canais")
 performance_query = f"""
 SELECT 
     primary_source as canal,
-    COUNT(*) as total_leads,
-    AVG(response_time_hours) as tempo_medio,
-    SUM(lead_cost) as custo_total,
-    AVG(lead_cost) as custo_medio
-FROM leads_metrics 
-WHERE created_date >= '{data_inicio.date()}'
+    CAST(SUM(total_leads) AS SIGNED) as total_leads,
+    SUM(response_time_sum) / NULLIF(SUM(response_time_count), 0) as tempo_medio,
+    CASE WHEN SUM(lead_cost_count) > 0 THEN SUM(lead_cost_sum) END as custo_total,
+    SUM(lead_cost_sum) / NULLIF(SUM(lead_cost_count), 0) as custo_medio
+FROM dash_leads_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY primary_source
 ORDER BY total_leads DESC
 """
@@ -278,14 +238,13 @@ st.subheader("📊 Vendas por Canal")
 
 vendas_canal_query = f"""
 SELECT 
-    lm.primary_source as canal,
-    COUNT(DISTINCT fh.lead_id) as vendas_ganhas,
-    COUNT(DISTINCT CASE WHEN fh.status_name = 'Venda perdida' THEN fh.lead_id END) as vendas_perdidas
-FROM funnel_history fh
-JOIN leads_metrics lm ON fh.lead_id = lm.lead_id
-WHERE fh.entry_date >= '{data_inicio.date()}'
-AND fh.status_name IN ('Venda ganha', 'Venda perdida')
-GROUP BY lm.primary_source
+    g.dim1 as canal,
+    g.distinct_count as vendas_ganhas,
+    COALESCE(p.distinct_count, 0) as vendas_perdidas
+FROM dash_period_distinct g
+LEFT JOIN dash_period_distinct p
+    ON p.period_days = g.period_days AND p.metric = 'vendas_canal_perdidas' AND p.dim1 <=> g.dim1
+WHERE g.period_days = {dias} AND g.metric = 'vendas_canal_ganhas'
 ORDER BY vendas_ganhas DESC
 """
 
@@ -329,10 +288,9 @@ SELECT
     utm_source,
     utm_medium,
     utm_campaign,
-    COUNT(*) as total_leads
-FROM leads_metrics 
-WHERE created_date >= '{data_inicio.date()}'
-AND utm_source IS NOT NULL
+    CAST(SUM(total_leads) AS SIGNED) as total_leads
+FROM dash_utm_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY utm_source, utm_medium, utm_campaign
 ORDER BY total_leads DESC
 LIMIT 10
@@ -391,14 +349,21 @@ with col1:
     # Funil de conversão
     funil_query = f"""
     SELECT 
-        COALESCE(fh.status_name, 'Desconhecido') as etapa,
-        COUNT(DISTINCT fh.lead_id) as leads,
-        AVG(fh.time_in_status_hours) as tempo_medio
-    FROM funnel_history fh
-    WHERE fh.entry_date >= '{data_inicio.date()}'
-    AND fh.pipeline_id = 11146887
-    GROUP BY fh.status_name, fh.status_sort
-    ORDER BY fh.status_sort
+        COALESCE(f.status_name, 'Desconhecido') as etapa,
+        COALESCE(d.distinct_count, 0) as leads,
+        f.tempo_medio
+    FROM (
+        SELECT 
+            status_name,
+            status_sort,
+            SUM(time_in_status_sum) / NULLIF(SUM(time_in_status_count), 0) as tempo_medio
+        FROM dash_funnel_daily
+        WHERE metric_date >= '{data_inicio.date()}'
+        GROUP BY status_name, status_sort
+    ) f
+    LEFT JOIN dash_period_distinct d
+        ON d.period_days = {dias} AND d.metric = 'funil_leads' AND d.dim1 <=> f.status_name
+    ORDER BY f.status_sort
     """
     
     funil_df = run_query(funil_query)
@@ -451,15 +416,23 @@ with col1:
     # Status do funil principal
     status_principal_query = f"""
 SELECT 
-        status_name,
-        COUNT(DISTINCT lead_id) as leads_unicos,
-        AVG(time_in_status_hours) as tempo_medio_horas,
-        COUNT(*) as total_movimentacoes
-    FROM funnel_history 
-    WHERE pipeline_id = 11146887
-    AND entry_date >= '{data_inicio.date()}'
-    GROUP BY status_name, status_sort
-    ORDER BY status_sort
+        f.status_name,
+        COALESCE(d.distinct_count, 0) as leads_unicos,
+        f.tempo_medio_horas,
+        f.total_movimentacoes
+    FROM (
+        SELECT 
+            status_name,
+            status_sort,
+            SUM(time_in_status_sum) / NULLIF(SUM(time_in_status_count), 0) as tempo_medio_horas,
+            CAST(SUM(movements) AS SIGNED) as total_movimentacoes
+        FROM dash_funnel_daily
+        WHERE metric_date >= '{data_inicio.date()}'
+        GROUP BY status_name, status_sort
+    ) f
+    LEFT JOIN dash_period_distinct d
+        ON d.period_days = {dias} AND d.metric = 'funil_leads' AND d.dim1 <=> f.status_name
+    ORDER BY f.status_sort
     """
     
     status_principal_df = run_query(status_principal_query)
@@ -518,21 +491,21 @@ with col1:
     # Vendas perdidas por tempo no funil
     perdas_tempo_query = f"""
     SELECT 
-        CASE 
-            WHEN time_in_status_hours <= 24 THEN '0-24h'
-            WHEN time_in_status_hours <= 72 THEN '1-3 dias'
-            WHEN time_in_status_hours <= 168 THEN '3-7 dias'
-            WHEN time_in_status_hours <= 720 THEN '1-4 semanas'
-            ELSE 'Mais de 4 semanas'
-        END as tempo_categoria,
-        COUNT(DISTINCT lead_id) as leads_perdidos,
-        AVG(time_in_status_hours) as tempo_medio
-    FROM funnel_history 
-    WHERE pipeline_id = 11146887
-    AND status_name = 'Venda perdida'
-    AND entry_date >= '{data_inicio.date()}'
-    GROUP BY tempo_categoria
-    ORDER BY tempo_medio
+        f.time_bucket as tempo_categoria,
+        COALESCE(d.distinct_count, 0) as leads_perdidos,
+        f.tempo_medio
+    FROM (
+        SELECT 
+            time_bucket,
+            SUM(time_in_status_sum) / NULLIF(SUM(time_in_status_count), 0) as tempo_medio
+        FROM dash_funnel_daily
+        WHERE status_name = 'Venda perdida'
+        AND metric_date >= '{data_inicio.date()}'
+        GROUP BY time_bucket
+    ) f
+    LEFT JOIN dash_period_distinct d
+        ON d.period_days = {dias} AND d.metric = 'funil_perdas_tempo' AND d.dim1 = f.time_bucket
+    ORDER BY f.tempo_medio
     """
     
     perdas_tempo_df = run_query(perdas_tempo_query)
@@ -550,14 +523,20 @@ with col2:
     # Comparação ganhas vs perdidas
     comparacao_query = f"""
     SELECT 
-        status_name,
-        COUNT(DISTINCT lead_id) as leads,
-        AVG(time_in_status_hours) as tempo_medio
-    FROM funnel_history 
-    WHERE pipeline_id = 11146887
-    AND status_name IN ('Venda ganha', 'Venda perdida')
-    AND entry_date >= '{data_inicio.date()}'
-    GROUP BY status_name
+        f.status_name,
+        COALESCE(d.distinct_count, 0) as leads,
+        f.tempo_medio
+    FROM (
+        SELECT 
+            status_name,
+            SUM(time_in_status_sum) / NULLIF(SUM(time_in_status_count), 0) as tempo_medio
+        FROM dash_funnel_daily
+        WHERE status_name IN ('Venda ganha', 'Venda perdida')
+        AND metric_date >= '{data_inicio.date()}'
+        GROUP BY status_name
+    ) f
+    LEFT JOIN dash_period_distinct d
+        ON d.period_days = {dias} AND d.metric = 'funil_leads' AND d.dim1 = f.status_name
     """
     
     comparacao_df = run_query(comparacao_query)
@@ -597,13 +576,20 @@ st.markdown("**Análise detalhada dos motivos de perda no funil**")
 # Buscar dados reais de motivos de perda
 motivos_perda_query = f"""
 SELECT 
-    COALESCE(loss_reason, 'Não especificado') as motivo,
-    COUNT(DISTINCT lead_id) as leads_perdidos,
-    AVG(sales_cycle_days) as tempo_medio
-FROM sales_metrics 
-WHERE created_date >= '{data_inicio.date()}'
-AND status_name = 'Venda perdida'
-GROUP BY loss_reason
+    COALESCE(s.loss_reason, 'Não especificado') as motivo,
+    COALESCE(d.distinct_count, 0) as leads_perdidos,
+    s.tempo_medio
+FROM (
+    SELECT 
+        loss_reason,
+        SUM(sales_cycle_sum) / NULLIF(SUM(sales_cycle_count), 0) as tempo_medio
+    FROM dash_sales_daily 
+    WHERE metric_date >= '{data_inicio.date()}'
+    AND status_name = 'Venda perdida'
+    GROUP BY loss_reason
+) s
+LEFT JOIN dash_period_distinct d
+    ON d.period_days = {dias} AND d.metric = 'motivos_perda' AND d.dim1 <=> s.loss_reason
 ORDER BY leads_perdidos DESC
 """
 
@@ -697,16 +683,26 @@ st.markdown("**Para entender o esforço do time e avaliar cadência de prospecç
 # Buscar dados reais de atividades comerciais
 atividades_query = f"""
 SELECT 
-    activity_type,
-    COUNT(*) as total_atividades,
-    COUNT(DISTINCT user_id) as vendedores_unicos,
-    COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END) as concluidas,
-    ROUND(COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END) / COUNT(*) * 100, 1) as taxa_conclusao,
-    COUNT(DISTINCT entity_id) as leads_contatatados
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}'
-GROUP BY activity_type 
-ORDER BY total_atividades DESC
+    a.activity_type,
+    a.total_atividades,
+    a.vendedores_unicos,
+    a.concluidas,
+    a.taxa_conclusao,
+    COALESCE(d.distinct_count, 0) as leads_contatatados
+FROM (
+    SELECT 
+        activity_type,
+        CAST(SUM(total_activities) AS SIGNED) as total_atividades,
+        COUNT(DISTINCT user_id) as vendedores_unicos,
+        CAST(SUM(concluidas) AS SIGNED) as concluidas,
+        ROUND(SUM(concluidas) / SUM(total_activities) * 100, 1) as taxa_conclusao
+    FROM dash_activities_daily 
+    WHERE metric_date >= '{data_inicio.date()}'
+    GROUP BY activity_type
+) a
+LEFT JOIN dash_period_distinct d
+    ON d.period_days = {dias} AND d.metric = 'atividades_leads' AND d.dim1 <=> a.activity_type
+ORDER BY a.total_atividades DESC
 """
 
 atividades_df = run_query(atividades_query)
@@ -765,21 +761,37 @@ st.subheader("👥 Performance por Vendedor")
 
 vendedores_query = f"""
 SELECT 
-    user_name,
-    user_role,
-    COUNT(*) as total_atividades,
-    COUNT(CASE WHEN is_follow_up = 1 THEN 1 END) as followups,
-    COUNT(CASE WHEN note_text LIKE '%ligar%' OR note_text LIKE '%contato%' OR note_text LIKE '%telefone%' OR note_text LIKE '%whatsapp%' THEN 1 END) as contatos,
-    COUNT(CASE WHEN note_text LIKE '%reuniao%' OR note_text LIKE '%meeting%' OR note_text LIKE '%apresentacao%' OR note_text LIKE '%agendamento%' THEN 1 END) as reunioes,
-    COUNT(CASE WHEN note_text LIKE '%email%' OR note_text LIKE '%e-mail%' OR note_text LIKE '%correio%' THEN 1 END) as emails,
-    COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END) as concluidas,
-    ROUND(COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END) / COUNT(*) * 100, 1) as taxa_conclusao,
-    COUNT(DISTINCT entity_id) as leads_diferentes
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}'
-GROUP BY user_name, user_role 
-ORDER BY total_atividades DESC
-LIMIT 10
+    v.user_name,
+    v.user_role,
+    v.total_atividades,
+    v.followups,
+    v.contatos,
+    v.reunioes,
+    v.emails,
+    v.concluidas,
+    v.taxa_conclusao,
+    COALESCE(d.distinct_count, 0) as leads_diferentes
+FROM (
+    SELECT 
+        user_name,
+        user_role,
+        CAST(SUM(total_activities) AS SIGNED) as total_atividades,
+        CAST(SUM(followups) AS SIGNED) as followups,
+        CAST(SUM(contatos) AS SIGNED) as contatos,
+        CAST(SUM(reunioes) AS SIGNED) as reunioes,
+        CAST(SUM(emails) AS SIGNED) as emails,
+        CAST(SUM(concluidas) AS SIGNED) as concluidas,
+        ROUND(SUM(concluidas) / SUM(total_activities) * 100, 1) as taxa_conclusao
+    FROM dash_activities_daily 
+    WHERE metric_date >= '{data_inicio.date()}'
+    GROUP BY user_name, user_role 
+    ORDER BY total_atividades DESC
+    LIMIT 10
+) v
+LEFT JOIN dash_period_distinct d
+    ON d.period_days = {dias} AND d.metric = 'vendedores_leads'
+    AND d.dim1 <=> v.user_name AND d.dim2 <=> v.user_role
+ORDER BY v.total_atividades DESC
 """
 
 vendedores_df = run_query(vendedores_query)
@@ -788,14 +800,15 @@ vendedores_df = run_query(vendedores_query)
 followup_segmentation_query = f"""
 SELECT 
     user_name,
-    COUNT(*) as total_followups,
-    COUNT(CASE WHEN follow_up_category = 'alta_prioridade' THEN 1 END) as alta_prioridade,
-    COUNT(CASE WHEN follow_up_category = 'media_prioridade' THEN 1 END) as media_prioridade,
-    COUNT(CASE WHEN follow_up_category = 'baixa_prioridade' THEN 1 END) as baixa_prioridade,
-    AVG(urgency_score) as score_medio_urgencia
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}' AND is_follow_up = 1
+    CAST(SUM(followups) AS SIGNED) as total_followups,
+    CAST(SUM(followups_alta_prioridade) AS SIGNED) as alta_prioridade,
+    CAST(SUM(followups_media_prioridade) AS SIGNED) as media_prioridade,
+    CAST(SUM(followups_baixa_prioridade) AS SIGNED) as baixa_prioridade,
+    SUM(followup_urgency_sum) / NULLIF(SUM(followup_urgency_count), 0) as score_medio_urgencia
+FROM dash_activities_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY user_name
+HAVING SUM(followups) > 0
 """
 
 followup_segmentation_df = run_query(followup_segmentation_query)
@@ -804,11 +817,11 @@ followup_segmentation_df = run_query(followup_segmentation_query)
 response_metrics_query = f"""
 SELECT 
     user_name,
-    COUNT(CASE WHEN activity_type = 'note' AND note_text LIKE '%resposta%' OR note_text LIKE '%retorno%' THEN 1 END) as respostas_recebidas,
-    COUNT(CASE WHEN activity_type = 'task' AND is_follow_up = 1 AND complete_till IS NOT NULL AND complete_till >= created_date THEN 1 END) as followups_no_prazo,
-    COUNT(CASE WHEN activity_type = 'task' AND is_follow_up = 1 AND complete_till IS NOT NULL AND complete_till < created_date THEN 1 END) as followups_atrasados
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}'
+    CAST(SUM(respostas) AS SIGNED) as respostas_recebidas,
+    CAST(SUM(followups_no_prazo) AS SIGNED) as followups_no_prazo,
+    CAST(SUM(followups_atrasados) AS SIGNED) as followups_atrasados
+FROM dash_activities_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY user_name
 """
 
@@ -968,12 +981,12 @@ st.subheader("📈 Atividades ao Longo do Tempo")
 
 temporal_query = f"""
 SELECT 
-    DATE(created_datetime) as data,
+    metric_date as data,
     activity_type,
-    COUNT(*) as atividades
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}'
-GROUP BY DATE(created_datetime), activity_type
+    CAST(SUM(total_activities) AS SIGNED) as atividades
+FROM dash_activities_daily 
+WHERE metric_date >= '{data_inicio.date()}'
+GROUP BY metric_date, activity_type
 ORDER BY data DESC
 LIMIT 50
 """
@@ -1000,12 +1013,12 @@ vendas_query = f"""
 SELECT 
     status_name,
     status_type,
-    COUNT(*) as total_leads,
-    SUM(sale_price) as receita_total,
-    AVG(sale_price) as ticket_medio,
-    AVG(sales_cycle_days) as ciclo_medio_dias
-FROM sales_metrics 
-WHERE created_date >= '{data_inicio.date()}'
+    CAST(SUM(total_rows) AS SIGNED) as total_leads,
+    CASE WHEN SUM(sale_price_count) > 0 THEN SUM(sale_price_sum) END as receita_total,
+    SUM(sale_price_sum) / NULLIF(SUM(sale_price_count), 0) as ticket_medio,
+    SUM(sales_cycle_sum) / NULLIF(SUM(sales_cycle_count), 0) as ciclo_medio_dias
+FROM dash_sales_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY status_name, status_type
 ORDER BY total_leads DESC
 """
@@ -1045,17 +1058,18 @@ vendedores_vendas_query = f"""
 SELECT 
     responsible_user_name as vendedor,
     responsible_user_role as cargo,
-    COUNT(*) as total_leads,
-    COUNT(CASE WHEN status_name = 'Venda ganha' THEN 1 END) as vendas_fechadas,
-    COUNT(CASE WHEN status_name = 'Venda perdida' THEN 1 END) as vendas_perdidas,
-    SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price ELSE 0 END) as receita_total,
-    ROUND(AVG(CASE WHEN status_name = 'Venda ganha' THEN sale_price END), 2) as ticket_medio,
-    ROUND(COUNT(CASE WHEN status_name = 'Venda ganha' THEN 1 END) / 
-          NULLIF(COUNT(CASE WHEN status_name = 'Venda ganha' THEN 1 END) + 
-                 COUNT(CASE WHEN status_name = 'Venda perdida' THEN 1 END), 0) * 100, 1) as win_rate,
-    ROUND(AVG(CASE WHEN status_name = 'Venda ganha' THEN sales_cycle_days END), 1) as ciclo_medio
-FROM sales_metrics 
-WHERE created_date >= '{data_inicio.date()}'
+    CAST(SUM(total_rows) AS SIGNED) as total_leads,
+    CAST(SUM(CASE WHEN status_name = 'Venda ganha' THEN total_rows ELSE 0 END) AS SIGNED) as vendas_fechadas,
+    CAST(SUM(CASE WHEN status_name = 'Venda perdida' THEN total_rows ELSE 0 END) AS SIGNED) as vendas_perdidas,
+    SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price_sum ELSE 0 END) as receita_total,
+    ROUND(SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price_sum END) /
+          NULLIF(SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price_count END), 0), 2) as ticket_medio,
+    ROUND(SUM(CASE WHEN status_name = 'Venda ganha' THEN total_rows ELSE 0 END) / 
+          NULLIF(SUM(CASE WHEN status_name IN ('Venda ganha', 'Venda perdida') THEN total_rows ELSE 0 END), 0) * 100, 1) as win_rate,
+    ROUND(SUM(CASE WHEN status_name = 'Venda ganha' THEN sales_cycle_sum END) /
+          NULLIF(SUM(CASE WHEN status_name = 'Venda ganha' THEN sales_cycle_count END), 0), 1) as ciclo_medio
+FROM dash_sales_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY responsible_user_name, responsible_user_role
 ORDER BY vendas_fechadas DESC
 LIMIT 10
@@ -1154,14 +1168,14 @@ st.subheader("📈 Conversões ao Longo do Tempo")
 
 conversoes_temporais_query = f"""
 SELECT 
-    DATE(closed_at) as data_fechamento,
-    COUNT(CASE WHEN status_name = 'Venda ganha' THEN 1 END) as vendas_fechadas,
-    COUNT(CASE WHEN status_name = 'Venda perdida' THEN 1 END) as vendas_perdidas,
-    SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price ELSE 0 END) as receita_diaria
-FROM sales_metrics 
-WHERE closed_at IS NOT NULL 
-AND created_date >= '{data_inicio.date()}'
-GROUP BY DATE(closed_at)
+    closed_date as data_fechamento,
+    CAST(SUM(CASE WHEN status_name = 'Venda ganha' THEN total_rows ELSE 0 END) AS SIGNED) as vendas_fechadas,
+    CAST(SUM(CASE WHEN status_name = 'Venda perdida' THEN total_rows ELSE 0 END) AS SIGNED) as vendas_perdidas,
+    SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price_sum ELSE 0 END) as receita_diaria
+FROM dash_sales_daily 
+WHERE closed_date IS NOT NULL 
+AND metric_date >= '{data_inicio.date()}'
+GROUP BY closed_date
 ORDER BY data_fechamento DESC
 LIMIT 30
 """
@@ -1521,19 +1535,31 @@ results_query = f"""
 SELECT 
     DATE_FORMAT('{selected_date}', '%Y-%m') as mes_ano,
     NOW() as data_atualizacao,
-    SUM(CASE WHEN sm.status_name = 'Venda ganha' THEN sm.sale_price ELSE 0 END) as receita_realizada,
-    COUNT(DISTINCT l.lead_id) as leads_realizados,
-    COUNT(DISTINCT CASE WHEN sm.status_name = 'Venda ganha' THEN sm.lead_id END) as vendas_fechadas,
-    COUNT(DISTINCT CASE WHEN sm.status_name = 'Venda perdida' THEN sm.lead_id END) as vendas_perdidas,
-    ROUND(COUNT(DISTINCT CASE WHEN sm.status_name = 'Venda ganha' THEN sm.lead_id END) / 
-          NULLIF(COUNT(DISTINCT CASE WHEN sm.status_name IN ('Venda ganha', 'Venda perdida') THEN sm.lead_id END), 0) * 100, 1) as win_rate_real,
-    AVG(CASE WHEN sm.status_name = 'Venda ganha' THEN sm.sale_price END) as ticket_medio_real,
+    COALESCE(s.receita, 0) as receita_realizada,
+    l.leads as leads_realizados,
+    CAST(COALESCE(s.ganhas, 0) AS SIGNED) as vendas_fechadas,
+    CAST(COALESCE(s.perdidas, 0) AS SIGNED) as vendas_perdidas,
+    ROUND(s.ganhas / NULLIF(s.decididas, 0) * 100, 1) as win_rate_real,
+    s.receita / NULLIF(s.vendas_com_preco, 0) as ticket_medio_real,
     DATEDIFF('{selected_date}', DATE_FORMAT('{selected_date}', '%Y-%m-01')) + 1 as dias_passados,
     DATEDIFF(LAST_DAY('{selected_date}'), '{selected_date}') as dias_restantes
-FROM leads_metrics l
-LEFT JOIN sales_metrics sm ON l.lead_id = sm.lead_id
-WHERE l.created_date >= DATE_FORMAT('{selected_date}', '%Y-%m-01')
-AND l.created_date <= LAST_DAY('{selected_date}')
+FROM (
+    SELECT CAST(COALESCE(SUM(total_leads), 0) AS SIGNED) as leads
+    FROM dash_leads_daily
+    WHERE metric_date >= DATE_FORMAT('{selected_date}', '%Y-%m-01')
+    AND metric_date <= LAST_DAY('{selected_date}')
+) l
+CROSS JOIN (
+    SELECT 
+        SUM(won_revenue) as receita,
+        SUM(leads_won) as ganhas,
+        SUM(leads_lost) as perdidas,
+        SUM(leads_decided) as decididas,
+        SUM(won_price_count) as vendas_com_preco
+    FROM dash_leads_sales_daily
+    WHERE metric_date >= DATE_FORMAT('{selected_date}', '%Y-%m-01')
+    AND metric_date <= LAST_DAY('{selected_date}')
+) s
 """
 
 results_df = run_query(results_query)
@@ -1851,14 +1877,15 @@ if not gaps_df.empty:
 followup_segmentation_query = f"""
 SELECT 
     user_name,
-    COUNT(*) as total_followups,
-    COUNT(CASE WHEN follow_up_category = 'alta_prioridade' THEN 1 END) as alta_prioridade,
-    COUNT(CASE WHEN follow_up_category = 'media_prioridade' THEN 1 END) as media_prioridade,
-    COUNT(CASE WHEN follow_up_category = 'baixa_prioridade' THEN 1 END) as baixa_prioridade,
-    AVG(urgency_score) as score_medio_urgencia
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}' AND is_follow_up = 1
+    CAST(SUM(followups) AS SIGNED) as total_followups,
+    CAST(SUM(followups_alta_prioridade) AS SIGNED) as alta_prioridade,
+    CAST(SUM(followups_media_prioridade) AS SIGNED) as media_prioridade,
+    CAST(SUM(followups_baixa_prioridade) AS SIGNED) as baixa_prioridade,
+    SUM(followup_urgency_sum) / NULLIF(SUM(followup_urgency_count), 0) as score_medio_urgencia
+FROM dash_activities_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY user_name
+HAVING SUM(followups) > 0
 """
 
 followup_segmentation_df = run_query(followup_segmentation_query)
@@ -1867,11 +1894,11 @@ followup_segmentation_df = run_query(followup_segmentation_query)
 response_metrics_query = f"""
 SELECT 
     user_name,
-    COUNT(CASE WHEN activity_type = 'note' AND note_text LIKE '%resposta%' OR note_text LIKE '%retorno%' THEN 1 END) as respostas_recebidas,
-    COUNT(CASE WHEN activity_type = 'task' AND is_follow_up = 1 AND complete_till IS NOT NULL AND complete_till >= created_date THEN 1 END) as followups_no_prazo,
-    COUNT(CASE WHEN activity_type = 'task' AND is_follow_up = 1 AND complete_till IS NOT NULL AND complete_till < created_date THEN 1 END) as followups_atrasados
-FROM commercial_activities 
-WHERE created_date >= '{data_inicio.date()}'
+    CAST(SUM(respostas) AS SIGNED) as respostas_recebidas,
+    CAST(SUM(followups_no_prazo) AS SIGNED) as followups_no_prazo,
+    CAST(SUM(followups_atrasados) AS SIGNED) as followups_atrasados
+FROM dash_activities_daily 
+WHERE metric_date >= '{data_inicio.date()}'
 GROUP BY user_name
 """
 
@@ -0,0 +1,253 @@
+# Classificador de texto por palavras-chave para atividades comerciais - Kommo CRM
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+# Palavras-chave por categoria (mesmas regras usadas pelo Módulo 3).
+# Cada categoria é compilada uma única vez, na importação, em uma alternância regex.
+ACTIVITY_KEYWORDS: Dict[str, List[str]] = {
+    # categorize_task_activity
+    'task_call': ['ligar', 'call', 'telefone', 'contato telefônico'],
+    'task_meeting': ['reunião', 'meeting', 'apresentação', 'demo'],
+    'task_email': ['email', 'e-mail', 'enviar'],
+    'task_whatsapp': ['whatsapp', 'wpp', 'zap', 'mensagem'],
+    'task_follow_up': ['follow', 'retorno', 'acompanhar'],
+    'task_proposal': ['proposta', 'orçamento', 'contrato'],
+
+    # _classify_followup_type (ordem de prioridade em FOLLOWUP_TYPE_ORDER)
+    'fup_no_show': [
+        'no show', 'não compareceu', 'não apareceu', 'ausente',
+        'falta', 'cancelou', 'desmarcou'
+    ],
+    'fup_tentativa': [
+        'tentativa', 'tentativa de', '1º', '2º', '3º', '4º', '5º',
+        'primeira', 'segunda', 'terceira', 'quarta', 'quinta'
+    ],
+    'fup_comunicacao': [
+        'ligar', 'telefonar', 'chamar', 'contatar',
+        'falar com', 'conversar com', 'dialogar', 'comunicar'
+    ],
+    'fup_negocio': [
+        'proposta', 'orçamento', 'cotação', 'demonstração',
+        'apresentação', 'reunião', 'encontro', 'visita',
+        'demonstrar', 'mostrar', 'explicar', 'esclarecer'
+    ],
+    'fup_vendas': [
+        'venda', 'comercial', 'comprar', 'adquirir', 'contratar',
+        'fechar', 'fechamento', 'negócio', 'negociação',
+        'prospecção', 'prospectar', 'lead', 'cliente'
+    ],
+    'fup_acompanhamento': [
+        'verificar', 'checar', 'confirmar', 'validar', 'analisar',
+        'revisar', 'monitorar', 'acompanhar', 'retorno', 'retornar'
+    ],
+    'fup_generico': [
+        'fup', 'follow up', 'follow-up', 'followup', 'contato',
+        'entrar em contato', 'fazer contato'
+    ],
+
+    # classify_contact_type (tarefas)
+    'contact_strong_followup': [
+        'fup', 'follow', 'acompanhar', 'retorno', 'retornar', 'abordar',
+        'dia', 'dias', 'semana', 'próximo', 'seguinte', 'retomar',
+        'continuar', 'repetir', 'nova tentativa', 'tentar novamente',
+        'lembrar', 'lembrete', 'agendar', 'marcar', 'verificar',
+        'checar', 'confirmar', 'validar', 'atualizar', 'atualização',
+        'proposta', 'orçamento', 'cotação', 'demonstração',
+        'apresentação', 'reunião', 'encontro', 'visita',
+        'venda', 'comercial', 'negócio', 'negociação',
+        'prospecção', 'prospectar', 'cliente', 'cliente potencial'
+    ],
+    'contact_meeting': ['reunião', 'meeting'],
+    'contact_call': ['ligar', 'call'],
+    'contact_email': ['email', 'e-mail'],
+    'contact_text_followup': [
+        'fup', 'follow', 'acompanhar', 'retorno', 'retornar', 'abordar', 'apresentação',
+        'ligação', 'ligar', 'contato', 'acompanhamento', 'retornar contato', 'retornar ligação',
+        'fazer contato', 'entrar em contato', 'prospeção'
+    ],
+
+    # classify_follow_up_intelligent
+    'follow_up_tag': ['follow', 'fup'],
+    'follow_up_pattern': [
+        'fup', 'follow up', 'followup', 'follow-up',
+        'acompanhamento', 'acompanhar', 'acompanha',
+        'retorno', 'retornar', 'verificar retorno',
+        'verificar', 'confirmar', 'confirma',
+        'lembrar', 'lembrete', 'lembrar de',
+        'prospeção', 'prospectar', 'prospect',
+        'nurturing', 'nurture', 'cuidar',
+        're-engajamento', 'reengajamento', 're-engajar',
+        'recontato', 're-contato', 'novo contato',
+        'segunda tentativa', 'terceira tentativa',
+        'tentativa', 'tentar novamente'
+    ],
+
+    # segment_follow_ups (ordem de prioridade em SEGMENT_TYPE_ORDER)
+    'seg_prospeccao_nurturing': ['prospeção', 'prospectar', 'prospect', 'nurturing', 'nurture'],
+    'seg_acompanhamento_lead': ['acompanhamento', 'acompanhar', 'acompanha', 'fup'],
+    'seg_retorno_reengajamento': ['retorno', 'retornar', 're-engajamento', 'reengajamento', 're-engajar'],
+    'seg_verificacao_confirmacao': ['verificar', 'confirmar', 'confirma', 'verificar retorno'],
+    'seg_lembrete_agendamento': ['lembrar', 'lembrete', 'lembrar de'],
+    'seg_tentativas_multiplas': ['segunda tentativa', 'terceira tentativa', 'tentativa', 'tentar novamente'],
+    'seg_novo_contato': ['recontato', 're-contato', 'novo contato'],
+}
+
+# Ordem de prioridade das cadeias if/elif originais
+TASK_CATEGORY_ORDER = [
+    ('task_call', 'call'),
+    ('task_meeting', 'meeting'),
+    ('task_email', 'email'),
+    ('task_whatsapp', 'whatsapp'),
+    ('task_follow_up', 'follow_up'),
+    ('task_proposal', 'proposal'),
+]
+
+FOLLOWUP_TYPE_ORDER = [
+    ('fup_no_show', 'no_show'),
+    ('fup_tentativa', 'tentativa'),
+    ('fup_comunicacao', 'comunicacao'),
+    ('fup_negocio', 'negocio'),
+    ('fup_vendas', 'vendas'),
+    ('fup_acompanhamento', 'acompanhamento'),
+    ('fup_generico', 'generico'),
+]
+
+SEGMENT_TYPE_ORDER = [
+    ('seg_prospeccao_nurturing', 'prospeccao_nurturing'),
+    ('seg_acompanhamento_lead', 'acompanhamento_lead'),
+    ('seg_retorno_reengajamento', 'retorno_reengajamento'),
+    ('seg_verificacao_confirmacao', 'verificacao_confirmacao'),
+    ('seg_lembrete_agendamento', 'lembrete_agendamento'),
+    ('seg_tentativas_multiplas', 'tentativas_multiplas'),
+    ('seg_novo_contato', 'novo_contato'),
+]
+
+# Menções no texto da nota, gravadas como flags em commercial_activities e agregadas
+# pelo dashboard. Palavras-chave sem acento: o texto é comparado já normalizado
+# (minúsculas, sem acentos), como o LIKE da collation utf8mb4_unicode_ci
+NOTE_MENTION_KEYWORDS: Dict[str, List[str]] = {
+    'mentions_call': ['ligar', 'contato', 'telefone', 'whatsapp'],
+    'mentions_meeting': ['reuniao', 'meeting', 'apresentacao', 'agendamento'],
+    'mentions_email': ['email', 'e-mail', 'correio'],
+    'mentions_response': ['resposta', 'retorno'],
+}
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas e sem acentos (mesma comparação do LIKE case/accent-insensitive)"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def like_condition(keywords: Iterable[str], column: str = 'note_text') -> str:
+    """Condição SQL equivalente, para recalcular as flags de linhas já gravadas"""
+    return ' OR '.join(f"{column} LIKE '%{keyword}%'" for keyword in keywords)
+
+
+def _trie_regex(trie: Dict) -> str:
+    """Converter a trie de palavras-chave em regex (prefixos comuns fatorados)"""
+    terminal = '' in trie
+    branches = [re.escape(char) + _trie_regex(child) for char, child in sorted(trie.items()) if char]
+
+    if not branches:
+        return ''
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+
+    body = '(?:' + '|'.join(branches) + ')' if len(branches) > 1 else '(?:' + branches[0] + ')'
+    return body + '?' if terminal else body
+
+
+def compile_keywords(keywords: Iterable[str]) -> 're.Pattern':
+    """
+    Compilar palavras-chave em um regex literal em forma de trie.
+    O regex casa a palavra-chave mais longa que começa na posição, e
+    `pattern.search(texto)` equivale a `any(k in texto for k in keywords)`.
+    """
+    trie: Dict = {}
+    for keyword in set(keywords):
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return re.compile(_trie_regex(trie))
+
+
+class KeywordClassifier:
+    """
+    Classificador multi-categoria em uma única passada sobre o texto.
+
+    Todas as palavras-chave viram um só regex (trie) que casa, em cada posição
+    do texto, a palavra-chave mais longa ali iniciada. As palavras-chave mais curtas que
+    começam na mesma posição são prefixos dela, então cada palavra-chave já
+    carrega as categorias de todos os seus prefixos e o conjunto de categorias
+    do texto sai exato (mesma semântica de `keyword in texto`). O resultado fica
+    em cache por texto, já que os textos de tarefas se repetem muito.
+    """
+
+    def __init__(self, categories: Dict[str, List[str]], cache_size: int = 65536):
+        self.categories = categories
+
+        keyword_categories: Dict[str, set] = {}
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                keyword_categories.setdefault(keyword, set()).add(category)
+
+        self.keyword_hits: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(
+                category
+                for prefix, prefix_categories in keyword_categories.items()
+                if keyword.startswith(prefix)
+                for category in prefix_categories
+            )
+            for keyword in keyword_categories
+        }
+
+        # Lookahead: o findall testa todas as posições, inclusive as sobrepostas
+        self.pattern = compile_keywords(keyword_categories)
+        self.scanner = re.compile(f'(?=({self.pattern.pattern}))')
+        self._text_hits = lru_cache(maxsize=cache_size)(self._scan)
+
+    def _scan(self, text: str) -> FrozenSet[str]:
+        """Categorias presentes em um texto (uma passada do regex)"""
+        return frozenset().union(*[self.keyword_hits[keyword] for keyword in self.scanner.findall(text)])
+
+    def hits(self, *texts: str) -> FrozenSet[str]:
+        """Todas as categorias presentes em algum dos textos"""
+        found = frozenset()
+        for text in texts:
+            if text:
+                found |= self._text_hits(text)
+        return found
+
+    def matches(self, category: str, *texts: str) -> bool:
+        """Alguma palavra-chave da categoria aparece em algum dos textos?"""
+        return any(category in self._text_hits(text) for text in texts if text)
+
+    def first_match(self, ordered_categories: List[Tuple[str, str]], *texts: str,
+                    default: Optional[str] = None) -> Optional[str]:
+        """Rótulo da primeira categoria (em ordem de prioridade) presente nos textos"""
+        found = self.hits(*texts)
+        if found:
+            for category, label in ordered_categories:
+                if category in found:
+                    return label
+        return default
+
+    def cache_info(self):
+        return self._text_hits.cache_info()
+
+    def cache_clear(self):
+        self._text_hits.cache_clear()
+
+
+# Construídos uma única vez na importação
+ACTIVITY_CLASSIFIER = KeywordClassifier(ACTIVITY_KEYWORDS)
+NOTE_MENTION_CLASSIFIER = KeywordClassifier(NOTE_MENTION_KEYWORDS)
+
+
+def note_mentions(text: str) -> FrozenSet[str]:
+    """Flags de NOTE_MENTION_KEYWORDS presentes no texto da nota"""
+    return NOTE_MENTION_CLASSIFIER.hits(normalize_text(text)) if text else frozenset()
@@ -0,0 +1,223 @@
+# Carga em lote compartilhada pelos ETLs - Kommo Analytics
+import os
+import re
+import logging
+import tempfile
+from typing import Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Especificação de coluna: (nome, tipo, valor_para_nulo[, tamanho_máximo])
+#   raw   -> valor como está (NaN/NaT/None viram valor_para_nulo)
+#   int   -> int Python
+#   float -> float Python
+#   bool  -> bool Python (mesma semântica de bool(valor))
+#   str   -> str(valor), truncado em tamanho_máximo se informado
+# Coluna ausente no DataFrame vira valor_para_nulo em todas as linhas.
+ColumnSpec = Tuple
+
+
+def get_chunk_size() -> int:
+    return int(os.getenv('ETL_LOAD_CHUNK_SIZE', DEFAULT_CHUNK_SIZE))
+
+
+def use_load_data_infile() -> bool:
+    return os.getenv('ETL_LOAD_MODE', 'executemany').lower() == 'infile'
+
+
+def connection_options() -> dict:
+    """
+    Opções extras do mysql.connector.connect para a carga
+    (LOAD DATA LOCAL INFILE precisa ser liberado na conexão)
+    """
+    return {'allow_local_infile': True} if use_load_data_infile() else {}
+
+
+def _convert_column(df: pd.DataFrame, spec: ColumnSpec) -> np.ndarray:
+    """
+    Converter uma coluna para valores Python nativos/NULL de forma vetorizada
+    """
+    name, kind, default = spec[0], spec[1], spec[2]
+    max_length = spec[3] if len(spec) > 3 else None
+    size = len(df)
+
+    if name not in df.columns:
+        return np.full(size, default, dtype=object)
+
+    series = df[name]
+
+    if kind == 'bool':
+        return series.astype(bool).to_numpy(dtype=object)
+
+    mask = series.notna().to_numpy()
+    values = np.full(size, default, dtype=object)
+    if not mask.any():
+        return values
+
+    present = series[mask]
+    if kind == 'int':
+        values[mask] = pd.to_numeric(present).astype('int64').tolist()
+    elif kind == 'float':
+        values[mask] = pd.to_numeric(present).astype('float64').tolist()
+    elif kind == 'str':
+        text = present.astype(str)
+        if max_length:
+            text = text.str.slice(0, max_length)
+        values[mask] = text.tolist()
+    else:
+        values[mask] = present.to_numpy(dtype=object)
+
+    return values
+
+
+def frame_to_rows(df: pd.DataFrame, columns: Sequence[ColumnSpec]) -> List[tuple]:
+    """
+    Converter um DataFrame em tuplas prontas para o cursor (sem iterrows)
+    """
+    converted = [_convert_column(df, spec) for spec in columns]
+    return list(zip(*converted))
+
+
+def iter_row_chunks(df: pd.DataFrame, columns: Sequence[ColumnSpec],
+                    chunk_size: int = None) -> Iterator[List[tuple]]:
+    """
+    Gerar as tuplas em blocos de chunk_size linhas, convertendo um bloco por vez
+    para manter a memória estável em DataFrames grandes
+    """
+    chunk_size = chunk_size or get_chunk_size()
+    for start in range(0, len(df), chunk_size):
+        yield frame_to_rows(df.iloc[start:start + chunk_size], columns)
+
+
+def _mysql_text(value) -> str:
+    """Serializar um valor no formato padrão do LOAD DATA (tab, \\N para NULL)"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if hasattr(value, 'hour') else value.isoformat()
+    text = str(value)
+    return (text.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r').replace('\0', '\\0'))
+
+
+_INSERT_PATTERN = re.compile(
+    r'INSERT\s+INTO\s+(\w+)\s*\((.*?)\)\s*VALUES\s*\(.*?\)\s*(ON\s+DUPLICATE\s+KEY\s+UPDATE.*)?$',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def _load_chunk_infile(cursor, insert_query: str, rows: List[tuple]):
+    """
+    Carregar um bloco via arquivo temporário + LOAD DATA LOCAL INFILE.
+
+    O arquivo entra em uma tabela temporária com a estrutura da tabela destino
+    e de lá segue com o mesmo INSERT ... ON DUPLICATE KEY UPDATE do executemany.
+    """
+    match = _INSERT_PATTERN.search(insert_query.strip())
+    if not match:
+        raise ValueError("insert_query não suportada pelo modo LOAD DATA")
+
+    table, column_list, upsert_clause = match.group(1), match.group(2), match.group(3) or ''
+    column_names = ', '.join(column.strip() for column in column_list.split(','))
+    staging_table = f"tmp_load_{table}"
+
+    cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table} LIKE {table}")
+    cursor.execute(f"TRUNCATE TABLE {staging_table}")
+
+    with tempfile.NamedTemporaryFile('w', suffix='.tsv', encoding='utf-8', delete=False) as spool:
+        for row in rows:
+            spool.write('\t'.join(_mysql_text(value) for value in row) + '\n')
+        spool_path = spool.name
+
+    try:
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging_table} "
+            f"CHARACTER SET utf8mb4 FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+            f"({column_names})",
+            (spool_path,)
+        )
+        cursor.execute(
+            f"INSERT INTO {table} ({column_names}) SELECT {column_names} FROM {staging_table} {upsert_clause}"
+        )
+    finally:
+        os.remove(spool_path)
+
+
+def bulk_load(connection, insert_query: str, df: pd.DataFrame, columns: Sequence[ColumnSpec],
+              chunk_size: int = None, use_infile: bool = None) -> int:
+    """
+    Carregar um DataFrame com insert_query em blocos, com commit por bloco.
+
+    Por padrão usa executemany; com ETL_LOAD_MODE=infile (ou use_infile=True)
+    cada bloco vai por LOAD DATA LOCAL INFILE (ver connection_options).
+    Retorna o total de linhas enviadas.
+    """
+    use_infile = use_load_data_infile() if use_infile is None else use_infile
+    cursor = connection.cursor()
+    total = 0
+
+    try:
+        for rows in iter_row_chunks(df, columns, chunk_size):
+            if use_infile:
+                _load_chunk_infile(cursor, insert_query, rows)
+            else:
+                cursor.executemany(insert_query, rows)
+            connection.commit()
+
+            total += len(rows)
+            logger.info(f"📦 {total}/{len(df)} linhas carregadas")
+
+        # Garante o commit de comandos anteriores (ex.: DELETE) mesmo sem linhas
+        connection.commit()
+    finally:
+        cursor.close()
+
+    return total
+
+
+def swap_load(connection, table: str, insert_query: str, df: pd.DataFrame, columns: Sequence[ColumnSpec],
+              keep_where: str = None, keep_params: Sequence = (), chunk_size: int = None) -> int:
+    """
+    Recarregar uma tabela sem expor estado intermediário ao dashboard.
+
+    As linhas que ficam (keep_where) são copiadas para {table}_staging, o DataFrame
+    é carregado nela em blocos (insert_query com o placeholder {table}) e a troca
+    é feita com um único RENAME TABLE atômico. Leitores veem a versão anterior
+    completa até a troca e a nova completa depois. Retorna as linhas carregadas.
+    """
+    staging_table = f"{table}_staging"
+    old_table = f"{table}_old"
+    cursor = connection.cursor()
+
+    try:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        cursor.execute(f"CREATE TABLE {staging_table} LIKE {table}")
+        if keep_where:
+            cursor.execute(f"INSERT INTO {staging_table} SELECT * FROM {table} WHERE {keep_where}",
+                           tuple(keep_params))
+        connection.commit()
+
+        total = bulk_load(connection, insert_query.format(table=staging_table), df, columns, chunk_size)
+
+        cursor.execute(f"DROP TABLE IF EXISTS {old_table}")
+        cursor.execute(f"RENAME TABLE {table} TO {old_table}, {staging_table} TO {table}")
+        cursor.execute(f"DROP TABLE {old_table}")
+        logger.info(f"🔁 {table}: {total} linhas carregadas via {staging_table} e trocadas atomicamente")
+        return total
+    except Exception:
+        cursor.execute(f"DROP TABLE IF EXISTS {staging_table}")
+        raise
+    finally:
+        cursor.close()
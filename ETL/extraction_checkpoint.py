@@ -0,0 +1,198 @@
+# Checkpoint de extrações paginadas do Kommo por execução (run id)
+# Cada paginação (endpoint + filtros) é gravada página a página em um spool JSONL
+# local; uma execução reiniciada com o mesmo run id reaproveita as páginas já
+# baixadas e continua da página seguinte, em vez de recomeçar da página 1
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import logging
+from typing import Dict, Iterator, List, Optional, Set
+
+from dotenv import load_dotenv
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CHECKPOINT_DIR = os.path.join(PROJECT_ROOT, 'CACHE', 'checkpoints')
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+class PaginationSpool:
+    """
+    Spool de uma paginação: linha 1 com endpoint/filtros, uma linha por página
+    ({"page": n, "items": [...]}) e {"complete": true} quando a paginação terminou.
+
+    Ao abrir, só o número da última página íntegra é lido; uma linha truncada
+    (processo morto no meio da gravação) é descartada.
+    """
+
+    def __init__(self, path: str, header: Dict):
+        self.path = path
+        self.header = header
+        self.last_page = 0
+        self.complete = False
+        self._scan()
+
+    def _scan(self):
+        if not os.path.exists(self.path):
+            self._rewrite_header()
+            return
+
+        valid_bytes = 0
+        with open(self.path, 'rb') as spool_file:
+            for line_number, line in enumerate(spool_file):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+
+                if line_number == 0:
+                    if record != self.header:
+                        break
+                elif record.get('complete'):
+                    self.complete = True
+                elif record.get('page') == self.last_page + 1:
+                    self.last_page = record['page']
+                else:
+                    break
+                valid_bytes += len(line)
+
+        if valid_bytes == 0:
+            self._rewrite_header()
+            return
+
+        # Descartar o que vier depois da última linha íntegra
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, 'r+b') as spool_file:
+                spool_file.truncate(valid_bytes)
+
+    def _rewrite_header(self):
+        self.last_page = 0
+        self.complete = False
+        with open(self.path, 'w', encoding='utf-8') as spool_file:
+            spool_file.write(json.dumps(self.header, ensure_ascii=False) + '\n')
+
+    def _append(self, record: Dict):
+        with open(self.path, 'a', encoding='utf-8') as spool_file:
+            spool_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            spool_file.flush()
+            os.fsync(spool_file.fileno())
+
+    def replay(self) -> Iterator[List[Dict]]:
+        """Páginas já gravadas, em ordem, lidas uma linha por vez"""
+        if not self.last_page:
+            return
+        with open(self.path, encoding='utf-8') as spool_file:
+            next(spool_file)
+            for line in spool_file:
+                record = json.loads(line)
+                if 'page' not in record:
+                    continue
+                yield record['items']
+                if record['page'] >= self.last_page:
+                    return
+
+    def save_page(self, page: int, items: List[Dict]):
+        self._append({'page': page, 'items': items})
+        self.last_page = page
+
+    def mark_complete(self):
+        if not self.complete:
+            self._append({'complete': True})
+            self.complete = True
+
+
+class ExtractionCheckpoint:
+    """
+    Checkpoints das paginações de um módulo em uma execução:
+    <KOMMO_CHECKPOINT_DIR>/<run id>/<módulo>/<endpoint>_<hash dos filtros>.jsonl
+
+    O run id vem de KOMMO_RUN_ID (o orquestrador usa o mesmo id nas novas
+    tentativas de um módulo); sem ele não há checkpoint. Spools mais antigos
+    que KOMMO_CHECKPOINT_TTL são descartados para não retomar dados velhos.
+    """
+
+    def __init__(self, run_id: str, module: str, base_dir: Optional[str] = None, ttl: Optional[float] = None):
+        self.run_id = run_id
+        self.module = module
+        self.base_dir = base_dir or os.getenv('KOMMO_CHECKPOINT_DIR', DEFAULT_CHECKPOINT_DIR)
+        self.ttl = float(ttl if ttl is not None else os.getenv('KOMMO_CHECKPOINT_TTL', DEFAULT_TTL_SECONDS))
+        self.directory = os.path.join(self.base_dir, self._safe(run_id), self._safe(module))
+        self._opened: Set[str] = set()
+
+        os.makedirs(self.base_dir, exist_ok=True)
+        self.prune_expired()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, module: str) -> Optional['ExtractionCheckpoint']:
+        run_id = os.getenv('KOMMO_RUN_ID')
+        if not run_id:
+            return None
+        try:
+            return cls(run_id, module)
+        except OSError as e:
+            logger.warning(f"⚠️ Checkpoint desativado ({e})")
+            return None
+
+    @staticmethod
+    def _safe(value: str) -> str:
+        return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_') or 'default'
+
+    def prune_expired(self):
+        """Remover execuções antigas inteiras (spools com mais de ttl segundos)"""
+        now = time.time()
+        for run_dir in os.listdir(self.base_dir):
+            path = os.path.join(self.base_dir, run_dir)
+            if os.path.isdir(path) and now - os.path.getmtime(path) > self.ttl:
+                shutil.rmtree(path, ignore_errors=True)
+                logger.info(f"🧹 Checkpoints expirados removidos: {run_dir}")
+
+        if os.path.isdir(self.directory):
+            for file_name in os.listdir(self.directory):
+                path = os.path.join(self.directory, file_name)
+                if now - os.path.getmtime(path) > self.ttl:
+                    os.remove(path)
+
+    def open(self, endpoint: str, params: Optional[Dict], embedded_key: str, limit: int) -> PaginationSpool:
+        """Spool da paginação (endpoint + filtros); retoma o existente se for o mesmo"""
+        header = json.loads(json.dumps({
+            'endpoint': endpoint,
+            'params': params or {},
+            'embedded_key': embedded_key,
+            'limit': limit
+        }, sort_keys=True, default=str))
+        digest = hashlib.sha1(json.dumps(header, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(self.directory, f"{self._safe(endpoint)}_{digest}.jsonl")
+
+        spool = PaginationSpool(path, header)
+        self._opened.add(path)
+
+        if spool.complete:
+            logger.info(f"♻️ {endpoint}: {spool.last_page} página(s) reaproveitadas do checkpoint (completo)")
+        elif spool.last_page:
+            logger.info(f"♻️ {endpoint}: retomando do checkpoint após a página {spool.last_page}")
+        return spool
+
+    def clear(self):
+        """Remover os spools abertos por esta instância (execução concluída com sucesso)"""
+        for path in self._opened:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._opened.clear()
+        try:
+            os.rmdir(self.directory)
+            os.rmdir(os.path.dirname(self.directory))
+        except OSError:
+            pass
@@ -1,12 +1,14 @@
 # Script para corrigir nomes dos motivos de perda
 import os
-import requests
 import mysql.connector
 import pandas as pd
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 
+from kommo_client import KommoClient
+from reference_cache import ReferenceCache
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,10 +31,11 @@ class LossReasonsFixer:
             'database': os.getenv('DB_NAME')
         }
         
-        self.headers = {
-            'Authorization': f'Bearer {self.kommo_config["access_token"]}',
-            'Content-Type': 'application/json'
-        }
+        # Cliente HTTP com pool de conexões (keep-alive, gzip e estatísticas por endpoint)
+        self.client = KommoClient(self.kommo_config['base_url'], self.kommo_config['access_token'])
+        
+        # Dados de referência (usuários, pipelines, motivos de perda) com cache em disco compartilhado
+        self.reference_cache = ReferenceCache(self.client)
 
     def get_loss_reasons_from_api(self):
         """
@@ -41,42 +44,13 @@ class LossReasonsFixer:
         try:
             logger.info("Buscando motivos de perda na API do Kommo...")
             
-            # Buscar motivos de perda
-            url = f"{self.kommo_config['base_url']}/api/v4/leads/loss_reasons"
-            params = {'limit': 250}
-            
+            # Buscar motivos de perda (revalida o cache compartilhado mesmo dentro do TTL)
             loss_reasons = {}
-            page = 1
             
-            while True:
-                params['page'] = page
-                try:
-                    response = requests.get(url, headers=self.headers, params=params)
-                    response.raise_for_status()
-                    
-                    data = response.json()
-                    reasons = data.get('_embedded', {}).get('loss_reasons', [])
-                    
-                    if not reasons:
-                        break
-                    
-                    for reason in reasons:
-                        reason_id = reason.get('id')
-                        reason_name = reason.get('name')
-                        
-                        if reason_id and reason_name:
-                            loss_reasons[reason_id] = reason_name
-                    
-                    logger.info(f"Página {page}: {len(reasons)} motivos de perda encontrados")
-                    
-                    if len(reasons) < 250:
-                        break
-                        
-                    page += 1
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao buscar motivos de perda na página {page}: {e}")
-                    break
+            try:
+                loss_reasons = self.reference_cache.loss_reasons_mapping(force_refresh=True)
+            except Exception as e:
+                logger.error(f"Erro ao buscar motivos de perda: {e}")
             
             logger.info(f"Total de motivos de perda encontrados: {len(loss_reasons)}")
             
@@ -0,0 +1,404 @@
+# Cliente HTTP compartilhado para a API do Kommo CRM
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+from extraction_checkpoint import ExtractionCheckpoint
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DEFAULT_BASE_URL = 'https://previdas.kommo.com'
+DEFAULT_PAGE_LIMIT = 250
+
+# Buckets compartilhados por conta (base_url) dentro do processo
+_shared_buckets: Dict[str, 'TokenBucket'] = {}
+_shared_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe para respeitar o limite de requisições da API
+    (o Kommo permite ~7 req/s por conta).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Bloquear até haver um token disponível"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+def get_shared_bucket(base_url: str, rate: float) -> TokenBucket:
+    """Retornar o token bucket compartilhado da conta (criado na primeira chamada)"""
+    with _shared_buckets_lock:
+        if base_url not in _shared_buckets:
+            _shared_buckets[base_url] = TokenBucket(rate)
+        return _shared_buckets[base_url]
+
+
+class KommoClient:
+    """
+    Cliente da API do Kommo baseado em requests.Session com pool de conexões.
+
+    Reaproveita conexões TLS (keep-alive), aceita respostas gzip e mantém
+    estatísticas de requisições, bytes e latência por endpoint. Todas as
+    requisições passam por um token bucket compartilhado (KOMMO_RATE_LIMIT)
+    e a paginação busca até KOMMO_CONCURRENCY páginas em paralelo. Com um
+    checkpoint (ver extraction_checkpoint) cada página é gravada em disco e uma
+    execução reiniciada continua da última página baixada.
+
+    Em modo estrito (checkpoint ativo ou KOMMO_STRICT_EXTRACTION=true) toda
+    paginação que falha é registrada, mesmo que o chamador capture a exceção:
+    os módulos chamam ensure_complete_extraction() antes do load e a execução
+    falha em vez de seguir com dados parciais.
+    """
+
+    def __init__(self, base_url: Optional[str] = None, access_token: Optional[str] = None,
+                 pool_size: Optional[int] = None, timeout: Optional[float] = None,
+                 max_retries: int = 3, rate_limit: Optional[float] = None,
+                 concurrency: Optional[int] = None, checkpoint: Optional[ExtractionCheckpoint] = None,
+                 strict: Optional[bool] = None):
+        self.base_url = (base_url or os.getenv('KOMMO_BASE_URL') or DEFAULT_BASE_URL).rstrip('/')
+        self.access_token = access_token or os.getenv('KOMMO_ACCESS_TOKEN')
+        self.pool_size = pool_size or int(os.getenv('KOMMO_POOL_SIZE', 10))
+        self.timeout = timeout or float(os.getenv('KOMMO_TIMEOUT', 30))
+        self.rate_limit = rate_limit or float(os.getenv('KOMMO_RATE_LIMIT', 7))
+        self.concurrency = concurrency or int(os.getenv('KOMMO_CONCURRENCY', 4))
+        self.bucket = get_shared_bucket(self.base_url, self.rate_limit)
+        self.checkpoint = checkpoint
+        if strict is None:
+            strict = os.getenv('KOMMO_STRICT_EXTRACTION', 'false').lower() in ('1', 'true', 'yes')
+        self.strict = strict or checkpoint is not None
+        self.failed_paginations: List[str] = []
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {self.access_token}',
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
+        })
+
+        # Retry apenas para erros transitórios (429 e 5xx), respeitando Retry-After
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=1.0,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.stats = defaultdict(lambda: {'requests': 0, 'errors': 0, 'bytes': 0, 'latency_seconds': 0.0})
+        self.stats_lock = threading.Lock()
+
+    def _build_url(self, endpoint: str) -> str:
+        if endpoint.startswith('http'):
+            return endpoint
+        return f"{self.base_url}/{endpoint.lstrip('/')}"
+
+    def _stats_key(self, url: str) -> str:
+        """Normalizar endpoint para estatísticas (IDs numéricos viram {id})"""
+        parts = [('{id}' if part.isdigit() else part) for part in urlparse(url).path.split('/')]
+        return '/'.join(parts)
+
+    def get(self, endpoint: str, params: Optional[Dict] = None,
+            headers: Optional[Dict] = None) -> requests.Response:
+        """
+        GET na API registrando requisições, bytes e latência do endpoint
+        (headers extras, ex.: If-None-Match, valem só para esta requisição)
+        """
+        url = self._build_url(endpoint)
+        key = self._stats_key(url)
+
+        self.bucket.acquire()
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except requests.RequestException:
+            self._record(key, time.perf_counter() - start, 0, error=True)
+            raise
+
+        self._record(key, time.perf_counter() - start, len(response.content), error=response.status_code >= 400)
+        return response
+
+    def _record(self, key: str, latency: float, size: int, error: bool):
+        with self.stats_lock:
+            stats = self.stats[key]
+            stats['requests'] += 1
+            stats['latency_seconds'] += latency
+            stats['bytes'] += size
+            if error:
+                stats['errors'] += 1
+
+    def get_json(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        GET retornando o JSON da resposta (None para 204 ou erro HTTP)
+        """
+        response = self.get(endpoint, params)
+
+        if response.status_code == 204:
+            return None
+        if response.status_code != 200:
+            logger.error(f"Erro na API {endpoint}: {response.status_code} - {response.text[:200]}")
+            return None
+
+        return response.json()
+
+    def paginate(self, endpoint: str, params: Optional[Dict] = None, embedded_key: Optional[str] = None,
+                 limit: int = DEFAULT_PAGE_LIMIT, max_pages: Optional[int] = None,
+                 delay: float = 0.0, raise_on_error: bool = False,
+                 concurrency: Optional[int] = None) -> Iterator[List[Dict]]:
+        """
+        Gerador de páginas de um endpoint paginado do Kommo.
+
+        Produz a lista de itens de `_embedded[embedded_key]` de cada página, em
+        ordem, e para na primeira página vazia, incompleta (< limit), 204 ou erro
+        HTTP. Por padrão embedded_key é o último segmento do endpoint; com
+        raise_on_error=True um erro HTTP levanta exceção em vez de encerrar.
+
+        Com concurrency > 1 as páginas N..N+k-1 são buscadas em paralelo (asyncio),
+        limitadas pelo token bucket; o delay fixo só se aplica ao modo sequencial.
+
+        Com checkpoint, as páginas já gravadas na execução são reproduzidas do
+        disco e a busca continua da página seguinte. Em modo estrito erro HTTP
+        levanta exceção e fica registrado em failed_paginations (a próxima
+        tentativa retoma do checkpoint em vez de seguir com dados truncados).
+        """
+        if not self.strict:
+            yield from self._paginate(endpoint, params, embedded_key, limit, max_pages,
+                                      delay, raise_on_error, concurrency)
+            return
+
+        try:
+            yield from self._paginate(endpoint, params, embedded_key, limit, max_pages,
+                                      delay, True, concurrency)
+        except Exception as e:
+            self.failed_paginations.append(f"{endpoint}: {e}")
+            raise
+
+    def _paginate(self, endpoint: str, params: Optional[Dict], embedded_key: Optional[str], limit: int,
+                  max_pages: Optional[int], delay: float, raise_on_error: bool,
+                  concurrency: Optional[int]) -> Iterator[List[Dict]]:
+        """Paginação com checkpoint opcional (ver paginate)"""
+        embedded_key = embedded_key or endpoint.rstrip('/').split('/')[-1]
+        concurrency = concurrency or self.concurrency
+        first_page = 1
+
+        spool = None
+        if self.checkpoint is not None:
+            spool = self.checkpoint.open(endpoint, params, embedded_key, limit)
+            yield from spool.replay()
+            if spool.complete:
+                return
+            first_page = spool.last_page + 1
+
+        if concurrency > 1:
+            pages = self._paginate_concurrent(endpoint, params, embedded_key, limit, max_pages,
+                                              raise_on_error, concurrency, first_page)
+        else:
+            pages = self._paginate_sequential(endpoint, params, embedded_key, limit, max_pages,
+                                              raise_on_error, delay, first_page)
+
+        for page, items in pages:
+            if spool is not None:
+                spool.save_page(page, items)
+            yield items
+
+        if spool is not None:
+            spool.mark_complete()
+
+    def _paginate_sequential(self, endpoint: str, params: Optional[Dict], embedded_key: str, limit: int,
+                             max_pages: Optional[int], raise_on_error: bool, delay: float,
+                             first_page: int = 1) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Paginação sequencial: (número da página, itens) até a primeira página
+        vazia ou incompleta
+        """
+        page = first_page - 1
+
+        while True:
+            page += 1
+            if max_pages and page > max_pages:
+                logger.warning(f"⚠️ {endpoint}: limite de {max_pages} páginas atingido")
+                break
+
+            status, items = self._fetch_page(endpoint, params, embedded_key, limit, page, raise_on_error)
+            if not items:
+                break
+
+            yield page, items
+
+            if len(items) < limit:
+                break
+
+            if delay:
+                time.sleep(delay)
+
+    def _fetch_page(self, endpoint: str, params: Optional[Dict], embedded_key: str, limit: int,
+                    page: int, raise_on_error: bool) -> Tuple[int, List[Dict]]:
+        """
+        Buscar uma página; retorna (status HTTP, itens) com lista vazia em 204/erro
+        """
+        page_params = dict(params or {})
+        page_params['limit'] = limit
+        page_params['page'] = page
+
+        response = self.get(endpoint, page_params)
+
+        if response.status_code == 204:
+            return response.status_code, []
+        if response.status_code != 200:
+            if raise_on_error:
+                response.raise_for_status()
+            logger.warning(f"⚠️ Erro na página {page} de {endpoint}: {response.status_code}")
+            return response.status_code, []
+
+        items = response.json().get('_embedded', {}).get(embedded_key, [])
+        if items:
+            logger.info(f"📄 {endpoint} página {page}: {len(items)} registros")
+        return response.status_code, items
+
+    async def _fetch_window(self, endpoint: str, params: Optional[Dict], embedded_key: str, limit: int,
+                            pages: List[int], raise_on_error: bool) -> List[Tuple[int, List[Dict]]]:
+        """
+        Buscar um bloco de páginas em paralelo (threads do pool de conexões).
+        Exceções voltam no lugar da página, para que as anteriores ainda sejam entregues
+        """
+        tasks = [
+            asyncio.to_thread(self._fetch_page, endpoint, params, embedded_key, limit, page, raise_on_error)
+            for page in pages
+        ]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _paginate_concurrent(self, endpoint: str, params: Optional[Dict], embedded_key: str, limit: int,
+                             max_pages: Optional[int], raise_on_error: bool,
+                             concurrency: int, first_page: int = 1) -> Iterator[Tuple[int, List[Dict]]]:
+        """
+        Paginação concorrente: a primeira página é buscada sozinha (resultados
+        que cabem em uma página custam uma requisição); depois de uma página
+        cheia, busca blocos de `concurrency` páginas e para no primeiro bloco
+        que contenha uma página vazia ou incompleta
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            window = 1
+            while True:
+                last_page = first_page + window - 1
+                if max_pages:
+                    last_page = min(last_page, max_pages)
+                if first_page > last_page:
+                    logger.warning(f"⚠️ {endpoint}: limite de {max_pages} páginas atingido")
+                    return
+
+                pages = list(range(first_page, last_page + 1))
+                results = loop.run_until_complete(
+                    self._fetch_window(endpoint, params, embedded_key, limit, pages, raise_on_error)
+                )
+
+                for page, result in zip(pages, results):
+                    if isinstance(result, BaseException):
+                        raise result
+                    status, items = result
+                    if not items:
+                        return
+
+                    yield page, items
+
+                    if len(items) < limit:
+                        return
+
+                first_page = last_page + 1
+                window = concurrency
+        finally:
+            loop.close()
+
+    def ensure_complete_extraction(self):
+        """
+        Levantar exceção se alguma paginação falhou nesta execução (modo estrito),
+        mesmo que o módulo tenha capturado o erro e seguido com a lista parcial
+        """
+        if self.failed_paginations:
+            failures = '; '.join(self.failed_paginations)
+            self.failed_paginations = []
+            raise RuntimeError(f"Extração incompleta ({failures})")
+
+    def clear_checkpoint(self):
+        """Descartar os spools da execução (chamado quando o módulo termina com sucesso)"""
+        if self.checkpoint is not None:
+            self.checkpoint.clear()
+
+    def fetch_all(self, endpoint: str, params: Optional[Dict] = None, **kwargs) -> List[Dict]:
+        """
+        Buscar todos os itens de um endpoint paginado em uma única lista
+        """
+        items = []
+        for page_items in self.paginate(endpoint, params, **kwargs):
+            items.extend(page_items)
+        return items
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Estatísticas por endpoint: requisições, erros, bytes e latência média
+        """
+        summary = {}
+        for endpoint, stats in self.stats.items():
+            summary[endpoint] = {
+                **stats,
+                'avg_latency_ms': round(stats['latency_seconds'] / stats['requests'] * 1000, 1) if stats['requests'] else 0.0
+            }
+        return summary
+
+    def log_stats(self):
+        """
+        Registrar no log onde o tempo de extração foi gasto
+        """
+        if not self.stats:
+            return
+
+        logger.info("📡 ESTATÍSTICAS DA API KOMMO:")
+        ordered = sorted(self.get_stats().items(), key=lambda item: item[1]['latency_seconds'], reverse=True)
+        for endpoint, stats in ordered:
+            logger.info(
+                f"   {endpoint}: {stats['requests']} req | {stats['errors']} erros | "
+                f"{stats['bytes'] / 1024:.1f} KB | {stats['latency_seconds']:.1f}s total | "
+                f"{stats['avg_latency_ms']:.0f} ms/req"
+            )
+
+    def close(self):
+        self.session.close()
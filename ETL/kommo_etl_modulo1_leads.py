@@ -1,21 +1,189 @@
 # ETL COMPLETO para Entrada e Origem de Leads - Kommo CRM
 import os
-import requests
+import argparse
+import numpy as np
 import pandas as pd
 import mysql.connector
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta, date
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 import time
 import logging
+import json
+from functools import lru_cache
 from dotenv import load_dotenv
 
+from extraction_checkpoint import ExtractionCheckpoint
+from kommo_client import KommoClient
+from bulk_loader import bulk_load, connection_options, get_chunk_size
+from query_layer import ensure_indexes
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Eventos que contam como primeiro contato com o lead no cálculo do tempo de resposta:
+# só ações da equipe (ligação/mensagem enviada, nota, tarefa concluída). Ligação recebida
+# e tarefa criada (muitas vezes por automação na criação do lead) não são resposta
+FIRST_TOUCH_EVENT_TYPES = [
+    event_type.strip() for event_type in os.getenv(
+        'MODULO1_FIRST_TOUCH_EVENT_TYPES',
+        'outgoing_call,outgoing_chat_message,outgoing_sms,common_note_added,task_completed'
+    ).split(',') if event_type.strip()
+]
+
+# O Kommo devolve no máximo 100 eventos por página
+EVENTS_PAGE_LIMIT = 100
+
+# Tempo de resposta máximo considerado realista (horas)
+MAX_RESPONSE_TIME_HOURS = 48
+
+
+class FirstTouchIndex:
+    """
+    lead_id -> timestamp do primeiro evento, em dois arrays int64 ordenados
+    (busca binária), com a janela de eventos que foi varrida.
+
+    Um lead criado entre window_start e created_until tem na janela todo contato
+    que ainda pode virar tempo de resposta (a varredura vai até
+    MAX_RESPONSE_TIME_HOURS depois do período, ou até agora): o primeiro evento
+    encontrado é o primeiro contato e, sem evento, não houve contato a tempo.
+    created_until=None: a varredura chegou a agora, sem limite superior.
+    """
+
+    def __init__(self, first_touch: Dict[int, int], window_start: int, created_until: Optional[int] = None):
+        lead_ids = np.fromiter(first_touch.keys(), dtype=np.int64, count=len(first_touch))
+        timestamps = np.fromiter(first_touch.values(), dtype=np.int64, count=len(first_touch))
+        order = np.argsort(lead_ids)
+        self.lead_ids = lead_ids[order]
+        self.timestamps = timestamps[order]
+        self.window_start = window_start
+        self.created_until = created_until
+
+    def __len__(self) -> int:
+        return len(self.lead_ids)
+
+    def covers(self, lead: Dict) -> bool:
+        """O primeiro contato do lead, se houve, está na janela de eventos?"""
+        created_at = lead.get('created_at', 0)
+        if created_at < self.window_start:
+            return False
+        return self.created_until is None or created_at <= self.created_until
+
+    def get(self, lead_id: Optional[int]) -> Optional[int]:
+        if lead_id is None or not len(self.lead_ids):
+            return None
+        position = np.searchsorted(self.lead_ids, lead_id)
+        if position < len(self.lead_ids) and self.lead_ids[position] == lead_id:
+            return int(self.timestamps[position])
+        return None
+
+
 class KommoLeadsETL:
+    # Sobreposição aplicada ao watermark da sync incremental (segundos)
+    SYNC_OVERLAP_SECONDS = 300
+    # Tamanho máximo do cache de classificação de origem (combinações distintas de campos)
+    SOURCE_CACHE_SIZE = 4096
+
+    # Tabela melhorada com campos de origem detalhados
+    LEADS_TABLE_DDL = """
+    CREATE TABLE IF NOT EXISTS leads_metrics (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        lead_id BIGINT UNIQUE,
+        created_date DATE,
+        created_datetime DATETIME,
+        
+        -- Campos de origem detalhados
+        primary_source VARCHAR(100),
+        utm_source VARCHAR(255),
+        utm_medium VARCHAR(255),
+        utm_campaign VARCHAR(255),
+        utm_content VARCHAR(255),
+        utm_term VARCHAR(255),
+        utm_referrer VARCHAR(255),
+        referrer VARCHAR(255),
+        lead_source_field VARCHAR(255),
+        gclid VARCHAR(255),
+        fbclid VARCHAR(255),
+        gclientid VARCHAR(255),
+        detailed_source TEXT,
+        
+        -- Campos existentes
+        lead_value DECIMAL(10,2),
+        lead_cost DECIMAL(10,2),
+        response_time_hours DECIMAL(8,2),
+        pipeline_id BIGINT,
+        status_id BIGINT,
+        responsible_user_id BIGINT,
+        contact_count INT,
+        updated_at DATETIME,
+        
+        -- Índices para performance
+        INDEX idx_created_date (created_date),
+        INDEX idx_primary_source (primary_source),
+        INDEX idx_utm_source (utm_source),
+        INDEX idx_utm_medium (utm_medium),
+        INDEX idx_pipeline_id (pipeline_id)
+    )
+    """
+
+    LEADS_INSERT_QUERY = """
+    INSERT INTO leads_metrics (
+        lead_id, created_date, created_datetime, primary_source, utm_source,
+        utm_medium, utm_campaign, utm_content, utm_term, utm_referrer,
+        referrer, lead_source_field, gclid, fbclid, gclientid, detailed_source,
+        lead_value, lead_cost, response_time_hours, pipeline_id, status_id,
+        responsible_user_id, contact_count, updated_at
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        primary_source = VALUES(primary_source),
+        utm_source = VALUES(utm_source),
+        utm_medium = VALUES(utm_medium),
+        utm_campaign = VALUES(utm_campaign),
+        utm_content = VALUES(utm_content),
+        utm_term = VALUES(utm_term),
+        utm_referrer = VALUES(utm_referrer),
+        referrer = VALUES(referrer),
+        lead_source_field = VALUES(lead_source_field),
+        gclid = VALUES(gclid),
+        fbclid = VALUES(fbclid),
+        gclientid = VALUES(gclientid),
+        detailed_source = VALUES(detailed_source),
+        lead_value = VALUES(lead_value),
+        lead_cost = VALUES(lead_cost),
+        response_time_hours = VALUES(response_time_hours),
+        updated_at = VALUES(updated_at)
+    """
+
+    # Conversão vetorizada das colunas do insert (ver bulk_loader)
+    LEADS_COLUMNS = [
+        ('lead_id', 'int', None),
+        ('created_date', 'raw', None),
+        ('created_datetime', 'raw', None),
+        ('primary_source', 'raw', None),
+        ('utm_source', 'raw', None),
+        ('utm_medium', 'raw', None),
+        ('utm_campaign', 'raw', None),
+        ('utm_content', 'raw', None),
+        ('utm_term', 'raw', None),
+        ('utm_referrer', 'raw', None),
+        ('referrer', 'raw', None),
+        ('lead_source_field', 'raw', None),
+        ('gclid', 'raw', None),
+        ('fbclid', 'raw', None),
+        ('gclientid', 'raw', None),
+        ('detailed_source', 'raw', None),
+        ('lead_value', 'float', 0),
+        ('lead_cost', 'float', None),
+        ('response_time_hours', 'float', None),
+        ('pipeline_id', 'int', None),
+        ('status_id', 'int', None),
+        ('responsible_user_id', 'int', None),
+        ('contact_count', 'int', 0),
+        ('updated_at', 'raw', None)
+    ]
+
     def __init__(self):
         self.kommo_config = {
             'base_url': 'https://previdas.kommo.com',
@@ -31,10 +199,13 @@ class KommoLeadsETL:
             'database': os.getenv('DB_NAME')
         }
         
-        self.headers = {
-            'Authorization': f'Bearer {self.kommo_config["access_token"]}',
-            'Content-Type': 'application/json'
-        }
+        # Cliente HTTP com pool de conexões (keep-alive, gzip e estatísticas por endpoint)
+        # Checkpoint por página quando KOMMO_RUN_ID está definido (retomada de execuções interrompidas)
+        self.client = KommoClient(self.kommo_config['base_url'], self.kommo_config['access_token'],
+                                  checkpoint=ExtractionCheckpoint.from_env('modulo1_leads'))
+        
+        # Modo streaming: máximo de linhas transformadas em memória antes de cada load
+        self.stream_buffer_rows = int(os.getenv('MODULO1_STREAM_BUFFER_ROWS', get_chunk_size()))
 
         # Mapeamento dos campos customizados específicos do  Kommo
         self.source_field_mapping = {
@@ -51,6 +222,10 @@ class KommoLeadsETL:
             'fbclid': 47298,         # Facebook Click ID
         }
 
+        # Cache LRU da fonte primária por assinatura dos campos de origem,
+        # compartilhado entre o transform e extract_lead_cost
+        self._primary_source_cache = lru_cache(maxsize=self.SOURCE_CACHE_SIZE)(self._classify_source_fingerprint)
+
     def standardize_source_name(self, source_name: str) -> str:
         """
         NOVO: Padronizar nomes das fontes para evitar duplicatas
@@ -173,8 +348,7 @@ class KommoLeadsETL:
         Execute uma vez para descobrir os IDs dos campos
         """
         try:
-            url = f"{self.kommo_config['base_url']}/api/v4/leads/custom_fields"
-            response = requests.get(url, headers=self.headers)
+            response = self.client.get('/api/v4/leads/custom_fields')
             
             if response.status_code == 200:
                 fields = response.json().get('_embedded', {}).get('custom_fields', [])
@@ -203,143 +377,231 @@ class KommoLeadsETL:
             logger.error(f"Erro ao buscar campos customizados: {e}")
             return []
 
-    def extract_leads(self, start_date: datetime, end_date: datetime) -> Dict:
+    def build_date_filter(self, start_date: datetime, end_date: datetime, updated_since: Optional[int] = None) -> Dict:
+        """
+        Filtro de período: por criação (carga completa) ou por atualização (incremental)
+        """
+        if updated_since is not None:
+            logger.info(f"Extraindo leads atualizados desde {datetime.fromtimestamp(updated_since)}")
+            return {'filter[updated_at][from]': updated_since}
+        
+        logger.info(f"Extraindo leads de {start_date} até {end_date}")
+        return {
+            'filter[created_at][from]': int(start_date.timestamp()),
+            'filter[created_at][to]': int(end_date.timestamp())
+        }
+
+    def extract_leads(self, start_date: datetime, end_date: datetime, updated_since: Optional[int] = None) -> Dict:
         """
         EXTRACT - Extrair leads do Kommo API com paginação
+        
+        Com updated_since (timestamp Unix) o filtro passa a ser
+        filter[updated_at][from], trazendo apenas o que mudou desde a última sync.
         """
         try:
             # Converter datas para timestamp Unix
             start_timestamp = int(start_date.timestamp())
             end_timestamp = int(end_date.timestamp())
-            
-            logger.info(f"Extraindo leads de {start_date} até {end_date}")
+            date_filter = self.build_date_filter(start_date, end_date, updated_since)
             
             # Inicializar estruturas de dados
-            all_contacts = []
             all_leads = []
-            all_events = []
+            first_touch = None
+            
+            # 1. Buscar leads/negócios com paginação. Falha no meio da paginação
+            # aborta a execução: com a lista truncada o watermark avançaria além
+            # dos leads das páginas não buscadas
+            leads_params = {
+                **date_filter,
+                'with': 'contacts,custom_fields'
+            }
             
-            # 1. Buscar contatos (leads) com paginação
-            try:
-                page = 1
-                while True:
-                    contacts_url = f"{self.kommo_config['base_url']}/api/v4/contacts"
-                    contacts_params = {
-                        'filter[created_at][from]': start_timestamp,
-                        'filter[created_at][to]': end_timestamp,
-                        'limit': 250,
-                        'page': page,
-                        'with': 'leads,custom_fields'
-                    }
-                    
-                    contacts_response = requests.get(
-                        contacts_url, 
-                        headers=self.headers, 
-                        params=contacts_params
-                    )
-                    
-                    if contacts_response.status_code == 200:
-                        page_data = contacts_response.json()
-                        page_contacts = page_data.get('_embedded', {}).get('contacts', [])
-                        
-                        if not page_contacts:
-                            break
-                            
-                        all_contacts.extend(page_contacts)
-                        logger.info(f" Contatos - Página {page}: {len(page_contacts)} contatos")
-                        page += 1
-                        
-                        if len(page_contacts) < 250:
-                            break
-                            
-                        time.sleep(0.5)  # Rate limiting
-                    else:
-                        logger.warning(f"⚠️ Erro na página {page} de contatos: {contacts_response.status_code}")
-                        break
-                
-                logger.info(f" Total de contatos extraídos: {len(all_contacts)}")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Erro ao extrair contatos: {e}")
+            for page_leads in self.client.paginate('/api/v4/leads', leads_params, raise_on_error=True):
+                all_leads.extend(page_leads)
             
-            # 2. Buscar leads/negócios com paginação
-            try:
-                page = 1
-                while True:
-                    leads_url = f"{self.kommo_config['base_url']}/api/v4/leads"
-                    leads_params = {
-                        'filter[created_at][from]': start_timestamp,
-                        'filter[created_at][to]': end_timestamp,
-                        'limit': 250,
-                        'page': page,
-                        'with': 'contacts,custom_fields'
-                    }
-                    
-                    leads_response = requests.get(
-                        leads_url, 
-                        headers=self.headers, 
-                        params=leads_params
-                    )
-                    
-                    if leads_response.status_code == 200:
-                        page_data = leads_response.json()
-                        page_leads = page_data.get('_embedded', {}).get('leads', [])
-                        
-                        if not page_leads:
-                            break
-                            
-                        all_leads.extend(page_leads)
-                        logger.info(f" Leads - Página {page}: {len(page_leads)} leads")
-                        page += 1
-                        
-                        if len(page_leads) < 250:
-                            break
-                            
-                        time.sleep(0.5)  # Rate limiting
-                    else:
-                        logger.warning(f"⚠️ Erro na página {page} de leads: {leads_response.status_code}")
-                        break
-                
-                logger.info(f" Total de leads extraídos: {len(all_leads)}")
-                
-            except Exception as e:
-                logger.warning(f"⚠️ Erro ao extrair leads: {e}")
+            logger.info(f" Total de leads extraídos: {len(all_leads)}")
             
-            # 3. Buscar eventos para tempo de resposta
+            # 2. Primeiro contato por lead (eventos paginados) para o tempo de resposta
             try:
-                events_url = f"{self.kommo_config['base_url']}/api/v4/events"
-                events_params = {
-                    'filter[created_at][from]': start_timestamp,
-                    'filter[created_at][to]': end_timestamp,
-                    'limit': 250
-                }
-                
-                events_response = requests.get(
-                    events_url, 
-                    headers=self.headers, 
-                    params=events_params
+                first_touch = self.extract_first_touch_index(
+                    updated_since if updated_since is not None else start_timestamp, end_timestamp
                 )
-                
-                if events_response.status_code == 200:
-                    events_data = events_response.json()
-                    all_events = events_data.get('_embedded', {}).get('events', [])
-                    logger.info(f"✅ Eventos extraídos: {len(all_events)}")
-                else:
-                    logger.warning(f"⚠️ Erro ao extrair eventos: {events_response.status_code}")
-                    
             except Exception as e:
-                logger.warning(f"⚠️ Erro ao extrair eventos: {e}")
+                logger.warning(f"⚠️ Erro ao extrair eventos: {e} - tempo de resposta virá do banco")
             
             return {
-                'contacts': all_contacts,
                 'leads': all_leads,
-                'events': all_events
+                'first_touch': first_touch
             }
             
         except Exception as e:
             logger.error(f"Erro inesperado na extração: {e}")
             raise
 
+    def extract_first_touch_index(self, start_timestamp: int, end_timestamp: int) -> FirstTouchIndex:
+        """
+        Varrer todas as páginas de eventos de leads dos tipos de FIRST_TOUCH_EVENT_TYPES
+        guardando só o menor created_at por lead: cada página é descartada após
+        processada, então a memória é proporcional ao número de leads, não de eventos
+        
+        Os eventos vão até MAX_RESPONSE_TIME_HOURS depois de end_timestamp (limitado
+        a agora): um lead criado no fim do período e atendido no dia seguinte
+        ainda tem o seu primeiro contato no índice
+        """
+        response_window = MAX_RESPONSE_TIME_HOURS * 3600
+        now = int(time.time())
+        scan_end = min(now, end_timestamp + response_window)
+        
+        events_params = {
+            'filter[created_at][from]': start_timestamp,
+            'filter[created_at][to]': scan_end,
+            'filter[entity]': 'lead',
+            'filter[type]': ','.join(FIRST_TOUCH_EVENT_TYPES)
+        }
+        
+        first_touch: Dict[int, int] = {}
+        total_events = 0
+        
+        for events in self.client.paginate('/api/v4/events', events_params, limit=EVENTS_PAGE_LIMIT,
+                                           raise_on_error=True):
+            total_events += len(events)
+            for event in events:
+                if event.get('entity_type') != 'lead':
+                    continue
+                lead_id = event.get('entity_id')
+                created_at = event.get('created_at')
+                if lead_id is None or created_at is None:
+                    continue
+                
+                current = first_touch.get(lead_id)
+                if current is None or created_at < current:
+                    first_touch[lead_id] = created_at
+        
+        logger.info(f"✅ Eventos extraídos: {total_events} (primeiro contato de {len(first_touch)} leads)")
+        # Varredura até agora cobre qualquer lead; senão, só os criados a tempo do limite
+        created_until = None if scan_end >= now else scan_end - response_window
+        return FirstTouchIndex(first_touch, start_timestamp, created_until)
+
+    def iter_lead_pages(self, date_filter: Dict, progress: Dict) -> Iterator[List[Dict]]:
+        """
+        STREAM 1 - Páginas de leads conforme chegam da API. Da página só fica
+        o contador e o maior updated_at (para o watermark), nunca a lista de leads
+        """
+        leads_params = {
+            **date_filter,
+            'with': 'contacts,custom_fields'
+        }
+        
+        # Falha no meio da paginação interrompe o stream: o que já foi carregado
+        # fica (upsert idempotente), mas o watermark não avança
+        for page_leads in self.client.paginate('/api/v4/leads', leads_params, raise_on_error=True):
+            progress['leads'] += len(page_leads)
+            updated_values = [lead.get('updated_at') for lead in page_leads if lead.get('updated_at')]
+            if updated_values:
+                progress['max_updated_at'] = max(progress['max_updated_at'] or 0, max(updated_values))
+            yield page_leads
+
+    def iter_transformed_pages(self, pages: Iterable[List[Dict]],
+                               first_touch: Optional[FirstTouchIndex]) -> Iterator[pd.DataFrame]:
+        """
+        STREAM 2 - Transformar cada página isoladamente (mesmo transform da carga em lote)
+        """
+        for page_leads in pages:
+            df = self.transform_leads_data({'leads': page_leads, 'first_touch': first_touch},
+                                           quality_alerts=False)
+            if not df.empty:
+                yield df
+
+    def iter_buffered_frames(self, frames: Iterable[pd.DataFrame], max_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        STREAM 3 - Buffer limitado: junta páginas transformadas até max_rows linhas
+        e entrega o bloco para o load antes de pedir a próxima página
+        """
+        buffer = []
+        buffered_rows = 0
+        
+        for df in frames:
+            buffer.append(df)
+            buffered_rows += len(df)
+            if buffered_rows >= max_rows:
+                yield pd.concat(buffer, ignore_index=True)
+                buffer = []
+                buffered_rows = 0
+        
+        if buffer:
+            yield pd.concat(buffer, ignore_index=True)
+
+    def load_stream(self, frames: Iterable[pd.DataFrame]) -> Tuple[int, Set[date]]:
+        """
+        STREAM 4 - LOAD de cada bloco assim que fica pronto, em uma única conexão.
+        Retorna o total carregado e os dias de criação tocados (para as métricas)
+        """
+        connection = None
+        cursor = None
+        total = 0
+        created_dates: Set[date] = set()
+        
+        try:
+            connection = mysql.connector.connect(**self.db_config, **connection_options())
+            cursor = connection.cursor()
+            
+            self.prepare_leads_table(cursor)
+            
+            for df in frames:
+                total += bulk_load(connection, self.LEADS_INSERT_QUERY, df, self.LEADS_COLUMNS)
+                created_dates.update(df['created_date'])
+                logger.info(f"🌊 {total} leads carregados em streaming")
+            
+        except mysql.connector.Error as e:
+            logger.error(f"Erro no banco de dados: {e}")
+            raise
+        finally:
+            if connection and connection.is_connected():
+                cursor.close()
+                connection.close()
+        
+        return total, created_dates
+
+    def run_streaming_load(self, start_date: datetime, end_date: datetime,
+                           updated_since: Optional[int], sync_mode: str,
+                           advance_watermark: bool = True) -> Tuple[int, Set[date]]:
+        """
+        EXTRACT → TRANSFORM → LOAD em pipeline de geradores: cada página de leads
+        é transformada e carregada conforme chega. Em memória ficam só o índice de
+        primeiro contato, a janela de páginas do cliente e um buffer de até
+        stream_buffer_rows linhas - independente do tamanho do período.
+        advance_watermark=False não toca etl_sync_state (backfill de períodos antigos)
+        """
+        end_timestamp = int(end_date.timestamp())
+        date_filter = self.build_date_filter(start_date, end_date, updated_since)
+        
+        # Primeiro contato por lead: precisa estar completo antes do primeiro transform
+        first_touch = None
+        try:
+            first_touch = self.extract_first_touch_index(
+                updated_since if updated_since is not None else int(start_date.timestamp()), end_timestamp
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao extrair eventos: {e} - tempo de resposta virá do banco")
+        
+        # Paginação que falhou (mesmo capturada acima) aborta antes do load: o checkpoint fica para a retomada
+        self.client.ensure_complete_extraction()
+        
+        progress = {'leads': 0, 'max_updated_at': None}
+        pages = self.iter_lead_pages(date_filter, progress)
+        frames = self.iter_transformed_pages(pages, first_touch)
+        total, created_dates = self.load_stream(self.iter_buffered_frames(frames, self.stream_buffer_rows))
+        
+        logger.info(f" Total de leads extraídos: {progress['leads']} (carregados: {total})")
+        self.client.log_stats()
+        self.log_source_cache_stats()
+        
+        # Avançar watermarks só depois do load bem-sucedido
+        if total and advance_watermark and progress['max_updated_at']:
+            self.save_sync_watermark_value('leads', progress['max_updated_at'], progress['leads'], sync_mode)
+        
+        return total, created_dates
+
     def classify_lead_source_improved(self, lead: Dict) -> Dict:
         """
         MELHORADO: Classificação detalhada da origem do lead
@@ -408,8 +670,9 @@ class KommoLeadsETL:
                 elif field_id == 47294:  # gclientid
                     source_info['gclientid'] = field_value
             
-            # Determinar fonte primária baseada nos dados coletados
-            source_info['primary_source'] = self.determine_primary_source(source_info)
+            # Determinar fonte primária baseada nos dados coletados (memoizado por assinatura)
+            fingerprint = self.source_fingerprint(source_info, lead.get('pipeline_id'))
+            source_info['primary_source'] = self._primary_source_cache(fingerprint)
             source_info['detailed_source'] = self.get_detailed_source(source_info)
             
             return source_info
@@ -432,7 +695,60 @@ class KommoLeadsETL:
                 'detailed_source': 'Erro'
             }
 
-    
+
+    def source_fingerprint(self, source_info: Dict, pipeline_id: Optional[int]) -> tuple:
+        """
+        Assinatura normalizada dos campos que decidem a fonte primária
+        (os Click IDs só importam pela presença)
+        """
+        def normalize(value):
+            return value.lower() if value else ''
+        
+        return (
+            normalize(source_info.get('utm_source')),
+            normalize(source_info.get('utm_medium')),
+            normalize(source_info.get('utm_campaign')),
+            normalize(source_info.get('lead_source_field')),
+            normalize(source_info.get('referrer')),
+            bool(source_info.get('gclid')),
+            bool(source_info.get('fbclid')),
+            pipeline_id
+        )
+
+    def _classify_source_fingerprint(self, fingerprint: tuple) -> str:
+        """
+        Fonte primária de uma assinatura (executado uma vez por combinação distinta)
+        """
+        utm_source, utm_medium, utm_campaign, lead_source_field, referrer, has_gclid, has_fbclid, _ = fingerprint
+        return self.determine_primary_source({
+            'utm_source': utm_source,
+            'utm_medium': utm_medium,
+            'utm_campaign': utm_campaign,
+            'lead_source_field': lead_source_field,
+            'referrer': referrer,
+            'gclid': has_gclid,
+            'fbclid': has_fbclid
+        })
+
+    def get_source_cache_stats(self) -> Dict:
+        """
+        Acertos/erros do cache de classificação de origem
+        """
+        info = self._primary_source_cache.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'hit_rate': round(info.hits / lookups * 100, 1) if lookups else 0.0
+        }
+
+    def log_source_cache_stats(self):
+        stats = self.get_source_cache_stats()
+        logger.info(
+            f"🧠 Cache de origem: {stats['hits']} acertos | {stats['misses']} erros | "
+            f"{stats['size']} assinaturas | {stats['hit_rate']}% de acerto"
+        )
 
     def determine_primary_source(self, source_info: Dict) -> str:
         """
@@ -792,18 +1108,29 @@ class KommoLeadsETL:
                 connection.close()
 
     # USAR O MÉTODO TRANSFORM ORIGINAL (que funcionava)
-    def transform_leads_data(self, raw_data: Dict) -> pd.DataFrame:
+    def transform_leads_data(self, raw_data: Dict, batch_response_time: bool = True,
+                             quality_alerts: bool = True) -> pd.DataFrame:
         """
         VOLTA AO MÉTODO ORIGINAL que funcionava + alertas
+        
+        batch_response_time=True carrega a primeira atividade de todos os leads
+        em uma única consulta antes do loop (False mantém a busca por lead).
+        quality_alerts=False pula os alertas (modo streaming transforma página a página).
         """
         try:
             leads = raw_data['leads']
-            events = raw_data['events']
+            events = raw_data.get('events', [])
+            first_touch = raw_data.get('first_touch')
             
             processed_leads = []
             
             logger.info(f"Transformando {len(leads)} leads...")
             
+            # Pré-carregar primeira atividade comercial dos leads que os eventos não cobrem
+            first_activity_map = None
+            if batch_response_time:
+                first_activity_map = self.load_first_activity_map(self.leads_without_first_touch(leads, first_touch))
+            
             for i, lead in enumerate(leads):
                 try:
                     if i % 100 == 0:
@@ -835,7 +1162,7 @@ class KommoLeadsETL:
                         # Dados existentes
                         'lead_value': float(lead.get('price', 0)),
                         'lead_cost': self.extract_lead_cost(lead),
-                        'response_time_hours': self.calculate_response_time(lead, events),
+                        'response_time_hours': self.calculate_response_time(lead, events, first_activity_map, first_touch),
                         'pipeline_id': lead.get('pipeline_id'),
                         'status_id': lead.get('status_id'),
                         'responsible_user_id': lead.get('responsible_user_id'),
@@ -853,7 +1180,8 @@ class KommoLeadsETL:
             logger.info(f"Transformados {len(df)} leads com padronização")
             
             # Adicionar alertas de qualidade
-            self.add_data_quality_alerts(df)
+            if quality_alerts:
+                self.add_data_quality_alerts(df)
             
             return df
             
@@ -911,13 +1239,109 @@ class KommoLeadsETL:
         
         return pipeline_mapping.get(pipeline_id, 'Pipeline Desconhecido')
 
-    def calculate_response_time(self, lead: Dict, events: List[Dict]) -> Optional[float]:
+    def leads_without_first_touch(self, leads: List[Dict], first_touch: Optional[FirstTouchIndex]) -> List[int]:
+        """
+        Leads cujo primeiro contato não pode vir dos eventos (criados fora da janela
+        coberta pela varredura, ou eventos indisponíveis): só estes ainda consultam o banco
+        """
+        return [
+            lead.get('id') for lead in leads
+            if first_touch is None or not first_touch.covers(lead)
+        ]
+
+    def load_first_activity_map(self, lead_ids: List[int], chunk_size: int = 1000) -> Dict[int, datetime]:
+        """
+        Buscar a primeira atividade comercial de TODOS os leads em lote
+        (uma conexão e uma query agrupada por bloco de IDs, em vez de uma por lead)
+        """
+        first_activity_map = {}
+        unique_ids = sorted({lead_id for lead_id in lead_ids if lead_id is not None})
+        
+        if not unique_ids:
+            return first_activity_map
+        
+        connection = None
+        cursor = None
+        try:
+            connection = mysql.connector.connect(**self.db_config)
+            cursor = connection.cursor()
+            
+            for start in range(0, len(unique_ids), chunk_size):
+                chunk = unique_ids[start:start + chunk_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                
+                query = f"""
+                SELECT entity_id, MIN(created_date) as primeira_atividade
+                FROM commercial_activities 
+                WHERE entity_id IN ({placeholders})
+                AND entity_type = 'leads'
+                AND contact_type IN ('tarefa', 'ligacao_agendada', 'reuniao_agendada', 'email', 'nota')
+                GROUP BY entity_id
+                """
+                
+                cursor.execute(query, tuple(chunk))
+                for entity_id, primeira_atividade in cursor.fetchall():
+                    if primeira_atividade:
+                        first_activity_map[int(entity_id)] = primeira_atividade
+            
+            logger.info(f"⚡ Primeira atividade carregada em lote para {len(first_activity_map)}/{len(unique_ids)} leads")
+            
+        except Exception as e:
+            logger.warning(f"Erro ao carregar atividades em lote: {e}")
+        finally:
+            if connection and connection.is_connected():
+                cursor.close()
+                connection.close()
+        
+        return first_activity_map
+
+    def _response_time_from_first_activity(self, lead: Dict, primeira_atividade) -> Optional[float]:
+        """
+        Calcular horas entre criação do lead e primeira atividade (máximo realista de 48h)
+        """
+        lead_id = lead.get('id')
+        lead_created = datetime.fromtimestamp(lead.get('created_at', 0))
+        
+        # Converter para datetime se for date
+        if isinstance(primeira_atividade, date) and not isinstance(primeira_atividade, datetime):
+            primeira_atividade = datetime.combine(primeira_atividade, datetime.min.time())
+        
+        # Calcular diferença em horas
+        time_diff = (primeira_atividade - lead_created).total_seconds() / 3600
+        
+        # VALIDAÇÃO: Tempo máximo realista (48 horas)
+        if time_diff > MAX_RESPONSE_TIME_HOURS:
+            logger.warning(f"Tempo de resposta irrealista para lead {lead_id}: {time_diff:.1f}h - ignorando")
+            return None
+        
+        return round(time_diff, 2)
+
+    def calculate_response_time(self, lead: Dict, events: List[Dict],
+                                first_activity_map: Optional[Dict[int, datetime]] = None,
+                                first_touch: Optional[FirstTouchIndex] = None) -> Optional[float]:
         """
         Calcular tempo de resposta em horas - CORRIGIDO para usar atividades comerciais
+        
+        Leads cobertos por first_touch (ver extract_first_touch_index) usam o primeiro
+        evento, sem banco. Se first_activity_map for informado (ver load_first_activity_map),
+        o cálculo é uma consulta em memória; caso contrário, busca a atividade no banco.
         """
         try:
             lead_id = lead.get('id')
-            lead_created = datetime.fromtimestamp(lead.get('created_at', 0))
+            
+            # Primeiro contato vindo dos eventos da API
+            if first_touch is not None and first_touch.covers(lead):
+                first_event_ts = first_touch.get(lead_id)
+                if first_event_ts is not None:
+                    return self._response_time_from_first_activity(lead, datetime.fromtimestamp(first_event_ts))
+                return None
+            
+            # Modo em lote: apenas lookup no dicionário pré-carregado
+            if first_activity_map is not None:
+                primeira_atividade = first_activity_map.get(lead_id)
+                if primeira_atividade:
+                    return self._response_time_from_first_activity(lead, primeira_atividade)
+                return None
             
             # Buscar atividades comerciais do banco para este lead
             try:
@@ -936,31 +1360,12 @@ class KommoLeadsETL:
                 cursor.execute(query, (lead_id,))
                 result = cursor.fetchone()
                 
-                if result and result[0]:
-                    primeira_atividade = result[0]
-                    
-                    # Converter para datetime se for date
-                    from datetime import date
-                    if isinstance(primeira_atividade, date):
-                        primeira_atividade = datetime.combine(primeira_atividade, datetime.min.time())
-                    
-                    # Calcular diferença em horas
-                    time_diff = (primeira_atividade - lead_created).total_seconds() / 3600
-                    
-                    # VALIDAÇÃO: Tempo máximo realista (48 horas)
-                    if time_diff > 48:
-                        logger.warning(f"Tempo de resposta irrealista para lead {lead_id}: {time_diff:.1f}h - ignorando")
-                        cursor.close()
-                        conn.close()
-                        return None
-                    
-                    cursor.close()
-                    conn.close()
-                    return round(time_diff, 2)
-                
                 cursor.close()
                 conn.close()
                 
+                if result and result[0]:
+                    return self._response_time_from_first_activity(lead, result[0])
+                
             except Exception as db_error:
                 logger.warning(f"Erro ao buscar atividades do banco para lead {lead_id}: {db_error}")
             
@@ -1034,12 +1439,16 @@ class KommoLeadsETL:
         """
         try:
             leads = raw_data['leads']
-            events = raw_data['events']
+            events = raw_data.get('events', [])
+            first_touch = raw_data.get('first_touch')
             
             processed_leads = []
             
             logger.info(f"Transformando {len(leads)} leads com melhorias...")
             
+            # Pré-carregar primeira atividade comercial dos leads que os eventos não cobrem
+            first_activity_map = self.load_first_activity_map(self.leads_without_first_touch(leads, first_touch))
+            
             for i, lead in enumerate(leads):
                 try:
                     if i % 100 == 0:
@@ -1074,7 +1483,7 @@ class KommoLeadsETL:
                         # Dados existentes
                         'lead_value': float(lead.get('price', 0)),
                         'lead_cost': self.extract_lead_cost(lead),
-                        'response_time_hours': self.calculate_response_time(lead, events),
+                        'response_time_hours': self.calculate_response_time(lead, events, first_activity_map, first_touch),
                         'pipeline_id': lead.get('pipeline_id'),
                         'status_id': lead.get('status_id'),
                         'responsible_user_id': lead.get('responsible_user_id'),
@@ -1100,120 +1509,27 @@ class KommoLeadsETL:
             logger.error(f"Erro na transformação: {e}")
             raise
 
+    def prepare_leads_table(self, cursor):
+        """
+        Criar a tabela leads_metrics e seus índices de cobertura (idempotente)
+        """
+        cursor.execute(self.LEADS_TABLE_DDL)
+        ensure_indexes(cursor, ['leads_metrics'])
+
     def load_to_database(self, df: pd.DataFrame):
         """
         LOAD - Carregar dados para o banco MySQL
         """
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = mysql.connector.connect(**self.db_config, **connection_options())
             cursor = connection.cursor()
             
-            # Tabela melhorada com campos de origem detalhados
-            create_table_query = """
-            CREATE TABLE IF NOT EXISTS leads_metrics (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                lead_id BIGINT UNIQUE,
-                created_date DATE,
-                created_datetime DATETIME,
-                
-                -- Campos de origem detalhados
-                primary_source VARCHAR(100),
-                utm_source VARCHAR(255),
-                utm_medium VARCHAR(255),
-                utm_campaign VARCHAR(255),
-                utm_content VARCHAR(255),
-                utm_term VARCHAR(255),
-                utm_referrer VARCHAR(255),
-                referrer VARCHAR(255),
-                lead_source_field VARCHAR(255),
-                gclid VARCHAR(255),
-                fbclid VARCHAR(255),
-                gclientid VARCHAR(255),
-                detailed_source TEXT,
-                
-                -- Campos existentes
-                lead_value DECIMAL(10,2),
-                lead_cost DECIMAL(10,2),
-                response_time_hours DECIMAL(8,2),
-                pipeline_id BIGINT,
-                status_id BIGINT,
-                responsible_user_id BIGINT,
-                contact_count INT,
-                updated_at DATETIME,
-                
-                -- Índices para performance
-                INDEX idx_created_date (created_date),
-                INDEX idx_primary_source (primary_source),
-                INDEX idx_utm_source (utm_source),
-                INDEX idx_utm_medium (utm_medium),
-                INDEX idx_pipeline_id (pipeline_id)
-            )
-            """
-            cursor.execute(create_table_query)
-            
-            # Insert melhorado
-            insert_query = """
-            INSERT INTO leads_metrics (
-                lead_id, created_date, created_datetime, primary_source, utm_source,
-                utm_medium, utm_campaign, utm_content, utm_term, utm_referrer,
-                referrer, lead_source_field, gclid, fbclid, gclientid, detailed_source,
-                lead_value, lead_cost, response_time_hours, pipeline_id, status_id,
-                responsible_user_id, contact_count, updated_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                primary_source = VALUES(primary_source),
-                utm_source = VALUES(utm_source),
-                utm_medium = VALUES(utm_medium),
-                utm_campaign = VALUES(utm_campaign),
-                utm_content = VALUES(utm_content),
-                utm_term = VALUES(utm_term),
-                utm_referrer = VALUES(utm_referrer),
-                referrer = VALUES(referrer),
-                lead_source_field = VALUES(lead_source_field),
-                gclid = VALUES(gclid),
-                fbclid = VALUES(fbclid),
-                gclientid = VALUES(gclientid),
-                detailed_source = VALUES(detailed_source),
-                lead_value = VALUES(lead_value),
-                lead_cost = VALUES(lead_cost),
-                response_time_hours = VALUES(response_time_hours),
-                updated_at = VALUES(updated_at)
-            """
-            
-            # Converter DataFrame para lista de tuplas
-            data_to_insert = []
-            for _, row in df.iterrows():
-                data_to_insert.append((
-                    int(row['lead_id']),
-                    row['created_date'],
-                    row['created_datetime'],
-                    row['primary_source'],
-                    row['utm_source'],
-                    row['utm_medium'], 
-                    row['utm_campaign'],
-                    row['utm_content'],
-                    row['utm_term'],
-                    row['utm_referrer'],
-                    row['referrer'],
-                    row['lead_source_field'],
-                    row['gclid'],
-                    row['fbclid'],
-                    row['gclientid'],
-                    row['detailed_source'],
-                    float(row['lead_value']) if pd.notna(row['lead_value']) else 0,
-                    float(row['lead_cost']) if pd.notna(row['lead_cost']) else None,
-                    float(row['response_time_hours']) if pd.notna(row['response_time_hours']) else None,
-                    int(row['pipeline_id']) if pd.notna(row['pipeline_id']) else None,
-                    int(row['status_id']) if pd.notna(row['status_id']) else None,
-                    int(row['responsible_user_id']) if pd.notna(row['responsible_user_id']) else None,
-                    int(row['contact_count']) if pd.notna(row['contact_count']) else 0,
-                    row['updated_at']
-                ))
+            self.prepare_leads_table(cursor)
             
-            cursor.executemany(insert_query, data_to_insert)
-            connection.commit()
+            # Converter colunas de forma vetorizada e carregar em blocos (commit por bloco)
+            total = bulk_load(connection, self.LEADS_INSERT_QUERY, df, self.LEADS_COLUMNS)
             
-            logger.info(f" Carregados {len(data_to_insert)} registros com origem detalhada")
+            logger.info(f" Carregados {total} registros com origem detalhada")
             
         except mysql.connector.Error as e:
             logger.error(f"Erro no banco de dados: {e}")
@@ -1227,6 +1543,19 @@ class KommoLeadsETL:
         """
         Gerar métricas diárias consolidadas
         """
+        self.generate_daily_metrics_range([date.date() if isinstance(date, datetime) else date])
+
+    def generate_daily_metrics_range(self, metric_dates: List[date]):
+        """
+        Gerar métricas diárias consolidadas de vários dias de uma vez: uma
+        conexão, uma query agrupada por (dia, fonte) em leads_metrics e um
+        único executemany em daily_leads_metrics
+        """
+        metric_dates = sorted(set(metric_dates))
+        if not metric_dates:
+            return
+        
+        connection = None
         try:
             connection = mysql.connector.connect(**self.db_config)
             cursor = connection.cursor()
@@ -1248,51 +1577,60 @@ class KommoLeadsETL:
             """
             cursor.execute(create_metrics_table)
             
-            # Calcular métricas do dia
-            date_str = date.strftime('%Y-%m-%d')
-            
-            # Total de leads
-            cursor.execute("""
-                SELECT COUNT(*) FROM leads_metrics 
-                WHERE created_date = %s
-            """, (date_str,))
-            total_leads = cursor.fetchone()[0]
-            
-            # Leads por fonte
-            cursor.execute("""
-                SELECT primary_source, COUNT(*) 
-                FROM leads_metrics 
-                WHERE created_date = %s 
-                GROUP BY primary_source
-            """, (date_str,))
-            leads_by_source = dict(cursor.fetchall())
-            
-            # Tempo médio de resposta
+            # Agregados por dia e fonte (somas e contagens; as médias são recompostas por dia)
             cursor.execute("""
-                SELECT AVG(response_time_hours) 
-                FROM leads_metrics 
-                WHERE created_date = %s AND response_time_hours IS NOT NULL
-            """, (date_str,))
-            avg_response_time = cursor.fetchone()[0] or 0
-            
-            # Valor total dos leads
-            cursor.execute("""
-                SELECT SUM(lead_value) 
-                FROM leads_metrics 
-                WHERE created_date = %s
-            """, (date_str,))
-            total_lead_value = cursor.fetchone()[0] or 0
-            
-            # Custo total dos leads
-            cursor.execute("""
-                SELECT SUM(lead_cost) 
-                FROM leads_metrics 
-                WHERE created_date = %s AND lead_cost IS NOT NULL
-            """, (date_str,))
-            total_lead_cost = cursor.fetchone()[0] or 0
+                SELECT
+                    created_date,
+                    primary_source,
+                    COUNT(*),
+                    SUM(response_time_hours),
+                    COUNT(response_time_hours),
+                    SUM(lead_value),
+                    SUM(lead_cost)
+                FROM leads_metrics
+                WHERE created_date BETWEEN %s AND %s
+                GROUP BY created_date, primary_source
+                ORDER BY created_date, primary_source
+            """, (metric_dates[0], metric_dates[-1]))
+            
+            daily = {
+                metric_date: {
+                    'total_leads': 0,
+                    'leads_by_source': {},
+                    'response_sum': 0.0,
+                    'response_count': 0,
+                    'total_lead_value': 0.0,
+                    'total_lead_cost': 0.0
+                }
+                for metric_date in metric_dates
+            }
             
-            # Custo por lead
-            cost_per_lead = (total_lead_cost / total_leads) if total_leads > 0 else 0
+            for (created_date, source, leads, response_sum, response_count,
+                 lead_value, lead_cost) in cursor.fetchall():
+                day = daily.get(created_date)
+                if day is None:
+                    continue  # Dia dentro do intervalo mas fora da lista pedida
+                day['total_leads'] += leads
+                day['leads_by_source'][source] = leads
+                day['response_sum'] += float(response_sum or 0)
+                day['response_count'] += response_count
+                day['total_lead_value'] += float(lead_value or 0)
+                day['total_lead_cost'] += float(lead_cost or 0)
+            
+            rows = []
+            for metric_date, day in daily.items():
+                total_leads = day['total_leads']
+                avg_response_time = (day['response_sum'] / day['response_count']) if day['response_count'] else 0
+                cost_per_lead = (day['total_lead_cost'] / total_leads) if total_leads > 0 else 0
+                rows.append((
+                    metric_date.strftime('%Y-%m-%d'),
+                    total_leads,
+                    json.dumps(day['leads_by_source']),
+                    float(avg_response_time),
+                    float(day['total_lead_value']),
+                    float(day['total_lead_cost']),
+                    float(cost_per_lead)
+                ))
             
             # Inserir métricas consolidadas
             insert_metrics_query = """
@@ -1308,31 +1646,23 @@ class KommoLeadsETL:
                 total_lead_cost = VALUES(total_lead_cost),
                 cost_per_lead = VALUES(cost_per_lead)
             """
-            
-            import json
-            cursor.execute(insert_metrics_query, (
-                date_str,
-                total_leads,
-                json.dumps(leads_by_source),
-                float(avg_response_time),
-                float(total_lead_value),
-                float(total_lead_cost),
-                float(cost_per_lead)
-            ))
-            
+            cursor.executemany(insert_metrics_query, rows)
             connection.commit()
             
-            logger.info(f"Métricas diárias geradas para {date_str}")
+            total_leads = sum(day['total_leads'] for day in daily.values())
+            logger.info(f"Métricas diárias geradas para {len(rows)} dia(s): "
+                        f"{metric_dates[0]} até {metric_dates[-1]}")
             logger.info(f"   - Total leads: {total_leads}")
-            logger.info(f"   - Leads por fonte: {leads_by_source}")
-            logger.info(f"   - Tempo médio resposta: {avg_response_time:.2f}h")
-            logger.info(f"   - Custo por lead: R$ {cost_per_lead:.2f}")
+            if len(rows) == 1:
+                logger.info(f"   - Leads por fonte: {daily[metric_dates[0]]['leads_by_source']}")
+                logger.info(f"   - Tempo médio resposta: {rows[0][3]:.2f}h")
+                logger.info(f"   - Custo por lead: R$ {rows[0][6]:.2f}")
             
         except Exception as e:
             logger.error(f"Erro ao gerar métricas diárias: {e}")
             raise
         finally:
-            if connection.is_connected():
+            if connection is not None and connection.is_connected():
                 cursor.close()
                 connection.close()
 
@@ -1717,11 +2047,126 @@ class KommoLeadsETL:
                 cursor.close()
                 connection.close()
 
-    def run_etl(self, start_date: datetime = None, end_date: datetime = None):
+    def ensure_sync_state_table(self):
+        """
+        Criar tabela de controle da sincronização incremental (high-water mark por entidade)
+        """
+        try:
+            connection = mysql.connector.connect(**self.db_config)
+            cursor = connection.cursor()
+            
+            cursor.execute("""
+            CREATE TABLE IF NOT EXISTS etl_sync_state (
+                entity VARCHAR(50) PRIMARY KEY,
+                last_updated_at BIGINT NOT NULL COMMENT 'Maior updated_at (Unix) já sincronizado',
+                last_sync_mode VARCHAR(20),
+                last_rows_synced INT DEFAULT 0,
+                last_sync_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+            """)
+            connection.commit()
+            
+        except Exception as e:
+            logger.error(f"Erro ao criar tabela etl_sync_state: {e}")
+            raise
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+    def get_sync_watermark(self, entity: str) -> Optional[int]:
+        """
+        Buscar o último updated_at sincronizado da entidade (None se nunca sincronizou)
+        """
+        try:
+            connection = mysql.connector.connect(**self.db_config)
+            cursor = connection.cursor()
+            
+            cursor.execute("SELECT last_updated_at FROM etl_sync_state WHERE entity = %s", (entity,))
+            result = cursor.fetchone()
+            
+            return int(result[0]) if result else None
+            
+        except Exception as e:
+            logger.warning(f"Erro ao ler watermark de {entity}: {e}")
+            return None
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+    def save_sync_watermark(self, entity: str, records: List[Dict], mode: str):
+        """
+        Avançar o watermark da entidade para o maior updated_at dos registros sincronizados
+        """
+        updated_values = [record.get('updated_at') for record in records if record.get('updated_at')]
+        if not updated_values:
+            return
+        
+        self.save_sync_watermark_value(entity, max(updated_values), len(records), mode)
+
+    def save_sync_watermark_value(self, entity: str, watermark: int, rows_synced: int, mode: str):
+        """
+        Gravar o watermark já calculado (o modo streaming não guarda os registros)
+        """
+        try:
+            connection = mysql.connector.connect(**self.db_config)
+            cursor = connection.cursor()
+            
+            cursor.execute("""
+            INSERT INTO etl_sync_state (entity, last_updated_at, last_sync_mode, last_rows_synced)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                last_updated_at = GREATEST(last_updated_at, VALUES(last_updated_at)),
+                last_sync_mode = VALUES(last_sync_mode),
+                last_rows_synced = VALUES(last_rows_synced)
+            """, (entity, watermark, mode, rows_synced))
+            connection.commit()
+            
+            logger.info(f"🔖 Watermark de {entity} atualizado para {datetime.fromtimestamp(watermark)}")
+            
+        except Exception as e:
+            logger.error(f"Erro ao salvar watermark de {entity}: {e}")
+            raise
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+    def run_backfill_chunk(self, start_date: datetime, end_date: datetime) -> int:
+        """
+        Carregar um bloco histórico (backfill): streaming por página e métricas
+        diárias dos dias do bloco, sem relatório/sugestões/qualidade por bloco e
+        sem avançar o watermark - leads antigos atualizados há pouco levariam o
+        watermark além do que a sync incremental já viu
+        """
+        logger.info(f"⏪ Backfill de leads: {start_date.date()} até {end_date.date()}")
+        
+        total_loaded, _ = self.run_streaming_load(start_date, end_date, None, 'backfill',
+                                                  advance_watermark=False)
+        
+        period_days = (end_date.date() - start_date.date()).days
+        self.generate_daily_metrics_range([
+            start_date.date() + timedelta(days=offset) for offset in range(period_days + 1)
+        ])
+        self.client.clear_checkpoint()
+        
+        return total_loaded
+
+    def run_etl(self, start_date: datetime = None, end_date: datetime = None, full_refresh: bool = False,
+                stream: bool = False):
         """
         Executar o ETL completo para Entrada e Origem de Leads
+        
+        Sem datas explícitas roda em modo incremental: extrai apenas leads com
+        updated_at >= watermark salvo em etl_sync_state. full_refresh=True (ou
+        ausência de watermark) mantém a carga completa dos últimos 30 dias.
+        stream=True carrega página a página (run_streaming_load), com memória
+        constante - necessário para backfills de meses.
         """
         try:
+            explicit_period = start_date is not None or end_date is not None
+            
             # Definir período padrão (últimos 30 dias)
             if not start_date:
                 start_date = datetime.now() - timedelta(days=30)
@@ -1734,29 +2179,64 @@ class KommoLeadsETL:
             logger.info(" INICIANDO ETL KOMMO - ENTRADA E ORIGEM DE LEADS")
             logger.info("="*60)
             
-            # EXTRACT
-            logger.info("1️  EXTRACT - Extraindo dados do Kommo...")
-            raw_data = self.extract_leads(start_date, end_date)
-            
-            # TRANSFORM
-            logger.info("2️  TRANSFORM - Transformando e classificando dados...")
-            df_leads = self.transform_leads_data(raw_data)
-            
-            if df_leads.empty:
-                logger.warning("⚠️  Nenhum lead encontrado para o período")
-                return
-            
-            # LOAD
-            logger.info("3️  LOAD - Carregando no banco de dados...")
-            self.load_to_database(df_leads)
+            # SYNC STATE - decidir entre carga completa e incremental
+            self.ensure_sync_state_table()
+            updated_since = None
+            if not full_refresh and not explicit_period:
+                watermark = self.get_sync_watermark('leads')
+                if watermark:
+                    # Pequena sobreposição para não perder registros no limite (upsert é idempotente)
+                    updated_since = watermark - self.SYNC_OVERLAP_SECONDS
+            
+            sync_mode = 'incremental' if updated_since is not None else 'full_refresh'
+            logger.info(f"🔄 Modo de sincronização: {sync_mode}")
+            
+            if stream:
+                # EXTRACT → TRANSFORM → LOAD página a página
+                logger.info("1️  STREAM - Extraindo, transformando e carregando por página...")
+                total_loaded, changed_dates = self.run_streaming_load(start_date, end_date, updated_since, sync_mode)
+                
+                if not total_loaded:
+                    logger.warning("⚠️  Nenhum lead encontrado para o período")
+                    self.client.clear_checkpoint()
+                    return
+            else:
+                # EXTRACT
+                logger.info("1️  EXTRACT - Extraindo dados do Kommo...")
+                raw_data = self.extract_leads(start_date, end_date, updated_since=updated_since)
+                self.client.log_stats()
+                # Paginação que falhou (mesmo capturada na extração) aborta antes do load: o checkpoint fica para a retomada
+                self.client.ensure_complete_extraction()
+                
+                # TRANSFORM
+                logger.info("2️  TRANSFORM - Transformando e classificando dados...")
+                df_leads = self.transform_leads_data(raw_data)
+                self.log_source_cache_stats()
+                
+                if df_leads.empty:
+                    logger.warning("⚠️  Nenhum lead encontrado para o período")
+                    self.client.clear_checkpoint()
+                    return
+                
+                # LOAD
+                logger.info("3️  LOAD - Carregando no banco de dados...")
+                self.load_to_database(df_leads)
+                
+                # Avançar watermarks só depois do load bem-sucedido
+                self.save_sync_watermark('leads', raw_data['leads'], sync_mode)
+                changed_dates = set(df_leads['created_date'])
             
             # GENERATE METRICS
             logger.info("4️  METRICS - Gerando métricas diárias...")
-            # Gerar métricas para cada dia no período
-            current_date = start_date
-            while current_date <= end_date:
-                self.generate_daily_metrics(current_date)
-                current_date += timedelta(days=1)
+            if sync_mode == 'incremental':
+                # Recalcular apenas os dias dos leads que mudaram
+                self.generate_daily_metrics_range(sorted(changed_dates))
+            else:
+                # Gerar métricas para cada dia no período (uma query para o intervalo todo)
+                period_days = (end_date.date() - start_date.date()).days
+                self.generate_daily_metrics_range([
+                    start_date.date() + timedelta(days=offset) for offset in range(period_days + 1)
+                ])
             
             # GENERATE REPORT
             logger.info("5️  REPORT - Gerando relatório de análise...")
@@ -1770,6 +2250,8 @@ class KommoLeadsETL:
             logger.info("7️  QUALITY - Verificando qualidade dos dados...")
             self.verify_data_quality()
             
+            self.client.clear_checkpoint()
+            
             logger.info("="*60)
             logger.info(" ETL CONCLUÍDO COM SUCESSO!")
             logger.info("="*60)
@@ -1781,6 +2263,13 @@ class KommoLeadsETL:
 
 # Script principal
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='ETL de Entrada e Origem de Leads - Kommo')
+    parser.add_argument('--full-refresh', action='store_true',
+                        help='Ignorar o watermark e recarregar os últimos 30 dias')
+    parser.add_argument('--stream', action='store_true',
+                        help='Transformar e carregar cada página conforme chega (memória constante)')
+    args = parser.parse_args()
+    
     etl = KommoLeadsETL()
     
     # Opção 1: Descobrir campos customizados (execute primeiro)
@@ -1792,8 +2281,8 @@ if __name__ == "__main__":
     # end = datetime(2025, 1, 31)
     # etl.run_etl(start, end)
     
-    # Opção 3: Executar ETL para últimos 30 dias (padrão)
-    etl.run_etl()
+    # Opção 3: Executar ETL incremental (padrão) ou últimos 30 dias com --full-refresh
+    etl.run_etl(full_refresh=args.full_refresh, stream=args.stream)
     
     # Opção 4: Gerar apenas relatório para período específico
     # start = datetime(2025, 1, 1)
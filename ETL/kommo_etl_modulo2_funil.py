@@ -1,14 +1,19 @@
 import os
-import requests
 import pandas as pd
 import mysql.connector
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Set, Tuple
 import time
 import logging
 import json
 from dotenv import load_dotenv
 
+from extraction_checkpoint import ExtractionCheckpoint
+from kommo_client import KommoClient
+from reference_cache import ReferenceCache
+from bulk_loader import bulk_load, connection_options
+from query_layer import day_bounds, ensure_indexes, range_bounds
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,6 +21,42 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 class KommoFunnelETL:
+    # Cache local de motivos de perda já resolvidos (evita rebuscar leads conhecidos)
+    LOSS_REASONS_CACHE_TABLE = """
+    CREATE TABLE IF NOT EXISTS funnel_loss_reasons (
+        lead_id BIGINT PRIMARY KEY,
+        loss_reason_id BIGINT NULL,
+        loss_reason_name VARCHAR(255) NULL,
+        status_id BIGINT,
+        lead_updated_at BIGINT,
+        resolved_at DATETIME,
+        INDEX idx_lead_updated_at (lead_updated_at)
+    )
+    """
+
+    # Métricas do funil principal de um dia: intervalo semiaberto em entry_date
+    # (usa idx_pipeline_entry_status em vez de DATE(entry_date) = dia)
+    MAIN_FUNNEL_METRICS_QUERY = """
+    SELECT 
+        DATE(entry_date) as metric_date,
+        COUNT(CASE WHEN status_name = 'Incoming leads' THEN 1 END) as incoming_leads,
+        COUNT(CASE WHEN status_name = 'Interessados' THEN 1 END) as interessados,
+        COUNT(CASE WHEN status_name = 'Abordados' THEN 1 END) as abordados,
+        COUNT(CASE WHEN status_name = 'Qualificação' THEN 1 END) as qualificacao,
+        COUNT(CASE WHEN status_name = 'Qualificado para reunião' THEN 1 END) as qualificado_reuniao,
+        COUNT(CASE WHEN status_name = 'Apresentação' THEN 1 END) as apresentacao,
+        COUNT(CASE WHEN status_name = 'No Show' THEN 1 END) as no_show,
+        COUNT(CASE WHEN status_name = 'FUP' THEN 1 END) as fup,
+        COUNT(CASE WHEN status_name = 'Negociação' THEN 1 END) as negociacao,
+        COUNT(CASE WHEN status_name = 'Venda ganha' THEN 1 END) as venda_ganha,
+        COUNT(CASE WHEN status_name = 'Venda perdida' THEN 1 END) as venda_perdida,
+        AVG(time_in_status_hours) as tempo_medio_por_etapa,
+        SUM(lead_value) as valor_pipeline
+    FROM funnel_history 
+    WHERE pipeline_id = %s AND entry_date >= %s AND entry_date < %s
+    GROUP BY DATE(entry_date)
+    """
+
     def __init__(self):
         self.kommo_config = {
             'base_url': 'https://previdas.kommo.com',
@@ -31,10 +72,13 @@ class KommoFunnelETL:
             'database': os.getenv('DB_NAME')
         }
         
-        self.headers = {
-            'Authorization': f'Bearer {self.kommo_config["access_token"]}',
-            'Content-Type': 'application/json'
-        }
+        # Cliente HTTP com pool de conexões (keep-alive, gzip e estatísticas por endpoint)
+        # Checkpoint por página quando KOMMO_RUN_ID está definido (retomada de execuções interrompidas)
+        self.client = KommoClient(self.kommo_config['base_url'], self.kommo_config['access_token'],
+                                  checkpoint=ExtractionCheckpoint.from_env('modulo2_funil'))
+        
+        # Dados de referência (usuários, pipelines, motivos de perda) com cache em disco compartilhado
+        self.reference_cache = ReferenceCache(self.client)
         
         # ID do pipeline principal identificado
         self.main_pipeline_id = 11146887
@@ -42,6 +86,9 @@ class KommoFunnelETL:
         # Cache para pipelines e status
         self.pipelines_cache = {}
         self.status_cache = {}
+        
+        # Lookback da busca de motivos de perda além do início da janela
+        self.loss_reasons_lookback_days = int(os.getenv('FUNNEL_LOSS_LOOKBACK_DAYS', 7))
 
     def extract_pipelines_and_statuses(self) -> Dict:
         """
@@ -50,11 +97,14 @@ class KommoFunnelETL:
         try:
             logger.info("Extraindo estrutura do pipeline principal...")
             
-            # Buscar pipeline principal específico
-            pipeline_url = f"{self.kommo_config['base_url']}/api/v4/leads/pipelines/{self.main_pipeline_id}"
-            pipeline_response = requests.get(pipeline_url, headers=self.headers)
-            pipeline_response.raise_for_status()
-            pipeline_data = pipeline_response.json()
+            # Pipeline principal (com os status em _embedded) a partir do cache de referência
+            pipeline_data = next(
+                (pipeline for pipeline in self.reference_cache.pipelines()
+                 if int(pipeline.get('id', 0)) == self.main_pipeline_id),
+                None
+            )
+            if pipeline_data is None:
+                raise ValueError(f"Pipeline principal {self.main_pipeline_id} não encontrado")
             
             # Processar pipeline principal
             self.pipelines_cache[self.main_pipeline_id] = {
@@ -63,13 +113,8 @@ class KommoFunnelETL:
                 'sort': pipeline_data.get('sort', 1)
             }
             
-            # Buscar status do pipeline principal
-            statuses_url = f"{self.kommo_config['base_url']}/api/v4/leads/pipelines/{self.main_pipeline_id}/statuses"
-            statuses_response = requests.get(statuses_url, headers=self.headers)
-            statuses_response.raise_for_status()
-            statuses_data = statuses_response.json()
-            
-            statuses = statuses_data.get('_embedded', {}).get('statuses', [])
+            # Status do pipeline principal
+            statuses = pipeline_data.get('_embedded', {}).get('statuses', [])
             
             for status in statuses:
                 status_id = status.get('id')
@@ -156,40 +201,22 @@ class KommoFunnelETL:
             logger.info(f"Período: {start_date.strftime('%Y-%m-%d')} até {end_date.strftime('%Y-%m-%d')}")
             
             # 1. Buscar leads do pipeline principal
-            leads_url = f"{self.kommo_config['base_url']}/api/v4/leads"
             leads_params = {
                 'filter[pipeline_id]': self.main_pipeline_id,
                 'filter[created_at][from]': start_timestamp,
                 'filter[created_at][to]': end_timestamp,
-                'limit': 250,
                 'with': 'contacts,custom_fields'
             }
             
             all_leads = []
-            page = 1
+            # Índice de IDs mantido junto com all_leads (usado nas três fases)
+            lead_ids = set()
             
-            while True:
-                leads_params['page'] = page
-                leads_response = requests.get(leads_url, headers=self.headers, params=leads_params)
-                
-                if leads_response.status_code == 200:
-                    leads_data = leads_response.json()
-                    leads = leads_data.get('_embedded', {}).get('leads', [])
-                    
-                    if not leads:
-                        break
-                        
-                    all_leads.extend(leads)
-                    logger.info(f"Página {page}: {len(leads)} leads do pipeline principal")
-                    
-                    if len(leads) < 250:
-                        break
-                        
-                    page += 1
-                    time.sleep(0.5)
-                else:
-                    logger.warning(f"Erro na página {page} de leads: {leads_response.status_code}")
-                    break
+            for leads in self.client.paginate('/api/v4/leads', leads_params):
+                all_leads.extend(leads)
+                lead_ids.update(lead['id'] for lead in leads)
+            
+            logger.info(f"{len(all_leads)} leads do pipeline principal")
             
             # 2. Buscar também leads atualizados no período (mesmo que criados antes)
             logger.info("Buscando leads atualizados no período...")
@@ -198,89 +225,51 @@ class KommoFunnelETL:
                 'filter[pipeline_id]': self.main_pipeline_id,
                 'filter[updated_at][from]': start_timestamp,
                 'filter[updated_at][to]': end_timestamp,
-                'limit': 250,
                 'with': 'contacts,custom_fields'
             }
             
-            page = 1
-            while True:
-                updated_leads_params['page'] = page
-                updated_response = requests.get(leads_url, headers=self.headers, params=updated_leads_params)
+            for updated_leads in self.client.paginate('/api/v4/leads', updated_leads_params):
+                # Evitar duplicatas
+                new_leads = [lead for lead in updated_leads if lead['id'] not in lead_ids]
+                all_leads.extend(new_leads)
+                lead_ids.update(lead['id'] for lead in new_leads)
                 
-                if updated_response.status_code == 200:
-                    updated_data = updated_response.json()
-                    updated_leads = updated_data.get('_embedded', {}).get('leads', [])
-                    
-                    if not updated_leads:
-                        break
-                    
-                    # Evitar duplicatas
-                    existing_ids = {lead['id'] for lead in all_leads}
-                    new_leads = [lead for lead in updated_leads if lead['id'] not in existing_ids]
-                    all_leads.extend(new_leads)
-                    
-                    logger.info(f"Página {page} (atualizados): {len(new_leads)} novos leads")
-                    
-                    if len(updated_leads) < 250:
-                        break
-                        
-                    page += 1
-                    time.sleep(0.5)
-                else:
-                    break
+                logger.info(f"(atualizados): {len(new_leads)} novos leads")
             
             # 3. Buscar eventos de mudança de status para estes leads (OTIMIZADO)
             logger.info("Buscando eventos de mudança de status...")
             
-            lead_ids = [lead['id'] for lead in all_leads]
             all_events = []
             
             # Buscar eventos de forma mais eficiente
-            events_url = f"{self.kommo_config['base_url']}/api/v4/events"
             events_params = {
                 'filter[created_at][from]': start_timestamp,
                 'filter[created_at][to]': end_timestamp,
-                'filter[type]': 'lead_status_changed',
-                'limit': 250
+                'filter[type]': 'lead_status_changed'
             }
             
-            page = 1
             total_events = 0
             
-            while True:
-                events_params['page'] = page
-                events_response = requests.get(events_url, headers=self.headers, params=events_params)
+            for events in self.client.paginate('/api/v4/events', events_params):
+                # Filtrar eventos apenas dos leads do pipeline principal
+                pipeline_events = [
+                    event for event in events 
+                    if event.get('entity_id') in lead_ids
+                ]
                 
-                if events_response.status_code == 200:
-                    events_data = events_response.json()
-                    events = events_data.get('_embedded', {}).get('events', [])
-                    
-                    if not events:
-                        break
-                        
-                    # Filtrar eventos apenas dos leads do pipeline principal
-                    pipeline_events = [
-                        event for event in events 
-                        if event.get('entity_id') in lead_ids
-                    ]
-                    
-                    all_events.extend(pipeline_events)
-                    total_events += len(pipeline_events)
-                    
-                    logger.info(f"Página {page} de eventos: {len(pipeline_events)} eventos do pipeline principal")
-                    
-                    if len(events) < 250:
-                        break
-                        
-                    page += 1
-                    time.sleep(0.2)  # Reduzido delay
-                else:
-                    logger.warning(f"Erro na página {page} de eventos: {events_response.status_code}")
-                    break
+                all_events.extend(pipeline_events)
+                total_events += len(pipeline_events)
+                
+                logger.info(f"{len(pipeline_events)} eventos do pipeline principal")
             
-            # 4. Buscar motivos de perda
+            # 4. Buscar motivos de perda (apenas leads atualmente perdidos)
             logger.info("Extraindo motivos de perda...")
-            lost_reasons = self.extract_loss_reasons(start_date, end_date, lead_ids)
+            lost_status_ids = set(self.get_lost_status_ids())
+            lost_leads = {
+                lead['id']: lead.get('updated_at') or 0
+                for lead in all_leads if lead.get('status_id') in lost_status_ids
+            }
+            lost_reasons = self.extract_loss_reasons(start_date, end_date, lost_leads)
             
             logger.info(f"Extraídos: {len(all_leads)} leads, {len(all_events)} eventos, {len(lost_reasons)} motivos de perda")
             
@@ -301,39 +290,12 @@ class KommoFunnelETL:
         try:
             logger.info("Buscando mapeamento de motivos de perda...")
             
-            url = f"{self.kommo_config['base_url']}/api/v4/leads/loss_reasons"
-            params = {'limit': 250}
-            
             loss_reasons_mapping = {}
-            page = 1
             
-            while True:
-                params['page'] = page
-                try:
-                    response = requests.get(url, headers=self.headers, params=params)
-                    response.raise_for_status()
-                    
-                    data = response.json()
-                    reasons = data.get('_embedded', {}).get('loss_reasons', [])
-                    
-                    if not reasons:
-                        break
-                    
-                    for reason in reasons:
-                        reason_id = reason.get('id')
-                        reason_name = reason.get('name')
-                        
-                        if reason_id and reason_name:
-                            loss_reasons_mapping[reason_id] = reason_name
-                    
-                    if len(reasons) < 250:
-                        break
-                        
-                    page += 1
-                    
-                except Exception as e:
-                    logger.error(f"Erro ao buscar motivos de perda na página {page}: {e}")
-                    break
+            try:
+                loss_reasons_mapping = self.reference_cache.loss_reasons_mapping()
+            except Exception as e:
+                logger.error(f"Erro ao buscar motivos de perda: {e}")
             
             logger.info(f"Mapeamento de motivos de perda carregado: {len(loss_reasons_mapping)} motivos")
             return loss_reasons_mapping
@@ -342,93 +304,203 @@ class KommoFunnelETL:
             logger.error(f"Erro ao buscar mapeamento de motivos de perda: {e}")
             return {}
 
-    def extract_loss_reasons(self, start_date: datetime, end_date: datetime, lead_ids: List[int]) -> Dict:
+    def get_lost_status_ids(self) -> List[int]:
         """
-        Extrair motivos de perda dos leads do pipeline principal
+        Status de "perdido" do pipeline principal
         """
+        return [
+            status_id for status_id, status in self.status_cache.items()
+            if status['type'] == 'lost' and status['pipeline_id'] == self.main_pipeline_id
+        ]
+
+    def load_loss_reasons_cache(self, lead_ids: Set[int]) -> Dict:
+        """
+        Ler motivos de perda já resolvidos em execuções anteriores (lead_id -> motivo)
+        """
+        if not lead_ids:
+            return {}
+        
+        connection = None
         try:
-            logger.info("Buscando motivos de perda na API do Kommo...")
+            connection = mysql.connector.connect(**self.db_config)
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(self.LOSS_REASONS_CACHE_TABLE)
+            
+            cached = {}
+            ids = sorted(lead_ids)
+            for offset in range(0, len(ids), 1000):
+                chunk = ids[offset:offset + 1000]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"""
+                SELECT lead_id, loss_reason_id, loss_reason_name, status_id, lead_updated_at
+                FROM funnel_loss_reasons
+                WHERE lead_id IN ({placeholders})
+                """, chunk)
+                for row in cursor.fetchall():
+                    cached[row['lead_id']] = {
+                        'reason_id': row['loss_reason_id'],
+                        'reason_name': row['loss_reason_name'],
+                        'status_id': row['status_id'],
+                        'lead_updated_at': row['lead_updated_at'] or 0
+                    }
+            
+            cursor.close()
+            return cached
             
-            # Buscar mapeamento de motivos de perda
-            loss_reasons_mapping = self.get_loss_reasons_mapping()
+        except Exception as e:
+            # Sem cache apenas busca tudo na API
+            logger.warning(f"Cache de motivos de perda indisponível: {e}")
+            return {}
+        finally:
+            if connection is not None and connection.is_connected():
+                connection.close()
+
+    def save_loss_reasons_cache(self, loss_reasons: Dict):
+        """
+        Gravar motivos de perda recém-resolvidos no cache local
+        """
+        if not loss_reasons:
+            return
+        
+        connection = None
+        try:
+            connection = mysql.connector.connect(**self.db_config, **connection_options())
+            cursor = connection.cursor()
+            cursor.execute(self.LOSS_REASONS_CACHE_TABLE)
             
-            # Identificar status de "perdido" do pipeline principal
-            lost_status_ids = [
-                status_id for status_id, status in self.status_cache.items()
-                if status['type'] == 'lost' and status['pipeline_id'] == self.main_pipeline_id
+            insert_query = """
+            INSERT INTO funnel_loss_reasons (
+                lead_id, loss_reason_id, loss_reason_name, status_id, lead_updated_at, resolved_at
+            ) VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                loss_reason_id = VALUES(loss_reason_id),
+                loss_reason_name = VALUES(loss_reason_name),
+                status_id = VALUES(status_id),
+                lead_updated_at = VALUES(lead_updated_at),
+                resolved_at = VALUES(resolved_at)
+            """
+            
+            now = datetime.now()
+            df = pd.DataFrame([
+                {
+                    'lead_id': lead_id,
+                    'loss_reason_id': reason['reason_id'],
+                    'loss_reason_name': reason['reason_name'],
+                    'status_id': reason['status_id'],
+                    'lead_updated_at': reason['lead_updated_at'],
+                    'resolved_at': now
+                }
+                for lead_id, reason in loss_reasons.items()
+            ])
+            columns = [
+                ('lead_id', 'int', None),
+                ('loss_reason_id', 'int', None),
+                ('loss_reason_name', 'raw', None),
+                ('status_id', 'int', None),
+                ('lead_updated_at', 'int', 0),
+                ('resolved_at', 'raw', None)
             ]
+            total = bulk_load(connection, insert_query, df, columns)
+            cursor.close()
+            
+            logger.info(f"Cache de motivos de perda atualizado: {total} leads")
             
+        except Exception as e:
+            logger.warning(f"Não foi possível atualizar o cache de motivos de perda: {e}")
+        finally:
+            if connection is not None and connection.is_connected():
+                connection.close()
+
+    def extract_loss_reasons(self, start_date: datetime, end_date: datetime, lost_leads: Dict[int, int]) -> Dict:
+        """
+        Extrair motivos de perda dos leads do pipeline principal
+        
+        lost_leads: lead_id -> updated_at dos leads atualmente em status de perda.
+        Leads já resolvidos (e não atualizados desde então) vêm do cache local;
+        só os demais são buscados na API, limitada à janela da execução
+        (com lookback de FUNNEL_LOSS_LOOKBACK_DAYS dias).
+        """
+        try:
+            logger.info("Buscando motivos de perda...")
+            
+            lost_status_ids = self.get_lost_status_ids()
             logger.info(f"Status de perda identificados: {lost_status_ids}")
             
-            loss_reasons = {}
+            if not lost_status_ids or not lost_leads:
+                return {}
             
-            if lost_status_ids and lead_ids:
-                # Buscar todos os leads perdidos de uma vez
-                leads_url = f"{self.kommo_config['base_url']}/api/v4/leads"
-                params = {
-                    'filter[pipeline_id]': self.main_pipeline_id,
-                    'filter[statuses]': lost_status_ids,  # Todos os status de perda
-                    'limit': 250,
-                    'with': 'loss_reason'  # Incluir motivos de perda
-                }
-                
-                page = 1
-                total_lost_leads = 0
-                
-                while True:
-                    params['page'] = page
-                    try:
-                        response = requests.get(leads_url, headers=self.headers, params=params)
-                        response.raise_for_status()
-                        
-                        data = response.json()
-                        leads = data.get('_embedded', {}).get('leads', [])
-                        
-                        if not leads:
-                            break
-                        
-                        for lead in leads:
-                            if lead['id'] in lead_ids:  # Apenas leads que estamos processando
-                                lead_id = lead.get('id')
-                                loss_reason_id = lead.get('loss_reason_id')
-                                loss_reason_name = lead.get('loss_reason_name')
-                                
-                                # Usar mapeamento para obter nome real do motivo
-                                if loss_reason_id and loss_reason_id in loss_reasons_mapping:
-                                    loss_reason_name = loss_reasons_mapping[loss_reason_id]
-                                elif not loss_reason_name or loss_reason_name.strip() == '':
-                                    if loss_reason_id:
-                                        loss_reason_name = f"Motivo ID {loss_reason_id}"
-                                    else:
-                                        loss_reason_name = None  # Deixar NULL no banco
-                                
-                                loss_reasons[lead_id] = {
-                                    'reason_id': loss_reason_id,
-                                    'reason_name': loss_reason_name,
-                                    'status_id': lead.get('status_id')
-                                }
-                                total_lost_leads += 1
+            # 1. Motivos já conhecidos (válidos se o lead não mudou desde a resolução)
+            cached = self.load_loss_reasons_cache(set(lost_leads))
+            loss_reasons = {
+                lead_id: reason for lead_id, reason in cached.items()
+                if reason['lead_updated_at'] >= (lost_leads[lead_id] or 0)
+            }
+            pending = set(lost_leads) - set(loss_reasons)
+            
+            logger.info(f"Motivos de perda: {len(loss_reasons)} em cache, {len(pending)} a buscar na API")
+            
+            if not pending:
+                return loss_reasons
+            
+            # 2. Buscar apenas leads perdidos atualizados na janela da execução
+            loss_reasons_mapping = self.get_loss_reasons_mapping()
+            
+            window_start = start_date - timedelta(days=self.loss_reasons_lookback_days)
+            window_end = max(int(end_date.timestamp()), max(lost_leads[lead_id] or 0 for lead_id in pending))
+            params = {
+                'filter[pipeline_id]': self.main_pipeline_id,
+                'filter[statuses]': lost_status_ids,  # Todos os status de perda
+                'filter[updated_at][from]': int(window_start.timestamp()),
+                'filter[updated_at][to]': window_end,
+                'with': 'loss_reason'  # Incluir motivos de perda
+            }
+            
+            fetched = {}
+            
+            try:
+                for leads in self.client.paginate('/api/v4/leads', params):
+                    for lead in leads:
+                        lead_id = lead.get('id')
+                        if lead_id not in pending:  # Apenas leads que ainda não conhecemos
+                            continue
                         
-                        logger.info(f"Página {page}: {len(leads)} leads perdidos processados")
+                        loss_reason_id = lead.get('loss_reason_id')
+                        loss_reason_name = lead.get('loss_reason_name')
                         
-                        if len(leads) < 250:
-                            break
-                            
-                        page += 1
-                        time.sleep(0.2)
+                        # Usar mapeamento para obter nome real do motivo
+                        if loss_reason_id and loss_reason_id in loss_reasons_mapping:
+                            loss_reason_name = loss_reasons_mapping[loss_reason_id]
+                        elif not loss_reason_name or loss_reason_name.strip() == '':
+                            if loss_reason_id:
+                                loss_reason_name = f"Motivo ID {loss_reason_id}"
+                            else:
+                                loss_reason_name = None  # Deixar NULL no banco
                         
-                    except Exception as e:
-                        logger.warning(f"Erro ao buscar leads perdidos na página {page}: {e}")
+                        fetched[lead_id] = {
+                            'reason_id': loss_reason_id,
+                            'reason_name': loss_reason_name,
+                            'status_id': lead.get('status_id'),
+                            'lead_updated_at': max(lead.get('updated_at') or 0, lost_leads[lead_id] or 0)
+                        }
+                    
+                    # Todos os pendentes resolvidos: não paginar o restante da janela
+                    if len(fetched) == len(pending):
                         break
-                
-                logger.info(f"Total de leads perdidos com motivos: {total_lost_leads}")
-                
-                # Log de amostra dos motivos encontrados
-                if loss_reasons:
-                    sample_reasons = list(loss_reasons.values())[:5]
-                    logger.info("Amostra de motivos de perda encontrados:")
-                    for reason in sample_reasons:
-                        logger.info(f"  Lead: reason_id={reason['reason_id']}, reason_name='{reason['reason_name']}'")
+                    
+            except Exception as e:
+                logger.warning(f"Erro ao buscar leads perdidos: {e}")
+            
+            logger.info(f"Leads perdidos resolvidos na API: {len(fetched)}/{len(pending)}")
+            
+            self.save_loss_reasons_cache(fetched)
+            loss_reasons.update(fetched)
+            
+            # Log de amostra dos motivos encontrados
+            if fetched:
+                sample_reasons = list(fetched.values())[:5]
+                logger.info("Amostra de motivos de perda encontrados:")
+                for reason in sample_reasons:
+                    logger.info(f"  Lead: reason_id={reason['reason_id']}, reason_name='{reason['reason_name']}'")
             
             return loss_reasons
             
@@ -663,7 +735,7 @@ class KommoFunnelETL:
         LOAD - Carregar dados do funil do pipeline principal no banco
         """
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = mysql.connector.connect(**self.db_config, **connection_options())
             cursor = connection.cursor()
             
             # Criar tabela de histórico do funil
@@ -700,6 +772,8 @@ class KommoFunnelETL:
             """
             cursor.execute(create_table_query)
             
+            ensure_indexes(cursor, ['funnel_history'])
+            
             # Limpar dados existentes do pipeline principal para o período
             if not df.empty:
                 start_date = df['entry_date'].min().date()
@@ -708,9 +782,9 @@ class KommoFunnelETL:
                 delete_query = """
                 DELETE FROM funnel_history 
                 WHERE pipeline_id = %s 
-                AND DATE(entry_date) BETWEEN %s AND %s
+                AND entry_date >= %s AND entry_date < %s
                 """
-                cursor.execute(delete_query, (self.main_pipeline_id, start_date, end_date))
+                cursor.execute(delete_query, (self.main_pipeline_id, *range_bounds(start_date, end_date)))
                 logger.info(f"Limpos dados existentes do pipeline principal de {start_date} até {end_date}")
             
             # Inserir dados
@@ -732,33 +806,30 @@ class KommoFunnelETL:
                 created_at = VALUES(created_at)
             """
             
-            data_to_insert = []
-            for _, row in df.iterrows():
-                data_to_insert.append((
-                    int(row['lead_id']),
-                    int(row['pipeline_id']),
-                    row['pipeline_name'],
-                    int(row['status_id']) if pd.notna(row['status_id']) else None,
-                    row['status_name'],
-                    row['status_type'],
-                    int(row['status_sort']) if pd.notna(row['status_sort']) else 0,
-                    row['entry_date'],
-                    row['exit_date'] if pd.notna(row['exit_date']) else None,
-                    float(row['time_in_status_hours']) if pd.notna(row['time_in_status_hours']) else None,
-                    bool(row['is_current_status']),
-                    row['conversion_type'],
-                    row['next_status_type'],
-                    float(row['lead_value']) if pd.notna(row['lead_value']) else 0,
-                    int(row['responsible_user_id']) if pd.notna(row['responsible_user_id']) else None,
-                    int(row['loss_reason_id']) if pd.notna(row['loss_reason_id']) else None,
-                    row['loss_reason_name'],
-                    row['created_at']
-                ))
-            
-            cursor.executemany(insert_query, data_to_insert)
-            connection.commit()
+            # Converter colunas de forma vetorizada e carregar em blocos (commit por bloco)
+            columns = [
+                ('lead_id', 'int', None),
+                ('pipeline_id', 'int', None),
+                ('pipeline_name', 'raw', None),
+                ('status_id', 'int', None),
+                ('status_name', 'raw', None),
+                ('status_type', 'raw', None),
+                ('status_sort', 'int', 0),
+                ('entry_date', 'raw', None),
+                ('exit_date', 'raw', None),
+                ('time_in_status_hours', 'float', None),
+                ('is_current_status', 'bool', False),
+                ('conversion_type', 'raw', None),
+                ('next_status_type', 'raw', None),
+                ('lead_value', 'float', 0),
+                ('responsible_user_id', 'int', None),
+                ('loss_reason_id', 'int', None),
+                ('loss_reason_name', 'raw', None),
+                ('created_at', 'raw', None)
+            ]
+            total = bulk_load(connection, insert_query, df, columns)
             
-            logger.info(f"Carregados {len(data_to_insert)} registros do funil principal")
+            logger.info(f"Carregados {total} registros do funil principal")
             
         except Exception as e:
             logger.error(f"Erro ao carregar dados do funil: {e}")
@@ -828,28 +899,7 @@ class KommoFunnelETL:
             cursor.execute(create_metrics_table)
             
             # Calcular métricas para a data específica
-            metrics_query = """
-            SELECT 
-                DATE(entry_date) as metric_date,
-                COUNT(CASE WHEN status_name = 'Incoming leads' THEN 1 END) as incoming_leads,
-                COUNT(CASE WHEN status_name = 'Interessados' THEN 1 END) as interessados,
-                COUNT(CASE WHEN status_name = 'Abordados' THEN 1 END) as abordados,
-                COUNT(CASE WHEN status_name = 'Qualificação' THEN 1 END) as qualificacao,
-                COUNT(CASE WHEN status_name = 'Qualificado para reunião' THEN 1 END) as qualificado_reuniao,
-                COUNT(CASE WHEN status_name = 'Apresentação' THEN 1 END) as apresentacao,
-                COUNT(CASE WHEN status_name = 'No Show' THEN 1 END) as no_show,
-                COUNT(CASE WHEN status_name = 'FUP' THEN 1 END) as fup,
-                COUNT(CASE WHEN status_name = 'Negociação' THEN 1 END) as negociacao,
-                COUNT(CASE WHEN status_name = 'Venda ganha' THEN 1 END) as venda_ganha,
-                COUNT(CASE WHEN status_name = 'Venda perdida' THEN 1 END) as venda_perdida,
-                AVG(time_in_status_hours) as tempo_medio_por_etapa,
-                SUM(lead_value) as valor_pipeline
-            FROM funnel_history 
-            WHERE pipeline_id = %s AND DATE(entry_date) = %s
-            GROUP BY DATE(entry_date)
-            """
-            
-            cursor.execute(metrics_query, (self.main_pipeline_id, date.date()))
+            cursor.execute(self.MAIN_FUNNEL_METRICS_QUERY, (self.main_pipeline_id, *day_bounds(date)))
             result = cursor.fetchone()
             
             if result:
@@ -914,11 +964,13 @@ class KommoFunnelETL:
             logger.info("INICIANDO ETL FUNIL PRINCIPAL KOMMO")
             logger.info("="*60)
             
-            # Definir período padrão (últimos 30 dias)
+            # Definir período padrão (últimos 30 dias, em dias inteiros: os filtros
+            # ficam estáveis entre tentativas e o checkpoint de paginação é retomado)
             if not start_date:
                 start_date = datetime.now() - timedelta(days=30)
+                start_date = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
             if not end_date:
-                end_date = datetime.now()
+                end_date = datetime.now().replace(hour=23, minute=59, second=59, microsecond=0)
             
             logger.info(f"Período: {start_date.date()} até {end_date.date()}")
             
@@ -928,6 +980,9 @@ class KommoFunnelETL:
             
             logger.info("2️ LEADS - Extraindo leads do funil principal...")
             raw_data = self.extract_leads_history(start_date, end_date)
+            self.client.log_stats()
+            # Paginação que falhou (mesmo capturada na extração) aborta antes do load: o checkpoint fica para a retomada
+            self.client.ensure_complete_extraction()
             
             # 2. Transformar dados
             logger.info("3️ TRANSFORM - Processando dados do funil...")
@@ -941,6 +996,8 @@ class KommoFunnelETL:
             logger.info("5️ METRICS - Gerando métricas do funil principal...")
             self.generate_main_funnel_metrics(end_date)
             
+            self.client.clear_checkpoint()
+            
             logger.info("="*60)
             logger.info(" ETL FUNIL PRINCIPAL CONCLUÍDO COM SUCESSO!")
             logger.info("="*60)
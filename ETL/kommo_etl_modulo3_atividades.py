@@ -1,6 +1,5 @@
 # ETL para Atividade Comercial - Kommo CRM
 import os
-import requests
 import pandas as pd
 import mysql.connector
 from datetime import datetime, timedelta
@@ -11,6 +10,16 @@ import json
 from dotenv import load_dotenv
 from collections import defaultdict
 
+from extraction_checkpoint import ExtractionCheckpoint
+from kommo_client import KommoClient
+from reference_cache import ReferenceCache
+from bulk_loader import bulk_load, connection_options
+from query_layer import ensure_columns, ensure_indexes
+from activity_classifier import (
+    ACTIVITY_CLASSIFIER, TASK_CATEGORY_ORDER, FOLLOWUP_TYPE_ORDER, SEGMENT_TYPE_ORDER,
+    NOTE_MENTION_KEYWORDS, like_condition, note_mentions
+)
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,6 +27,9 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 class KommoActivityETL:
+    # Tamanho gravado de note_text (as flags de menção são calculadas sobre o mesmo texto)
+    NOTE_TEXT_MAX_LENGTH = 1000
+
     def __init__(self):
         self.kommo_config = {
             'base_url': 'https://previdas.kommo.com',
@@ -33,10 +45,13 @@ class KommoActivityETL:
             'database': os.getenv('DB_NAME')
         }
         
-        self.headers = {
-            'Authorization': f'Bearer {self.kommo_config["access_token"]}',
-            'Content-Type': 'application/json'
-        }
+        # Cliente HTTP com pool de conexões (keep-alive, gzip e estatísticas por endpoint)
+        # Checkpoint por página quando KOMMO_RUN_ID está definido (retomada de execuções interrompidas)
+        self.client = KommoClient(self.kommo_config['base_url'], self.kommo_config['access_token'],
+                                  checkpoint=ExtractionCheckpoint.from_env('modulo3_atividades'))
+        
+        # Dados de referência (usuários, pipelines, motivos de perda) com cache em disco compartilhado
+        self.reference_cache = ReferenceCache(self.client)
         
         # Cache para usuários
         self.users_cache = {}
@@ -48,12 +63,7 @@ class KommoActivityETL:
         try:
             logger.info("Extraindo usuários...")
             
-            users_url = f"{self.kommo_config['base_url']}/api/v4/users"
-            users_response = requests.get(users_url, headers=self.headers)
-            users_response.raise_for_status()
-            users_data = users_response.json()
-            
-            users = users_data.get('_embedded', {}).get('users', [])
+            users = self.reference_cache.users()
             
             for user in users:
                 user_id = user.get('id')
@@ -92,35 +102,22 @@ class KommoActivityETL:
                 'whatsapp': []
             }
             
-            # 1. Extrair TODAS as tarefas (incluindo ligações)
-            logger.info("📋 Extraindo tarefas e ligações...")
-            tasks = self.extract_all_tasks(start_timestamp, end_timestamp)
-            activities_data['tasks'] = tasks
-            
-            # 2. Extrair eventos de interação
-            logger.info("📞 Extraindo eventos de comunicação...")
-            events = self.extract_communication_events(start_timestamp, end_timestamp)
-            activities_data['events'] = events
+            # 1. Baixar /api/v4/tasks UMA vez para o período
+            logger.info("📋 Extraindo tarefas (download único)...")
+            raw_tasks = self.extract_raw_tasks(start_timestamp, end_timestamp)
             
-            # 3. Extrair notas e comentários
-            logger.info("📝 Extraindo notas e comentários...")
-            notes = self.extract_all_notes(start_timestamp, end_timestamp)
-            activities_data['notes'] = notes
+            # 2. Derivar em memória tarefas, reuniões, notas e eventos a partir do mesmo payload
+            activities_data['tasks'] = self.build_enhanced_tasks(raw_tasks)
+            logger.info(f"✅ {len(activities_data['tasks'])} tarefas comerciais")
             
-            # 4. Extrair reuniões agendadas
-            logger.info("📅 Extraindo reuniões agendadas...")
-            meetings = self.extract_meetings(start_timestamp, end_timestamp)
-            activities_data['meetings'] = meetings
+            activities_data['meetings'] = [task for task in raw_tasks if task.get('task_type') == 3]  # Tipo 3 = reunião
+            logger.info(f"📅 {len(activities_data['meetings'])} reuniões agendadas")
             
-            # 3. Extrair notas/comentários - Tentar endpoint alternativo
-            logger.info("Extraindo notas...")
-            notes = self.extract_notes_alternative(start_timestamp, end_timestamp)
-            activities_data['notes'] = notes
+            activities_data['notes'] = self.derive_notes_from_tasks(raw_tasks)
+            logger.info(f"📝 {len(activities_data['notes'])} notas das tarefas")
             
-            # 4. Extrair eventos de atividade - Tentar endpoint alternativo
-            logger.info("Extraindo eventos...")
-            events = self.extract_events_alternative(start_timestamp, end_timestamp)
-            activities_data['events'] = events
+            activities_data['events'] = self.derive_events_from_tasks(raw_tasks)
+            logger.info(f"📞 {len(activities_data['events'])} eventos das tarefas")
             
             return activities_data
             
@@ -134,49 +131,13 @@ class KommoActivityETL:
         """
         try:
             # Tentar endpoint alternativo para ligações
-            calls_url = f"{self.kommo_config['base_url']}/api/v4/events"
             calls_params = {
                 'filter[created_at][from]': start_timestamp,
                 'filter[created_at][to]': end_timestamp,
-                'filter[type]': 'outgoing_call,incoming_call',
-                'limit': 250
+                'filter[type]': 'outgoing_call,incoming_call'
             }
             
-            all_calls = []
-            page = 1
-            
-            while True:
-                calls_params['page'] = page
-                calls_response = requests.get(calls_url, headers=self.headers, params=calls_params)
-                
-                # Verificar se a resposta é válida
-                if calls_response.status_code != 200:
-                    logger.warning(f"Status code {calls_response.status_code} para ligações")
-                    break
-                
-                # Verificar se a resposta tem conteúdo
-                if not calls_response.text.strip():
-                    logger.warning("Resposta vazia para ligações")
-                    break
-                
-                try:
-                    calls_data = calls_response.json()
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Erro ao decodificar JSON de ligações: {e}")
-                    logger.warning(f"Resposta: {calls_response.text[:200]}...")
-                    break
-                
-                calls = calls_data.get('_embedded', {}).get('events', [])
-                if not calls:
-                    break
-                    
-                all_calls.extend(calls)
-                
-                if len(calls) < 250:
-                    break
-                    
-                page += 1
-                time.sleep(0.1)
+            all_calls = self.client.fetch_all('/api/v4/events', calls_params)
             
             logger.info(f"Extraídas {len(all_calls)} ligações")
             return all_calls
@@ -185,81 +146,103 @@ class KommoActivityETL:
             logger.warning(f"Erro ao extrair ligações: {e}")
             return []
 
-    def extract_all_tasks(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
+    def extract_raw_tasks(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
         """
-        Extrair TODAS as tarefas incluindo ligações, follow-ups, reuniões
+        Baixar todas as tarefas do período (payload bruto da API, sem transformação)
         """
         try:
-            logger.info("📋 Buscando todas as tarefas comerciais...")
-            
-            tasks_url = f"{self.kommo_config['base_url']}/api/v4/tasks"
             tasks_params = {
                 'filter[created_at][from]': start_timestamp,
-                'filter[created_at][to]': end_timestamp,
-                'limit': 250
+                'filter[created_at][to]': end_timestamp
             }
             
-            all_tasks = []
-            page = 1
+            raw_tasks = self.client.fetch_all('/api/v4/tasks', tasks_params)
             
-            while True:
-                tasks_params['page'] = page
-                tasks_response = requests.get(tasks_url, headers=self.headers, params=tasks_params)
-                
-                if tasks_response.status_code != 200:
-                    logger.warning(f"Erro na página {page}: {tasks_response.status_code}")
-                    break
-                
-                try:
-                    tasks_data = tasks_response.json()
-                except json.JSONDecodeError:
-                    logger.warning(f"Erro ao decodificar JSON na página {page}")
-                    break
-                
-                tasks = tasks_data.get('_embedded', {}).get('tasks', [])
-                if not tasks:
-                    break
-                
-                logger.info(f"Página {page}: {len(tasks)} tarefas encontradas")
-                
-                # Processar e categorizar cada tarefa
-                for task in tasks:
-                    task_type = task.get('task_type')
-                    text = task.get('text', '').lower()
-                    
-                    # Categorizar tipo de atividade
-                    activity_type = self.categorize_task_activity(task_type, text)
-                    
-                    enhanced_task = {
-                        'id': task.get('id'),
-                        'entity_id': task.get('entity_id'),
-                        'entity_type': task.get('entity_type'),
-                        'responsible_user_id': task.get('responsible_user_id'),
-                        'created_at': task.get('created_at'),
-                        'updated_at': task.get('updated_at'),
-                        'complete_till': task.get('complete_till'),
-                        'text': task.get('text', ''),
-                        'task_type_id': task_type,
-                        'activity_type': activity_type,
-                        'is_completed': task.get('is_completed', False),
-                        'result': task.get('result', {}),
-                        'account_id': task.get('account_id')
-                    }
-                    all_tasks.append(enhanced_task)
-                
-                if len(tasks) < 250:
-                    break
-                    
-                page += 1
-                time.sleep(0.1)
-            
-            logger.info(f"✅ Extraídas {len(all_tasks)} tarefas comerciais")
-            return all_tasks
+            logger.info(f"✅ Baixadas {len(raw_tasks)} tarefas")
+            return raw_tasks
             
         except Exception as e:
             logger.error(f"❌ Erro ao extrair tarefas: {e}")
             return []
-    
+
+    def build_enhanced_tasks(self, raw_tasks: List[Dict]) -> List[Dict]:
+        """
+        Processar e categorizar as tarefas (ligações, follow-ups, reuniões)
+        """
+        all_tasks = []
+        
+        for task in raw_tasks:
+            task_type = task.get('task_type')
+            text = task.get('text', '').lower()
+            
+            # Categorizar tipo de atividade
+            activity_type = self.categorize_task_activity(task_type, text)
+            
+            enhanced_task = {
+                'id': task.get('id'),
+                'entity_id': task.get('entity_id'),
+                'entity_type': task.get('entity_type'),
+                'responsible_user_id': task.get('responsible_user_id'),
+                'created_at': task.get('created_at'),
+                'updated_at': task.get('updated_at'),
+                'complete_till': task.get('complete_till'),
+                'text': task.get('text', ''),
+                'task_type_id': task_type,
+                'activity_type': activity_type,
+                'is_completed': task.get('is_completed', False),
+                'result': task.get('result', {}),
+                'account_id': task.get('account_id')
+            }
+            all_tasks.append(enhanced_task)
+        
+        return all_tasks
+
+    def derive_notes_from_tasks(self, raw_tasks: List[Dict]) -> List[Dict]:
+        """
+        Converter tarefas com texto para formato de notas
+        """
+        all_notes = []
+        
+        for task in raw_tasks:
+            if task.get('text') and len(task.get('text', '')) > 10:  # Nota com conteúdo
+                note_data = {
+                    'id': f"note_task_{task.get('id')}",
+                    'entity_id': task.get('entity_id'),
+                    'entity_type': task.get('entity_type'),
+                    'responsible_user_id': task.get('responsible_user_id'),
+                    'created_at': task.get('created_at'),
+                    'note_type': 'task_note',
+                    'text': task.get('text', ''),
+                    'params': {}
+                }
+                all_notes.append(note_data)
+        
+        return all_notes
+
+    def derive_events_from_tasks(self, raw_tasks: List[Dict]) -> List[Dict]:
+        """
+        Converter tarefas completadas para formato de eventos
+        """
+        all_events = []
+        
+        for task in raw_tasks:
+            if task.get('is_completed'):
+                event_data = {
+                    'id': f"event_task_{task.get('id')}",
+                    'entity_id': task.get('entity_id'),
+                    'entity_type': task.get('entity_type'),
+                    'responsible_user_id': task.get('responsible_user_id'),
+                    'created_at': task.get('completed_at') or task.get('created_at'),
+                    'type': 'task_completed',
+                    'params': {
+                        'task_type': task.get('task_type'),
+                        'text': task.get('text', '')
+                    }
+                }
+                all_events.append(event_data)
+        
+        return all_events
+
     def categorize_task_activity(self, task_type: int, text: str) -> str:
         """
         Categorizar tipo de atividade baseado no tipo e texto
@@ -281,21 +264,8 @@ class KommoActivityETL:
         else:
             base_type = 'other'
         
-        # Refinar baseado no texto
-        if any(word in text_lower for word in ['ligar', 'call', 'telefone', 'contato telefônico']):
-            return 'call'
-        elif any(word in text_lower for word in ['reunião', 'meeting', 'apresentação', 'demo']):
-            return 'meeting'
-        elif any(word in text_lower for word in ['email', 'e-mail', 'enviar']):
-            return 'email'
-        elif any(word in text_lower for word in ['whatsapp', 'wpp', 'zap', 'mensagem']):
-            return 'whatsapp'
-        elif any(word in text_lower for word in ['follow', 'retorno', 'acompanhar']):
-            return 'follow_up'
-        elif any(word in text_lower for word in ['proposta', 'orçamento', 'contrato']):
-            return 'proposal'
-        else:
-            return base_type
+        # Refinar baseado no texto (regex pré-compilados em activity_classifier)
+        return ACTIVITY_CLASSIFIER.first_match(TASK_CATEGORY_ORDER, text_lower, default=base_type)
 
     def extract_communication_events(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
         """
@@ -304,8 +274,6 @@ class KommoActivityETL:
         try:
             logger.info("📞 Buscando eventos de comunicação...")
             
-            events_url = f"{self.kommo_config['base_url']}/api/v4/events"
-            
             communication_events = []
             
             # Tipos de eventos de comunicação
@@ -323,38 +291,14 @@ class KommoActivityETL:
                 events_params = {
                     'filter[created_at][from]': start_timestamp,
                     'filter[created_at][to]': end_timestamp,
-                    'filter[type]': event_type,
-                    'limit': 250
+                    'filter[type]': event_type
                 }
                 
-                page = 1
-                while True:
-                    events_params['page'] = page
-                    
-                    try:
-                        events_response = requests.get(events_url, headers=self.headers, params=events_params)
-                        
-                        if events_response.status_code != 200:
-                            break
-                        
-                        events_data = events_response.json()
-                        events = events_data.get('_embedded', {}).get('events', [])
-                        
-                        if not events:
-                            break
-                        
+                try:
+                    for events in self.client.paginate('/api/v4/events', events_params):
                         communication_events.extend(events)
-                        logger.info(f"    Página {page}: {len(events)} eventos {event_type}")
-                        
-                        if len(events) < 250:
-                            break
-                            
-                        page += 1
-                        time.sleep(0.1)
-                        
-                    except Exception as e:
-                        logger.warning(f"Erro ao buscar eventos {event_type} página {page}: {e}")
-                        break
+                except Exception as e:
+                    logger.warning(f"Erro ao buscar eventos {event_type}: {e}")
             
             logger.info(f" Extraídos {len(communication_events)} eventos de comunicação")
             return communication_events
@@ -371,44 +315,19 @@ class KommoActivityETL:
             logger.info(" Buscando notas e comentários...")
             
             # Método 1: Buscar via eventos
-            notes_url = f"{self.kommo_config['base_url']}/api/v4/events"
             notes_params = {
                 'filter[created_at][from]': start_timestamp,
                 'filter[created_at][to]': end_timestamp,
-                'filter[type]': 'note_added',
-                'limit': 250
+                'filter[type]': 'note_added'
             }
             
             all_notes = []
-            page = 1
             
-            while True:
-                notes_params['page'] = page
-                
-                try:
-                    notes_response = requests.get(notes_url, headers=self.headers, params=notes_params)
-                    
-                    if notes_response.status_code != 200:
-                        break
-                    
-                    notes_data = notes_response.json()
-                    notes = notes_data.get('_embedded', {}).get('events', [])
-                    
-                    if not notes:
-                        break
-                    
+            try:
+                for notes in self.client.paginate('/api/v4/events', notes_params):
                     all_notes.extend(notes)
-                    logger.info(f"Página {page}: {len(notes)} notas encontradas")
-                    
-                    if len(notes) < 250:
-                        break
-                        
-                    page += 1
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.warning(f"Erro ao buscar notas página {page}: {e}")
-                    break
+            except Exception as e:
+                logger.warning(f"Erro ao buscar notas: {e}")
             
             logger.info(f" Extraídas {len(all_notes)} notas")
             return all_notes
@@ -417,149 +336,19 @@ class KommoActivityETL:
             logger.error(f" Erro ao extrair notas: {e}")
             return []
 
-    def extract_meetings(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
-        """
-        Extrair reuniões agendadas
-        """
-        try:
-            logger.info(" Buscando reuniões agendadas...")
-            
-            # Buscar tarefas que são reuniões
-            tasks_url = f"{self.kommo_config['base_url']}/api/v4/tasks"
-            meeting_params = {
-                'filter[created_at][from]': start_timestamp,
-                'filter[created_at][to]': end_timestamp,
-                'filter[task_type]': 3,  # Tipo 3 = reunião
-                'limit': 250
-            }
-            
-            all_meetings = []
-            page = 1
-            
-            while True:
-                meeting_params['page'] = page
-                
-                try:
-                    meeting_response = requests.get(tasks_url, headers=self.headers, params=meeting_params)
-                    
-                    if meeting_response.status_code != 200:
-                        break
-                    
-                    meeting_data = meeting_response.json()
-                    meetings = meeting_data.get('_embedded', {}).get('tasks', [])
-                    
-                    if not meetings:
-                        break
-                    
-                    all_meetings.extend(meetings)
-                    logger.info(f"Página {page}: {len(meetings)} reuniões encontradas")
-                    
-                    if len(meetings) < 250:
-                        break
-                        
-                    page += 1
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    logger.warning(f"Erro ao buscar reuniões página {page}: {e}")
-                    break
-            
-            logger.info(f"✅ Extraídas {len(all_meetings)} reuniões")
-            return all_meetings
-            
-        except Exception as e:
-            logger.error(f" Erro ao extrair reuniões: {e}")
-            return []
-
-    def extract_tasks(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
-        """
-        Extrair tarefas/follow-ups
-        """
-        try:
-            tasks_url = f"{self.kommo_config['base_url']}/api/v4/tasks"
-            tasks_params = {
-                'filter[created_at][from]': start_timestamp,
-                'filter[created_at][to]': end_timestamp,
-                'limit': 250
-            }
-            
-            all_tasks = []
-            page = 1
-            
-            while True:
-                tasks_params['page'] = page
-                tasks_response = requests.get(tasks_url, headers=self.headers, params=tasks_params)
-                tasks_response.raise_for_status()
-                tasks_data = tasks_response.json()
-                
-                tasks = tasks_data.get('_embedded', {}).get('tasks', [])
-                if not tasks:
-                    break
-                    
-                all_tasks.extend(tasks)
-                
-                if len(tasks) < 250:
-                    break
-                    
-                page += 1
-                time.sleep(0.1)
-            
-            logger.info(f"Extraídas {len(all_tasks)} tarefas")
-            return all_tasks
-            
-        except Exception as e:
-            logger.warning(f"Erro ao extrair tarefas: {e}")
-            return []
-
     def extract_notes(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
         """
         Extrair notas/comentários
         """
         try:
             # Tentar endpoint alternativo para notas
-            notes_url = f"{self.kommo_config['base_url']}/api/v4/events"
             notes_params = {
                 'filter[created_at][from]': start_timestamp,
                 'filter[created_at][to]': end_timestamp,
-                'filter[type]': 'note_added',
-                'limit': 250
+                'filter[type]': 'note_added'
             }
             
-            all_notes = []
-            page = 1
-            
-            while True:
-                notes_params['page'] = page
-                notes_response = requests.get(notes_url, headers=self.headers, params=notes_params)
-                
-                # Verificar se a resposta é válida
-                if notes_response.status_code != 200:
-                    logger.warning(f"Status code {notes_response.status_code} para notas")
-                    break
-                
-                # Verificar se a resposta tem conteúdo
-                if not notes_response.text.strip():
-                    logger.warning("Resposta vazia para notas")
-                    break
-                
-                try:
-                    notes_data = notes_response.json()
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Erro ao decodificar JSON de notas: {e}")
-                    logger.warning(f"Resposta: {notes_response.text[:200]}...")
-                    break
-                
-                notes = notes_data.get('_embedded', {}).get('events', [])
-                if not notes:
-                    break
-                    
-                all_notes.extend(notes)
-                
-                if len(notes) < 250:
-                    break
-                    
-                page += 1
-                time.sleep(0.1)
+            all_notes = self.client.fetch_all('/api/v4/events', notes_params)
             
             logger.info(f"Extraídas {len(all_notes)} notas")
             return all_notes
@@ -568,75 +357,11 @@ class KommoActivityETL:
             logger.warning(f"Erro ao extrair notas: {e}")
             return []
 
-    def extract_notes_alternative(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
-        """
-        Tentar extrair notas usando diferentes abordagens
-        """
-        try:
-            # Tentativa 1: Buscar nas tarefas que têm texto (notas)
-            logger.info("Tentando extrair notas das tarefas...")
-            
-            tasks_url = f"{self.kommo_config['base_url']}/api/v4/tasks"
-            tasks_params = {
-                'filter[created_at][from]': start_timestamp,
-                'filter[created_at][to]': end_timestamp,
-                'limit': 250
-            }
-            
-            all_notes = []
-            page = 1
-            
-            while True:
-                tasks_params['page'] = page
-                tasks_response = requests.get(tasks_url, headers=self.headers, params=tasks_params)
-                
-                if tasks_response.status_code != 200:
-                    break
-                
-                try:
-                    tasks_data = tasks_response.json()
-                except json.JSONDecodeError:
-                    break
-                
-                tasks = tasks_data.get('_embedded', {}).get('tasks', [])
-                if not tasks:
-                    break
-                    
-                # Converter tarefas com texto para formato de notas
-                for task in tasks:
-                    if task.get('text') and len(task.get('text', '')) > 10:  # Nota com conteúdo
-                        note_data = {
-                            'id': f"note_task_{task.get('id')}",
-                            'entity_id': task.get('entity_id'),
-                            'entity_type': task.get('entity_type'),
-                            'responsible_user_id': task.get('responsible_user_id'),
-                            'created_at': task.get('created_at'),
-                            'note_type': 'task_note',
-                            'text': task.get('text', ''),
-                            'params': {}
-                        }
-                        all_notes.append(note_data)
-                
-                if len(tasks) < 250:
-                    break
-                    
-                page += 1
-                time.sleep(0.1)
-            
-            logger.info(f"Extraídas {len(all_notes)} notas das tarefas")
-            return all_notes
-            
-        except Exception as e:
-            logger.warning(f"Erro ao extrair notas alternativo: {e}")
-            return []
-
     def extract_activity_events(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
         """
         Extrair eventos de atividade (e-mails, mensagens)
         """
         try:
-            events_url = f"{self.kommo_config['base_url']}/api/v4/events"
-            
             # Tipos de eventos relacionados a atividades
             activity_event_types = [
                 'outgoing_call',
@@ -657,45 +382,10 @@ class KommoActivityETL:
                 events_params = {
                     'filter[created_at][from]': start_timestamp,
                     'filter[created_at][to]': end_timestamp,
-                    'filter[type]': event_type,
-                    'limit': 250
+                    'filter[type]': event_type
                 }
                 
-                page = 1
-                while True:
-                    events_params['page'] = page
-                    events_response = requests.get(events_url, headers=self.headers, params=events_params)
-                    
-                    # Verificar se a resposta é válida
-                    if events_response.status_code != 200:
-                        logger.warning(f"Status code {events_response.status_code} para eventos tipo {event_type}")
-                        break
-                    
-                    # Verificar se a resposta tem conteúdo
-                    if not events_response.text.strip():
-                        logger.warning(f"Resposta vazia para eventos tipo {event_type}")
-                        break
-                    
-                    try:
-                        events_data = events_response.json()
-                    except json.JSONDecodeError as e:
-                        logger.warning(f"Erro ao decodificar JSON de eventos tipo {event_type}: {e}")
-                        logger.warning(f"Resposta: {events_response.text[:200]}...")
-                        break
-                    
-                    events = events_data.get('_embedded', {}).get('events', [])
-                    if not events:
-                        break
-                        
-                    all_events.extend(events)
-                    
-                    if len(events) < 250:
-                        break
-                        
-                    page += 1
-                    time.sleep(0.1)
-                
-                time.sleep(0.2)  # Delay entre tipos de evento
+                all_events.extend(self.client.fetch_all('/api/v4/events', events_params))
             
             logger.info(f"Extraídos {len(all_events)} eventos de atividade")
             return all_events
@@ -704,71 +394,6 @@ class KommoActivityETL:
             logger.warning(f"Erro ao extrair eventos: {e}")
             return []
 
-    def extract_events_alternative(self, start_timestamp: int, end_timestamp: int) -> List[Dict]:
-        """
-        Tentar extrair eventos usando diferentes abordagens
-        """
-        try:
-            # Tentativa 1: Buscar nas tarefas completadas como eventos
-            logger.info("Tentando extrair eventos das tarefas...")
-            
-            tasks_url = f"{self.kommo_config['base_url']}/api/v4/tasks"
-            tasks_params = {
-                'filter[created_at][from]': start_timestamp,
-                'filter[created_at][to]': end_timestamp,
-                'filter[is_completed]': 1,  # Apenas tarefas completadas
-                'limit': 250
-            }
-            
-            all_events = []
-            page = 1
-            
-            while True:
-                tasks_params['page'] = page
-                tasks_response = requests.get(tasks_url, headers=self.headers, params=tasks_params)
-                
-                if tasks_response.status_code != 200:
-                    break
-                
-                try:
-                    tasks_data = tasks_response.json()
-                except json.JSONDecodeError:
-                    break
-                
-                tasks = tasks_data.get('_embedded', {}).get('tasks', [])
-                if not tasks:
-                    break
-                    
-                # Converter tarefas completadas para formato de eventos
-                for task in tasks:
-                    if task.get('is_completed'):
-                        event_data = {
-                            'id': f"event_task_{task.get('id')}",
-                            'entity_id': task.get('entity_id'),
-                            'entity_type': task.get('entity_type'),
-                            'responsible_user_id': task.get('responsible_user_id'),
-                            'created_at': task.get('completed_at') or task.get('created_at'),
-                            'type': 'task_completed',
-                            'params': {
-                                'task_type': task.get('task_type'),
-                                'text': task.get('text', '')
-                            }
-                        }
-                        all_events.append(event_data)
-                
-                if len(tasks) < 250:
-                    break
-                    
-                page += 1
-                time.sleep(0.1)
-            
-            logger.info(f"Extraídos {len(all_events)} eventos das tarefas")
-            return all_events
-            
-        except Exception as e:
-            logger.warning(f"Erro ao extrair eventos alternativo: {e}")
-            return []
-
     def _classify_followup_type(self, text: str, note_text: str) -> str:
         """
         Classificar o tipo específico de follow-up baseado no texto
@@ -776,61 +401,8 @@ class KommoActivityETL:
         text_lower = text.lower() if text else ''
         note_text_lower = note_text.lower() if note_text else ''
         
-        # SEGMENTAÇÃO MELHORADA POR TIPO DE ATIVIDADE
-        fup_comunicacao = [
-            'ligar', 'telefonar', 'chamar', 'contatar', 
-            'falar com', 'conversar com', 'dialogar', 'comunicar'
-        ]
-        
-        fup_negocio = [
-            'proposta', 'orçamento', 'cotação', 'demonstração',
-            'apresentação', 'reunião', 'encontro', 'visita',
-            'demonstrar', 'mostrar', 'explicar', 'esclarecer'
-        ]
-        
-        fup_vendas = [
-            'venda', 'comercial', 'comprar', 'adquirir', 'contratar',
-            'fechar', 'fechamento', 'negócio', 'negociação',
-            'prospecção', 'prospectar', 'lead', 'cliente'
-        ]
-        
-        fup_acompanhamento = [
-            'verificar', 'checar', 'confirmar', 'validar', 'analisar',
-            'revisar', 'monitorar', 'acompanhar', 'retorno', 'retornar'
-        ]
-        
-        fup_no_show = [
-            'no show', 'não compareceu', 'não apareceu', 'ausente',
-            'falta', 'cancelou', 'desmarcou'
-        ]
-        
-        fup_tentativa = [
-            'tentativa', 'tentativa de', '1º', '2º', '3º', '4º', '5º',
-            'primeira', 'segunda', 'terceira', 'quarta', 'quinta'
-        ]
-        
-        fup_generico = [
-            'fup', 'follow up', 'follow-up', 'followup', 'contato',
-            'entrar em contato', 'fazer contato'
-        ]
-        
-        # Verificar tipo de follow-up (ordem de prioridade)
-        if any(keyword in text_lower or keyword in note_text_lower for keyword in fup_no_show):
-            return 'no_show'
-        elif any(keyword in text_lower or keyword in note_text_lower for keyword in fup_tentativa):
-            return 'tentativa'
-        elif any(keyword in text_lower or keyword in note_text_lower for keyword in fup_comunicacao):
-            return 'comunicacao'
-        elif any(keyword in text_lower or keyword in note_text_lower for keyword in fup_negocio):
-            return 'negocio'
-        elif any(keyword in text_lower or keyword in note_text_lower for keyword in fup_vendas):
-            return 'vendas'
-        elif any(keyword in text_lower or keyword in note_text_lower for keyword in fup_acompanhamento):
-            return 'acompanhamento'
-        elif any(keyword in text_lower or keyword in note_text_lower for keyword in fup_generico):
-            return 'generico'
-        else:
-            return 'outro'
+        # Verificar tipo de follow-up (ordem de prioridade em FOLLOWUP_TYPE_ORDER)
+        return ACTIVITY_CLASSIFIER.first_match(FOLLOWUP_TYPE_ORDER, text_lower, note_text_lower, default='outro')
 
     def classify_contact_type(self, activity_data: Dict, activity_type: str) -> str:
         """
@@ -873,40 +445,8 @@ class KommoActivityETL:
                 elif task_type == 3:  # E-mail
                     return 'email'
                 elif task_type == 4:  # Tarefa
-                    # Verificar se é follow-up baseado no texto - MELHORADO
-                    # Palavras-chave fortes que indicam follow-up
-                    strong_followup_keywords = [
-                        'fup', 'follow', 'acompanhar', 'retorno', 'retornar', 'abordar',
-                        'dia', 'dias', 'semana', 'próximo', 'seguinte', 'retomar',
-                        'continuar', 'repetir', 'nova tentativa', 'tentar novamente',
-                        'lembrar', 'lembrete', 'agendar', 'marcar', 'verificar',
-                        'checar', 'confirmar', 'validar', 'atualizar', 'atualização',
-                        'proposta', 'orçamento', 'cotação', 'demonstração',
-                        'apresentação', 'reunião', 'encontro', 'visita',
-                        'venda', 'comercial', 'negócio', 'negociação',
-                        'prospecção', 'prospectar', 'cliente', 'cliente potencial'
-                    ]
-                
-                    # Verificar se o texto contém palavras-chave de follow-up
-                    text_lower = text.lower()
-                    note_text_lower = note_text.lower()
-                    
-                    # Palavras-chave fortes que indicam follow-up
-                    strong_followup_keywords = [
-                        'fup', 'follow', 'acompanhar', 'retorno', 'retornar', 'abordar',
-                        'dia', 'dias', 'semana', 'próximo', 'seguinte', 'retomar',
-                        'continuar', 'repetir', 'nova tentativa', 'tentar novamente',
-                        'lembrar', 'lembrete', 'agendar', 'marcar', 'verificar',
-                        'checar', 'confirmar', 'validar', 'atualizar', 'atualização',
-                        'proposta', 'orçamento', 'cotação', 'demonstração',
-                        'apresentação', 'reunião', 'encontro', 'visita',
-                        'venda', 'comercial', 'negócio', 'negociação',
-                        'prospecção', 'prospectar', 'cliente', 'cliente potencial'
-                    ]
-                    
-                    # Se tem pelo menos 1 palavra-chave forte, é follow-up
-                    if any(strong_keyword in text_lower or strong_keyword in note_text_lower 
-                            for strong_keyword in strong_followup_keywords):
+                    # Se tem pelo menos 1 palavra-chave forte de follow-up, é follow-up
+                    if ACTIVITY_CLASSIFIER.matches('contact_strong_followup', text, note_text):
                         fup_tipo = self._classify_followup_type(text, note_text)
                         return f'followup_{fup_tipo}'
                     else:
@@ -916,13 +456,13 @@ class KommoActivityETL:
                     fup_tipo = self._classify_followup_type(text, note_text)
                     return f'followup_{fup_tipo}'
                 # Se não tem task_type, tentar classificar pelo texto
-                elif 'reunião' in text or 'meeting' in text or 'reunião' in note_text or 'meeting' in note_text:
+                elif ACTIVITY_CLASSIFIER.matches('contact_meeting', text, note_text):
                     return 'reuniao_agendada'
-                elif 'ligar' in text or 'call' in text or 'ligar' in note_text or 'call' in note_text:
+                elif ACTIVITY_CLASSIFIER.matches('contact_call', text, note_text):
                     return 'ligacao_agendada'
-                elif 'email' in text or 'e-mail' in text or 'email' in note_text or 'e-mail' in note_text:
+                elif ACTIVITY_CLASSIFIER.matches('contact_email', text, note_text):
                     return 'email'
-                elif any(keyword in text or keyword in note_text for keyword in ['fup', 'follow', 'acompanhar', 'retorno', 'retornar', 'abordar', 'apresentação', 'ligação', 'ligar', 'contato', 'acompanhamento', 'retornar contato', 'retornar ligação', 'fazer contato', 'entrar em contato', 'prospeção']):
+                elif ACTIVITY_CLASSIFIER.matches('contact_text_followup', text, note_text):
                     # Aplicar segmentação para follow-ups detectados por texto
                     fup_tipo = self._classify_followup_type(text, note_text)
                     return f'followup_{fup_tipo}'
@@ -959,7 +499,7 @@ class KommoActivityETL:
                 
                 # Verificar tags ou campos específicos
                 tags = activity_data.get('tags', [])
-                if any('follow' in str(tag).lower() or 'fup' in str(tag).lower() for tag in tags):
+                if any(ACTIVITY_CLASSIFIER.matches('follow_up_tag', str(tag).lower()) for tag in tags):
                     return True
             
             # 2. Análise do texto da atividade - MAIS RESTRITIVA
@@ -967,23 +507,9 @@ class KommoActivityETL:
             note_text = str(activity_data.get('note', '')).lower()
             combined_text = f"{text} {note_text}"
             
-            # Padrões de follow-up - APENAS os mais específicos
-            follow_up_patterns = [
-                'fup', 'follow up', 'followup', 'follow-up',
-                'acompanhamento', 'acompanhar', 'acompanha',
-                'retorno', 'retornar', 'verificar retorno',
-                'verificar', 'confirmar', 'confirma',
-                'lembrar', 'lembrete', 'lembrar de',
-                'prospeção', 'prospectar', 'prospect',
-                'nurturing', 'nurture', 'cuidar',
-                're-engajamento', 'reengajamento', 're-engajar',
-                'recontato', 're-contato', 'novo contato',
-                'segunda tentativa', 'terceira tentativa',
-                'tentativa', 'tentar novamente'
-            ]
-            
+            # Padrões de follow-up - APENAS os mais específicos (categoria follow_up_pattern)
             # Só classificar como follow-up se o texto for EXPLICITAMENTE sobre follow-up
-            if any(pattern in combined_text for pattern in follow_up_patterns):
+            if ACTIVITY_CLASSIFIER.matches('follow_up_pattern', combined_text):
                 return True
             
             # 3. Verificar se é uma atividade de re-engajamento (mais específico)
@@ -1022,32 +548,10 @@ class KommoActivityETL:
             note_text = str(activity_data.get('note', '')).lower()
             combined_text = f"{text} {note_text}"
             
-            # 1. SEGMENTAÇÃO POR TIPO DE FOLLOW-UP
-            follow_up_type = None
-            
-            # Prospecção e Nurturing
-            if any(word in combined_text for word in ['prospeção', 'prospectar', 'prospect', 'nurturing', 'nurture']):
-                follow_up_type = 'prospeccao_nurturing'
-            # Acompanhamento de Lead
-            elif any(word in combined_text for word in ['acompanhamento', 'acompanhar', 'acompanha', 'fup']):
-                follow_up_type = 'acompanhamento_lead'
-            # Retorno e Re-engajamento
-            elif any(word in combined_text for word in ['retorno', 'retornar', 're-engajamento', 'reengajamento', 're-engajar']):
-                follow_up_type = 'retorno_reengajamento'
-            # Verificação e Confirmação
-            elif any(word in combined_text for word in ['verificar', 'confirmar', 'confirma', 'verificar retorno']):
-                follow_up_type = 'verificacao_confirmacao'
-            # Lembretes e Agendamentos
-            elif any(word in combined_text for word in ['lembrar', 'lembrete', 'lembrar de']):
-                follow_up_type = 'lembrete_agendamento'
-            # Tentativas Múltiplas
-            elif any(word in combined_text for word in ['segunda tentativa', 'terceira tentativa', 'tentativa', 'tentar novamente']):
-                follow_up_type = 'tentativas_multiplas'
-            # Novo Contato
-            elif any(word in combined_text for word in ['recontato', 're-contato', 'novo contato']):
-                follow_up_type = 'novo_contato'
-            else:
-                follow_up_type = 'follow_up_generico'
+            # 1. SEGMENTAÇÃO POR TIPO DE FOLLOW-UP (ordem de prioridade em SEGMENT_TYPE_ORDER)
+            follow_up_type = ACTIVITY_CLASSIFIER.first_match(
+                SEGMENT_TYPE_ORDER, combined_text, default='follow_up_generico'
+            )
             
             # 2. SEGMENTAÇÃO POR CATEGORIA DE PRIORIDADE
             follow_up_category = None
@@ -1212,6 +716,21 @@ class KommoActivityETL:
             logger.error(f"Erro ao calcular métricas de resposta: {e}")
             return {}
 
+    def add_note_mention_flags(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calcular as flags de menção (mentions_call, mentions_meeting, ...) uma vez por
+        atividade, no ETL, para o dashboard agregar colunas em vez de varrer note_text com LIKE
+        """
+        if 'note_text' in df.columns:
+            texts = df['note_text'].fillna('').astype(str).str.slice(0, self.NOTE_TEXT_MAX_LENGTH)
+            mentions = [note_mentions(text) for text in texts]
+        else:
+            mentions = [frozenset()] * len(df)
+
+        for flag in NOTE_MENTION_KEYWORDS:
+            df[flag] = [flag in found for found in mentions]
+        return df
+
     def transform_activity_data(self, raw_data: Dict) -> pd.DataFrame:
         """
         TRANSFORM - Processar dados de atividades
@@ -1278,7 +797,7 @@ class KommoActivityETL:
                     activity_records.append({
                         'activity_id': f"task_{task.get('id')}",
                         'activity_type': 'task',
-                        'contact_type': self.classify_contact_type(task, 'task'),
+                        'contact_type': contact_type,
                         'user_id': task.get('responsible_user_id'),
                         'user_name': self.users_cache.get(task.get('responsible_user_id'), {}).get('name', 'Unknown'),
                         'entity_id': task.get('entity_id'),
@@ -1394,7 +913,7 @@ class KommoActivityETL:
                         'updated_at': datetime.now()
                     })
             
-            df = pd.DataFrame(activity_records)
+            df = self.add_note_mention_flags(pd.DataFrame(activity_records))
             logger.info(f"Processadas {len(df)} atividades")
             
             # Log da classificação das tarefas
@@ -1414,7 +933,7 @@ class KommoActivityETL:
         LOAD - Carregar dados de atividades no banco
         """
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = mysql.connector.connect(**self.db_config, **connection_options())
             cursor = connection.cursor()
             
             # Criar tabela de atividades
@@ -1439,6 +958,10 @@ class KommoActivityETL:
                 is_completed BOOLEAN DEFAULT FALSE,
                 is_completed_on_time BOOLEAN DEFAULT FALSE,
                 note_text TEXT,
+                mentions_call BOOLEAN DEFAULT FALSE,
+                mentions_meeting BOOLEAN DEFAULT FALSE,
+                mentions_email BOOLEAN DEFAULT FALSE,
+                mentions_response BOOLEAN DEFAULT FALSE,
                 task_result TEXT,
                 contacts_sent INT DEFAULT 0,
                 responses_received INT DEFAULT 0,
@@ -1469,6 +992,18 @@ class KommoActivityETL:
             """
             cursor.execute(create_table_query)
             
+            # Tabelas criadas antes das flags de menção: adicionar as colunas e
+            # recalcular uma única vez as linhas já gravadas, com as mesmas palavras-chave
+            created_flags = ensure_columns(cursor, 'commercial_activities', {
+                flag: 'BOOLEAN DEFAULT FALSE' for flag in NOTE_MENTION_KEYWORDS
+            })
+            for flag in created_flags:
+                cursor.execute(f"UPDATE commercial_activities SET {flag} = ({like_condition(NOTE_MENTION_KEYWORDS[flag])})")
+                logger.info(f"Flag {flag} recalculada para {cursor.rowcount} atividades existentes")
+            if created_flags:
+                connection.commit()
+            ensure_indexes(cursor, ['commercial_activities'])
+            
             # Limpar dados existentes para o período
             start_date = df['created_date'].min()
             end_date = df['created_date'].max()
@@ -1487,11 +1022,12 @@ class KommoActivityETL:
                 activity_id, activity_type, contact_type, user_id, user_name,
                 entity_id, entity_type, created_date, created_datetime,
                 duration_seconds, is_successful, is_completed, is_completed_on_time,
-                note_text, complete_till, completed_at, contacts_sent,
+                note_text, mentions_call, mentions_meeting, mentions_email, mentions_response,
+                complete_till, completed_at, contacts_sent,
                 responses_received, response_rate, avg_response_time_hours,
                 is_follow_up, follow_up_type, follow_up_category, temporal_context, intensity, urgency_score,
                 source, updated_at
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ON DUPLICATE KEY UPDATE
                 is_successful = VALUES(is_successful),
                 is_completed = VALUES(is_completed),
@@ -1501,43 +1037,44 @@ class KommoActivityETL:
                 updated_at = VALUES(updated_at)
             """
             
-            data_to_insert = []
-            for _, row in df.iterrows():
-                data_to_insert.append((
-                    row['activity_id'],
-                    row['activity_type'],
-                    row['contact_type'],
-                    int(row['user_id']) if pd.notna(row['user_id']) else None,
-                    row.get('user_name', ''),
-                    int(row['entity_id']) if pd.notna(row['entity_id']) else None,
-                    row.get('entity_type', ''),
-                    row['created_date'],
-                    row['created_datetime'],
-                    int(row['duration_seconds']) if pd.notna(row['duration_seconds']) else None,
-                    bool(row.get('is_successful', False)),
-                    bool(row.get('is_completed', False)),
-                    bool(row.get('is_completed_on_time', False)),
-                    str(row.get('note_text', ''))[:1000] if pd.notna(row.get('note_text')) else '',  # Limitar tamanho do texto
-                    row.get('complete_till') if pd.notna(row.get('complete_till')) else None,
-                    row.get('completed_at') if pd.notna(row.get('completed_at')) else None,
-                    int(row['contacts_sent']) if pd.notna(row.get('contacts_sent')) else None,
-                    int(row['responses_received']) if pd.notna(row.get('responses_received')) else None,
-                    float(row['response_rate']) if pd.notna(row.get('response_rate')) else None,
-                    float(row['avg_response_time_hours']) if pd.notna(row.get('avg_response_time_hours')) else None,
-                    bool(row.get('is_follow_up', False)),
-                    row.get('follow_up_type'),
-                    row.get('follow_up_category'),
-                    row.get('temporal_context'),
-                    row.get('intensity'),
-                    int(row.get('urgency_score', 5)) if pd.notna(row.get('urgency_score')) else 5,
-                    row.get('source', ''),
-                    row['updated_at']
-                ))
-            
-            cursor.executemany(insert_query, data_to_insert)
-            connection.commit()
+            # Converter colunas de forma vetorizada e carregar em blocos (commit por bloco)
+            columns = [
+                ('activity_id', 'raw', None),
+                ('activity_type', 'raw', None),
+                ('contact_type', 'raw', None),
+                ('user_id', 'int', None),
+                ('user_name', 'raw', None),
+                ('entity_id', 'int', None),
+                ('entity_type', 'raw', None),
+                ('created_date', 'raw', None),
+                ('created_datetime', 'raw', None),
+                ('duration_seconds', 'int', None),
+                ('is_successful', 'bool', False),
+                ('is_completed', 'bool', False),
+                ('is_completed_on_time', 'bool', False),
+                ('note_text', 'str', '', self.NOTE_TEXT_MAX_LENGTH),  # Limitar tamanho do texto
+                ('mentions_call', 'bool', False),
+                ('mentions_meeting', 'bool', False),
+                ('mentions_email', 'bool', False),
+                ('mentions_response', 'bool', False),
+                ('complete_till', 'raw', None),
+                ('completed_at', 'raw', None),
+                ('contacts_sent', 'int', None),
+                ('responses_received', 'int', None),
+                ('response_rate', 'float', None),
+                ('avg_response_time_hours', 'float', None),
+                ('is_follow_up', 'bool', False),
+                ('follow_up_type', 'raw', None),
+                ('follow_up_category', 'raw', None),
+                ('temporal_context', 'raw', None),
+                ('intensity', 'raw', None),
+                ('urgency_score', 'int', 5),
+                ('source', 'raw', None),
+                ('updated_at', 'raw', None)
+            ]
+            total = bulk_load(connection, insert_query, df, columns)
             
-            logger.info(f"Carregadas {len(data_to_insert)} atividades")
+            logger.info(f"Carregadas {total} atividades")
             
         except Exception as e:
             logger.error(f"Erro ao carregar atividades: {e}")
@@ -2077,12 +1614,16 @@ class KommoActivityETL:
             # 2. Extrair atividades
             logger.info("2. Extraindo atividades...")
             raw_data = self.extract_activities(start_date, end_date)
+            self.client.log_stats()
+            # Paginação que falhou (mesmo capturada na extração) aborta antes do load: o checkpoint fica para a retomada
+            self.client.ensure_complete_extraction()
             
             total_activities = (len(raw_data['calls']) + len(raw_data['tasks']) + 
                               len(raw_data['notes']) + len(raw_data['events']))
             
             if total_activities == 0:
                 logger.info("Nenhuma atividade encontrada para o período")
+                self.client.clear_checkpoint()
                 return
             
             # 3. Transformar dados
@@ -2091,6 +1632,7 @@ class KommoActivityETL:
             
             if df_activities.empty:
                 logger.info("Nenhum dado de atividade para processar")
+                self.client.clear_checkpoint()
                 return
             
             # 4. Carregar dados
@@ -2106,6 +1648,7 @@ class KommoActivityETL:
                 logger.info("6. Gerando relatórios de análise...")
                 self.generate_activity_reports(start_date, end_date)
             
+            self.client.clear_checkpoint()
             logger.info("=== ETL ATIVIDADES CONCLUÍDO ===")
             
         except Exception as e:
@@ -1,6 +1,5 @@
 
 import os
-import requests
 import pandas as pd
 import mysql.connector
 from datetime import datetime, timedelta
@@ -12,6 +11,12 @@ from dotenv import load_dotenv
 from collections import defaultdict
 import numpy as np
 
+from extraction_checkpoint import ExtractionCheckpoint
+from kommo_client import KommoClient
+from reference_cache import ReferenceCache
+from bulk_loader import bulk_load, connection_options
+from query_layer import ensure_indexes
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -34,10 +39,13 @@ class KommoConversionETL:
             'database': os.getenv('DB_NAME')
         }
         
-        self.headers = {
-            'Authorization': f'Bearer {self.kommo_config["access_token"]}',
-            'Content-Type': 'application/json'
-        }
+        # Cliente HTTP com pool de conexões (keep-alive, gzip e estatísticas por endpoint)
+        # Checkpoint por página quando KOMMO_RUN_ID está definido (retomada de execuções interrompidas)
+        self.client = KommoClient(self.kommo_config['base_url'], self.kommo_config['access_token'],
+                                  checkpoint=ExtractionCheckpoint.from_env('modulo4_conversao'))
+        
+        # Dados de referência (usuários, pipelines, motivos de perda) com cache em disco compartilhado
+        self.reference_cache = ReferenceCache(self.client)
         
         # Cache para pipelines, status e usuários
         self.pipelines_cache = {}
@@ -51,15 +59,10 @@ class KommoConversionETL:
         try:
             logger.info("Extraindo pipelines e status...")
             
-            pipelines_url = f"{self.kommo_config['base_url']}/api/v4/leads/pipelines"
-            pipelines_response = requests.get(pipelines_url, headers=self.headers)
-            pipelines_response.raise_for_status()
-            pipelines_data = pipelines_response.json()
-            
             won_statuses = []
             proposal_statuses = []
             
-            pipelines = pipelines_data.get('_embedded', {}).get('pipelines', [])
+            pipelines = self.reference_cache.pipelines()
             logger.info(f"Encontrados {len(pipelines)} pipelines")
             
             for pipeline in pipelines:
@@ -135,12 +138,7 @@ class KommoConversionETL:
         Extrair dados dos usuários/vendedores
         """
         try:
-            users_url = f"{self.kommo_config['base_url']}/api/v4/users"
-            users_response = requests.get(users_url, headers=self.headers)
-            users_response.raise_for_status()
-            users_data = users_response.json()
-            
-            users = users_data.get('_embedded', {}).get('users', [])
+            users = self.reference_cache.users()
             
             for user in users:
                 user_id = user.get('id')
@@ -168,66 +166,23 @@ class KommoConversionETL:
             logger.info(f"Extraindo negócios fechados de {start_date} até {end_date}")
             
             # Extrair leads fechados (ganhos e perdidos)
-            leads_url = f"{self.kommo_config['base_url']}/api/v4/leads"
-            
             # Buscar leads atualizados no período (para capturar fechamentos)
             leads_params = {
                 'filter[updated_at][from]': start_timestamp,
                 'filter[updated_at][to]': end_timestamp,
-                'limit': 250,
                 'with': 'contacts,custom_fields,loss_reason'
             }
             
-            all_leads = []
-            page = 1
-            
-            while True:
-                leads_params['page'] = page
-                leads_response = requests.get(leads_url, headers=self.headers, params=leads_params)
-                leads_response.raise_for_status()
-                leads_data = leads_response.json()
-                
-                leads = leads_data.get('_embedded', {}).get('leads', [])
-                if not leads:
-                    break
-                
-                all_leads.extend(leads)
-                
-                if len(leads) < 250:
-                    break
-                
-                page += 1
-                time.sleep(0.1)
+            all_leads = self.client.fetch_all('/api/v4/leads', leads_params, raise_on_error=True)
             
             # Extrair histórico de mudanças de status para calcular ciclo de vendas
-            events_url = f"{self.kommo_config['base_url']}/api/v4/events"
             events_params = {
                 'filter[created_at][from]': start_timestamp - (30 * 24 * 3600),  # 30 dias antes para capturar ciclo completo
                 'filter[created_at][to]': end_timestamp,
-                'filter[type]': 'lead_status_changed',
-                'limit': 250
+                'filter[type]': 'lead_status_changed'
             }
             
-            all_status_changes = []
-            page = 1
-            
-            while True:
-                events_params['page'] = page
-                events_response = requests.get(events_url, headers=self.headers, params=events_params)
-                events_response.raise_for_status()
-                events_data = events_response.json()
-                
-                events = events_data.get('_embedded', {}).get('events', [])
-                if not events:
-                    break
-                
-                all_status_changes.extend(events)
-                
-                if len(events) < 250:
-                    break
-                
-                page += 1
-                time.sleep(0.1)
+            all_status_changes = self.client.fetch_all('/api/v4/events', events_params, raise_on_error=True)
             
             logger.info(f"Extraídos {len(all_leads)} leads e {len(all_status_changes)} mudanças de status")
             
@@ -240,23 +195,60 @@ class KommoConversionETL:
             logger.error(f"Erro na extração de conversões: {e}")
             raise
 
-    def calculate_sales_cycle(self, lead: Dict, status_changes: List[Dict]) -> Optional[int]:
+    def parse_new_status_id(self, change: Dict) -> Optional[int]:
+        """
+        Extrair o status de destino (value_after.lead_status.id) de um evento
+        """
+        # Verificar se value_after é uma lista ou dicionário
+        value_after = change.get('value_after', {})
+        
+        # Se é lista, pegar o primeiro item
+        if isinstance(value_after, list) and value_after:
+            value_after = value_after[0]
+        
+        # Se é dicionário, usar diretamente
+        if isinstance(value_after, dict):
+            lead_status = value_after.get('lead_status', {})
+            if isinstance(lead_status, dict):
+                return lead_status.get('id')
+        
+        return None
+
+    def index_status_changes(self, status_changes: List[Dict]) -> Dict[int, List[Dict]]:
+        """
+        PRÉ-TRANSFORM: agrupar as mudanças de status por lead (entity_id) uma única vez,
+        ordenadas por created_at e com o status de destino já extraído
+        """
+        changes_by_lead = defaultdict(list)
+        
+        for change in status_changes:
+            changes_by_lead[change.get('entity_id')].append({
+                'created_at': change.get('created_at', 0),
+                'entity_type': change.get('entity_type'),
+                'new_status_id': self.parse_new_status_id(change)
+            })
+        
+        for lead_changes in changes_by_lead.values():
+            lead_changes.sort(key=lambda x: x['created_at'])
+        
+        logger.info(f"Indexadas {len(status_changes)} mudanças de status de {len(changes_by_lead)} leads")
+        return changes_by_lead
+
+    def calculate_sales_cycle(self, lead: Dict, lead_changes: List[Dict]) -> Optional[int]:
         """
         Calcular ciclo de vendas em dias (do primeiro contato ao fechamento)
+        
+        lead_changes: mudanças de status do lead, já ordenadas (index_status_changes)
         """
         try:
-            lead_id = lead.get('id')
             current_status = lead.get('status_id')
             
             # Verificar se o lead está em status de fechamento (ganho ou perdido)
             if self.status_cache.get(current_status, {}).get('type') not in ['won', 'lost']:
                 return None
             
-            # Buscar mudanças relacionadas a este lead
-            lead_changes = [
-                change for change in status_changes
-                if change.get('entity_id') == lead_id and change.get('entity_type') == 'lead'
-            ]
+            # Apenas eventos do tipo lead
+            lead_changes = [change for change in lead_changes if change['entity_type'] == 'lead']
             
             if not lead_changes:
                 # Se não há histórico, usar data de criação até data de atualização
@@ -265,9 +257,6 @@ class KommoConversionETL:
                 cycle_days = (updated_date - created_date).days
                 return max(cycle_days, 0)
             
-            # Ordenar mudanças por data
-            lead_changes.sort(key=lambda x: x.get('created_at', 0))
-            
             # Data do primeiro contato (criação do lead ou primeira mudança)
             first_contact = datetime.fromtimestamp(lead.get('created_at', 0))
             
@@ -275,21 +264,9 @@ class KommoConversionETL:
             closing_date = None
             
             for change in reversed(lead_changes):
-                # Verificar se value_after é uma lista ou dicionário
-                value_after = change.get('value_after', {})
-                
-                # Se é lista, pegar o primeiro item
-                if isinstance(value_after, list) and value_after:
-                    value_after = value_after[0]
-                
-                # Se é dicionário, usar diretamente
-                if isinstance(value_after, dict):
-                    lead_status = value_after.get('lead_status', {})
-                    if isinstance(lead_status, dict):
-                        new_status_id = lead_status.get('id')
-                        if self.status_cache.get(new_status_id, {}).get('type') in ['won', 'lost']:
-                            closing_date = datetime.fromtimestamp(change.get('created_at', 0))
-                            break
+                if self.status_cache.get(change['new_status_id'], {}).get('type') in ['won', 'lost']:
+                    closing_date = datetime.fromtimestamp(change['created_at'])
+                    break
             
             if not closing_date:
                 closing_date = datetime.fromtimestamp(lead.get('updated_at', 0))
@@ -301,36 +278,16 @@ class KommoConversionETL:
             logger.warning(f"Erro ao calcular ciclo de vendas para lead {lead.get('id')}: {e}")
             return None
 
-    def identify_proposal_stage(self, lead: Dict, status_changes: List[Dict]) -> Optional[datetime]:
+    def identify_proposal_stage(self, lead: Dict, lead_changes: List[Dict]) -> Optional[datetime]:
         """
         Identificar quando o lead chegou ao estágio de proposta
+        
+        lead_changes: mudanças de status do lead, já ordenadas (index_status_changes)
         """
         try:
-            lead_id = lead.get('id')
-            
-            # Buscar mudanças para status de proposta
-            lead_changes = [
-                change for change in status_changes
-                if change.get('entity_id') == lead_id
-            ]
-            
-            lead_changes.sort(key=lambda x: x.get('created_at', 0))
-            
             for change in lead_changes:
-                # Verificar se value_after é uma lista ou dicionário
-                value_after = change.get('value_after', {})
-                
-                # Se é lista, pegar o primeiro item
-                if isinstance(value_after, list) and value_after:
-                    value_after = value_after[0]
-                
-                # Se é dicionário, usar diretamente
-                if isinstance(value_after, dict):
-                    lead_status = value_after.get('lead_status', {})
-                    if isinstance(lead_status, dict):
-                        new_status_id = lead_status.get('id')
-                        if self.status_cache.get(new_status_id, {}).get('type') == 'proposal':
-                            return datetime.fromtimestamp(change.get('created_at', 0))
+                if self.status_cache.get(change['new_status_id'], {}).get('type') == 'proposal':
+                    return datetime.fromtimestamp(change['created_at'])
             
             # Se status atual é proposta, mas não encontrou histórico
             current_status = lead.get('status_id')
@@ -378,7 +335,8 @@ class KommoConversionETL:
         """
         try:
             leads = raw_data['leads']
-            status_changes = raw_data['status_changes']
+            # Agrupar mudanças de status por lead uma única vez (evita varrer a lista por lead)
+            changes_by_lead = self.index_status_changes(raw_data['status_changes'])
             won_statuses = pipeline_data['won_statuses']
             proposal_statuses = pipeline_data['proposal_statuses']
             
@@ -396,11 +354,13 @@ class KommoConversionETL:
                     created_date = datetime.fromtimestamp(lead.get('created_at', 0))
                     updated_date = datetime.fromtimestamp(lead.get('updated_at', 0))
                     
+                    lead_changes = changes_by_lead.get(lead_id, [])
+                    
                     # Calcular ciclo de vendas
-                    sales_cycle_days = self.calculate_sales_cycle(lead, status_changes)
+                    sales_cycle_days = self.calculate_sales_cycle(lead, lead_changes)
                     
                     # Identificar se passou por proposta
-                    proposal_date = self.identify_proposal_stage(lead, status_changes)
+                    proposal_date = self.identify_proposal_stage(lead, lead_changes)
                     
                     # Determinar se é uma conversão válida para análise
                     is_won = status_type == 'won'
@@ -480,7 +440,7 @@ class KommoConversionETL:
         LOAD - Carregar dados de conversão no banco
         """
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = mysql.connector.connect(**self.db_config, **connection_options())
             cursor = connection.cursor()
             
             # Criar tabela de conversões
@@ -527,6 +487,7 @@ class KommoConversionETL:
             )
             """
             cursor.execute(create_table_query)
+            ensure_indexes(cursor, ['sales_conversions'])
             
             # Inserir dados
             insert_query = """
@@ -553,39 +514,36 @@ class KommoConversionETL:
                 updated_at = VALUES(updated_at)
             """
             
-            data_to_insert = []
-            for _, row in df.iterrows():
-                data_to_insert.append((
-                    int(row['lead_id']),
-                    int(row['pipeline_id']) if pd.notna(row['pipeline_id']) else None,
-                    int(row['status_id']) if pd.notna(row['status_id']) else None,
-                    row['status_name'],
-                    row['status_type'],
-                    int(row['responsible_user_id']) if pd.notna(row['responsible_user_id']) else None,
-                    row['responsible_user_name'],
-                    row['created_date'],
-                    row['created_datetime'],
-                    row['updated_date'],
-                    row['updated_datetime'],
-                    row['proposal_date'] if pd.notna(row['proposal_date']) else None,
-                    row['proposal_datetime'] if pd.notna(row['proposal_datetime']) else None,
-                    float(row['lead_value']) if pd.notna(row['lead_value']) else 0,
-                    float(row['revenue_generated']) if pd.notna(row['revenue_generated']) else 0,
-                    bool(row['is_won']),
-                    bool(row['is_lost']),
-                    bool(row['is_proposal']),
-                    int(row['sales_cycle_days']) if pd.notna(row['sales_cycle_days']) else None,
-                    row['loss_reason'] if pd.notna(row['loss_reason']) else None,
-                    bool(row['had_proposal']),
-                    bool(row['won_from_proposal']),
-                    int(row['contact_count']) if pd.notna(row['contact_count']) else 0,
-                    row['updated_at']
-                ))
-            
-            cursor.executemany(insert_query, data_to_insert)
-            connection.commit()
+            # Converter colunas de forma vetorizada e carregar em blocos (commit por bloco)
+            columns = [
+                ('lead_id', 'int', None),
+                ('pipeline_id', 'int', None),
+                ('status_id', 'int', None),
+                ('status_name', 'raw', None),
+                ('status_type', 'raw', None),
+                ('responsible_user_id', 'int', None),
+                ('responsible_user_name', 'raw', None),
+                ('created_date', 'raw', None),
+                ('created_datetime', 'raw', None),
+                ('updated_date', 'raw', None),
+                ('updated_datetime', 'raw', None),
+                ('proposal_date', 'raw', None),
+                ('proposal_datetime', 'raw', None),
+                ('lead_value', 'float', 0),
+                ('revenue_generated', 'float', 0),
+                ('is_won', 'bool', False),
+                ('is_lost', 'bool', False),
+                ('is_proposal', 'bool', False),
+                ('sales_cycle_days', 'int', None),
+                ('loss_reason', 'raw', None),
+                ('had_proposal', 'bool', False),
+                ('won_from_proposal', 'bool', False),
+                ('contact_count', 'int', 0),
+                ('updated_at', 'raw', None)
+            ]
+            total = bulk_load(connection, insert_query, df, columns)
             
-            logger.info(f"Carregados {len(data_to_insert)} registros de conversão")
+            logger.info(f"Carregados {total} registros de conversão")
             
         except Exception as e:
             logger.error(f"Erro ao carregar dados de conversão: {e}")
@@ -599,6 +557,15 @@ class KommoConversionETL:
         """
         Gerar métricas consolidadas de conversão e receita
         """
+        self.generate_conversion_metrics_range(date, date)
+
+    def generate_conversion_metrics_range(self, start_date: datetime, end_date: datetime):
+        """
+        Gerar métricas de conversão de todos os dias do intervalo de uma vez:
+        uma conexão, uma query agrupada por (dia, usuário, pipeline) e um
+        executemany, seguidos do resumo do time para o mesmo intervalo
+        """
+        connection = None
         try:
             connection = mysql.connector.connect(**self.db_config)
             cursor = connection.cursor()
@@ -635,11 +602,13 @@ class KommoConversionETL:
             """
             cursor.execute(create_metrics_table)
             
-            date_str = date.strftime('%Y-%m-%d')
+            start_str = start_date.strftime('%Y-%m-%d')
+            end_str = end_date.strftime('%Y-%m-%d')
             
-            # Calcular métricas por usuário e pipeline
+            # Calcular métricas por dia, usuário e pipeline
             cursor.execute("""
                 SELECT 
+                    updated_date,
                     responsible_user_id,
                     responsible_user_name,
                     pipeline_id,
@@ -653,10 +622,10 @@ class KommoConversionETL:
                     AVG(CASE WHEN sales_cycle_days IS NOT NULL THEN sales_cycle_days ELSE NULL END) as avg_cycle,
                     SUM(CASE WHEN won_from_proposal = 1 THEN 1 ELSE 0 END) as won_from_proposals
                 FROM sales_conversions 
-                WHERE updated_date = %s
+                WHERE updated_date BETWEEN %s AND %s
                 AND responsible_user_id IS NOT NULL
-                GROUP BY responsible_user_id, responsible_user_name, pipeline_id
-            """, (date_str,))
+                GROUP BY updated_date, responsible_user_id, responsible_user_name, pipeline_id
+            """, (start_str, end_str))
             
             results = cursor.fetchall()
             
@@ -681,16 +650,17 @@ class KommoConversionETL:
                 avg_sales_cycle_days = VALUES(avg_sales_cycle_days)
             """
             
+            rows = []
             for result in results:
-                (user_id, user_name, pipeline_id, total_deals, deals_won, deals_lost, 
+                (metric_date, user_id, user_name, pipeline_id, total_deals, deals_won, deals_lost, 
                  proposals_sent, revenue, avg_deal_value, avg_won_value, avg_cycle, won_from_proposals) = result
                 
                 # Calcular taxas
                 win_rate = (deals_won / total_deals * 100) if total_deals > 0 else 0
                 proposal_win_rate = (won_from_proposals / proposals_sent * 100) if proposals_sent > 0 else 0
                 
-                cursor.execute(insert_metrics_query, (
-                    date_str,
+                rows.append((
+                    metric_date.strftime('%Y-%m-%d'),
                     user_id,
                     user_name,
                     pipeline_id,
@@ -706,24 +676,26 @@ class KommoConversionETL:
                     round(avg_cycle or 0, 2)
                 ))
             
+            if rows:
+                cursor.executemany(insert_metrics_query, rows)
             connection.commit()
             
-            logger.info(f"Métricas de conversão geradas para {date_str}")
+            logger.info(f"Métricas de conversão geradas de {start_str} até {end_str}: {len(rows)} linhas")
             
             # Gerar também métricas consolidadas do time
-            self.generate_team_conversion_summary(date_str, cursor, connection)
+            self.generate_team_conversion_summary(start_str, end_str, cursor, connection)
             
         except Exception as e:
             logger.error(f"Erro ao gerar métricas de conversão: {e}")
             raise
         finally:
-            if connection.is_connected():
+            if connection is not None and connection.is_connected():
                 cursor.close()
                 connection.close()
 
-    def generate_team_conversion_summary(self, date_str: str, cursor, connection):
+    def generate_team_conversion_summary(self, start_str: str, end_str: str, cursor, connection):
         """
-        Gerar resumo consolidado de conversão do time
+        Gerar resumo consolidado de conversão do time (um registro por dia do intervalo)
         """
         try:
             # Criar tabela de resumo do time
@@ -749,9 +721,10 @@ class KommoConversionETL:
             """
             cursor.execute(create_team_table)
             
-            # Calcular métricas consolidadas do time
+            # Calcular métricas consolidadas do time por dia
             cursor.execute("""
                 SELECT 
+                    metric_date,
                     SUM(total_deals) as team_deals,
                     SUM(deals_won) as team_won,
                     SUM(deals_lost) as team_lost,
@@ -761,57 +734,63 @@ class KommoConversionETL:
                     AVG(avg_sales_cycle_days) as team_avg_cycle,
                     COUNT(*) as active_closers
                 FROM conversion_metrics 
-                WHERE metric_date = %s
-            """, (date_str,))
+                WHERE metric_date BETWEEN %s AND %s
+                GROUP BY metric_date
+            """, (start_str, end_str))
+            
+            team_results = cursor.fetchall()
             
-            team_result = cursor.fetchone()
+            # Top performer por receita em cada dia
+            cursor.execute("""
+                SELECT metric_date, responsible_user_id, SUM(revenue_generated) as total_revenue
+                FROM conversion_metrics 
+                WHERE metric_date BETWEEN %s AND %s 
+                GROUP BY metric_date, responsible_user_id
+                ORDER BY metric_date, total_revenue DESC
+            """, (start_str, end_str))
+            
+            top_performers = {}
+            for metric_date, user_id, total_revenue in cursor.fetchall():
+                top_performers.setdefault(metric_date, (user_id, total_revenue))
+            
+            # Inserir resumo do time
+            insert_team_query = """
+            INSERT INTO team_conversion_summary (
+                metric_date, total_deals, total_won, total_lost, total_proposals,
+                total_revenue, avg_deal_value, team_win_rate, team_proposal_win_rate,
+                avg_sales_cycle, top_performer_user_id, top_performer_revenue, active_closers_count
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                total_deals = VALUES(total_deals),
+                total_won = VALUES(total_won),
+                total_lost = VALUES(total_lost),
+                total_proposals = VALUES(total_proposals),
+                total_revenue = VALUES(total_revenue),
+                avg_deal_value = VALUES(avg_deal_value),
+                team_win_rate = VALUES(team_win_rate),
+                team_proposal_win_rate = VALUES(team_proposal_win_rate),
+                avg_sales_cycle = VALUES(avg_sales_cycle),
+                top_performer_user_id = VALUES(top_performer_user_id),
+                top_performer_revenue = VALUES(top_performer_revenue),
+                active_closers_count = VALUES(active_closers_count)
+            """
             
-            if team_result and team_result[0]:
-                (team_deals, team_won, team_lost, team_proposals, team_revenue, 
+            rows = []
+            for team_result in team_results:
+                (metric_date, team_deals, team_won, team_lost, team_proposals, team_revenue, 
                  team_avg_deal, team_avg_cycle, active_closers) = team_result
                 
+                if not team_deals:
+                    continue
+                
                 # Calcular taxas do time
                 team_win_rate = (team_won / team_deals * 100) if team_deals > 0 else 0
                 team_proposal_win_rate = (team_won / team_proposals * 100) if team_proposals > 0 else 0
                 
-                # Encontrar top performer por receita
-                cursor.execute("""
-                    SELECT responsible_user_id, SUM(revenue_generated) as total_revenue
-                    FROM conversion_metrics 
-                    WHERE metric_date = %s 
-                    GROUP BY responsible_user_id
-                    ORDER BY total_revenue DESC 
-                    LIMIT 1
-                """, (date_str,))
-                
-                top_performer = cursor.fetchone()
-                top_performer_id = top_performer[0] if top_performer else None
-                top_performer_revenue = top_performer[1] if top_performer else 0
+                top_performer_id, top_performer_revenue = top_performers.get(metric_date, (None, 0))
                 
-                # Inserir resumo do time
-                insert_team_query = """
-                INSERT INTO team_conversion_summary (
-                    metric_date, total_deals, total_won, total_lost, total_proposals,
-                    total_revenue, avg_deal_value, team_win_rate, team_proposal_win_rate,
-                    avg_sales_cycle, top_performer_user_id, top_performer_revenue, active_closers_count
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE
-                    total_deals = VALUES(total_deals),
-                    total_won = VALUES(total_won),
-                    total_lost = VALUES(total_lost),
-                    total_proposals = VALUES(total_proposals),
-                    total_revenue = VALUES(total_revenue),
-                    avg_deal_value = VALUES(avg_deal_value),
-                    team_win_rate = VALUES(team_win_rate),
-                    team_proposal_win_rate = VALUES(team_proposal_win_rate),
-                    avg_sales_cycle = VALUES(avg_sales_cycle),
-                    top_performer_user_id = VALUES(top_performer_user_id),
-                    top_performer_revenue = VALUES(top_performer_revenue),
-                    active_closers_count = VALUES(active_closers_count)
-                """
-                
-                cursor.execute(insert_team_query, (
-                    date_str,
+                rows.append((
+                    metric_date.strftime('%Y-%m-%d'),
                     int(team_deals or 0),
                     int(team_won or 0),
                     int(team_lost or 0),
@@ -825,14 +804,19 @@ class KommoConversionETL:
                     round(top_performer_revenue or 0, 2),
                     int(active_closers or 0)
                 ))
-                
+            
+            if rows:
+                cursor.executemany(insert_team_query, rows)
                 connection.commit()
                 
+                team_deals = sum(row[1] for row in rows)
+                team_won = sum(row[2] for row in rows)
+                team_revenue = sum(row[5] for row in rows)
                 logger.info("=== RESUMO CONVERSÃO DO TIME ===")
-                logger.info(f"Negócios: {team_deals} total, {team_won} ganhos ({team_win_rate:.1f}%)")
+                logger.info(f"Dias: {len(rows)} ({start_str} até {end_str})")
+                logger.info(f"Negócios: {team_deals} total, {team_won} ganhos "
+                            f"({(team_won / team_deals * 100) if team_deals else 0:.1f}%)")
                 logger.info(f"Receita: R$ {team_revenue:,.2f}")
-                logger.info(f"Ticket médio: R$ {team_avg_deal:,.2f}")
-                logger.info(f"Ciclo médio: {team_avg_cycle:.1f} dias")
                 
         except Exception as e:
             logger.error(f"Erro ao gerar resumo do time: {e}")
@@ -943,9 +927,13 @@ class KommoConversionETL:
             # 3. Extrair negócios fechados
             logger.info("3. Extraindo negócios fechados...")
             raw_data = self.extract_closed_deals(start_date, end_date)
+            self.client.log_stats()
+            # Paginação que falhou (mesmo capturada na extração) aborta antes do load: o checkpoint fica para a retomada
+            self.client.ensure_complete_extraction()
             
             if not raw_data['leads']:
                 logger.info("Nenhum negócio encontrado para o período")
+                self.client.clear_checkpoint()
                 return
             
             # 4. Transformar dados
@@ -954,6 +942,7 @@ class KommoConversionETL:
             
             if df_conversions.empty:
                 logger.info("Nenhum dado de conversão para processar")
+                self.client.clear_checkpoint()
                 return
             
             # 5. Carregar dados
@@ -962,15 +951,13 @@ class KommoConversionETL:
             
             # 6. Gerar métricas para cada dia do período
             logger.info("6. Gerando métricas de conversão...")
-            current_date = start_date
-            while current_date <= end_date:
-                self.generate_conversion_metrics(current_date)
-                current_date += timedelta(days=1)
+            self.generate_conversion_metrics_range(start_date, end_date)
             
             # 7. Gerar análise de perdas
             logger.info("7. Gerando análise de perdas...")
             self.generate_loss_analysis(end_date)
             
+            self.client.clear_checkpoint()
             logger.info("=== ETL CONVERSÃO CONCLUÍDO ===")
             
         except Exception as e:
@@ -17,6 +17,8 @@ from dotenv import load_dotenv
 from collections import defaultdict
 import numpy as np
 
+from bulk_loader import bulk_load, swap_load
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -36,6 +38,9 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class KommoPerformanceETL:
+    # Dias em que os totais do período são distribuídos na carga
+    LOAD_DAYS = 30
+
     def __init__(self):
         self.kommo_config = {
             'base_url': os.getenv('KOMMO_API_URL', 'https://previdas.kommo.com'),
@@ -54,247 +59,249 @@ class KommoPerformanceETL:
             'Authorization': f'Bearer {self.kommo_config["access_token"]}',
             'Content-Type': 'application/json'
         }
+        
+        # Janela de leads/atividades analisada (a extração já vem agregada, então 365 dias cabem em memória)
+        self.lookback_days = int(os.getenv('PERFORMANCE_LOOKBACK_DAYS', 30))
+
+    # Agregados por lead (lm = leads_metrics, sm = sales_metrics), comuns a vendedores e canais.
+    # "<> 0" reproduz o teste de verdade do Python (NULL e zero não entram nas médias)
+    LEAD_AGGREGATES = """
+        COUNT(*) as total_leads,
+        SUM(CASE WHEN sm.status_name = 'Venda ganha' THEN 1 ELSE 0 END) as vendas_fechadas,
+        SUM(CASE WHEN sm.status_name = 'Venda perdida' THEN 1 ELSE 0 END) as vendas_perdidas,
+        COALESCE(SUM(CASE WHEN sm.status_name = 'Venda ganha' THEN sm.sale_price END), 0) as receita_total,
+        COALESCE(SUM(CASE WHEN sm.status_name = 'Venda ganha' AND sm.sales_cycle_days <> 0
+                          THEN sm.sales_cycle_days END), 0) as ciclo_vendas_soma,
+        COUNT(CASE WHEN sm.status_name = 'Venda ganha' AND sm.sales_cycle_days <> 0 THEN 1 END) as leads_com_ciclo,
+        COALESCE(SUM(CASE WHEN lm.response_time_hours <> 0 THEN lm.response_time_hours END), 0) as tempo_resposta_soma,
+        COUNT(CASE WHEN lm.response_time_hours <> 0 THEN 1 END) as leads_com_resposta,
+        COALESCE(SUM(lm.lead_cost), 0) as custo_total
+    """
+
+    VENDEDORES_QUERY = f"""
+    SELECT 
+        sm.responsible_user_name as user_name,
+        MAX(sm.responsible_user_role) as user_role,
+        {LEAD_AGGREGATES}
+    FROM leads_metrics lm
+    LEFT JOIN sales_metrics sm ON lm.lead_id = sm.lead_id
+    WHERE lm.created_date >= %s
+    GROUP BY sm.responsible_user_name
+    """
+
+    CANAIS_QUERY = f"""
+    SELECT 
+        lm.primary_source as canal_origem,
+        lm.utm_source,
+        lm.utm_medium,
+        {LEAD_AGGREGATES}
+    FROM leads_metrics lm
+    LEFT JOIN sales_metrics sm ON lm.lead_id = sm.lead_id
+    WHERE lm.created_date >= %s
+    GROUP BY lm.primary_source, lm.utm_source, lm.utm_medium
+    """
+
+    # Colunas aditivas por vendedor (somadas quando dois nomes têm o mesmo user_id)
+    VENDEDOR_SOMAS = [
+        'total_leads', 'vendas_fechadas', 'vendas_perdidas', 'receita_total', 'ciclo_vendas_soma',
+        'leads_com_ciclo', 'tempo_resposta_soma', 'leads_com_resposta', 'custo_total',
+        'total_atividades', 'atividades_concluidas', 'leads_contactados'
+    ]
+
+    # responsible_user_id real do Kommo por nome de vendedor (gravado pelo Módulo 4)
+    USUARIOS_QUERY = """
+    SELECT 
+        responsible_user_name as user_name,
+        MAX(responsible_user_id) as user_id
+    FROM sales_conversions
+    WHERE responsible_user_id IS NOT NULL
+    AND responsible_user_name IS NOT NULL
+    GROUP BY responsible_user_name
+    """
+
+    # Leads contactados = soma dos leads distintos por (usuário, tipo, dia), como antes
+    ATIVIDADES_QUERY = """
+    SELECT 
+        user_name,
+        MAX(user_id) as atividades_user_id,
+        SUM(total_atividades) as total_atividades,
+        SUM(atividades_concluidas) as atividades_concluidas,
+        SUM(leads_contactados) as leads_contactados
+    FROM (
+        SELECT 
+            user_id,
+            user_name,
+            COUNT(*) as total_atividades,
+            COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END) as atividades_concluidas,
+            COUNT(DISTINCT entity_id) as leads_contactados
+        FROM commercial_activities
+        WHERE created_date >= %s
+        GROUP BY user_id, user_name, user_role, activity_type, created_date
+    ) atividades_dia
+    GROUP BY user_name
+    """
 
     def extract_from_existing_tables(self, days=30):
-        """Extrair dados das tabelas já existentes para análise de performance"""
+        """
+        Extrair das tabelas existentes os dados de performance já agregados
+        (GROUP BY no banco: só uma linha por vendedor/canal trafega, qualquer que seja o período)
+        """
         try:
-            logger.info("📊 Extraindo dados das tabelas existentes para análise de performance...")
+            logger.info("📊 Extraindo dados agregados das tabelas existentes para análise de performance...")
             
             connection = mysql.connector.connect(**self.db_config)
             cursor = connection.cursor(dictionary=True)
             
             start_date = (datetime.now() - timedelta(days=days)).date()
             
-            # 1. Dados de leads por vendedor e canal
-            leads_query = """
-            SELECT 
-                lm.lead_id,
-                lm.primary_source as canal_origem,
-                lm.utm_source,
-                lm.utm_medium,
-                lm.utm_campaign,
-                lm.created_date,
-                lm.response_time_hours,
-                lm.lead_cost,
-                
-                sm.responsible_user_name,
-                sm.responsible_user_role,
-                sm.status_name,
-                sm.status_type,
-                sm.sale_price,
-                sm.sales_cycle_days,
-                sm.closed_at,
-                CASE WHEN sm.status_name = 'Venda ganha' THEN 1 ELSE 0 END as is_won,
-                CASE WHEN sm.status_name = 'Venda perdida' THEN 1 ELSE 0 END as is_lost
-                
-            FROM leads_metrics lm
-            LEFT JOIN sales_metrics sm ON lm.lead_id = sm.lead_id
-            WHERE lm.created_date >= %s
-            """
+            # 1. Leads por vendedor
+            cursor.execute(self.VENDEDORES_QUERY, (start_date,))
+            vendedores_data = pd.DataFrame(cursor.fetchall())
             
-            cursor.execute(leads_query, (start_date,))
-            leads_data = cursor.fetchall()
-            
-            # 2. Dados de atividades por vendedor
-            atividades_query = """
-            SELECT 
-                user_id,
-                user_name,
-                user_role,
-                activity_type,
-                COUNT(*) as total_atividades,
-                COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END) as atividades_concluidas,
-                COUNT(DISTINCT entity_id) as leads_contactados,
-                created_date
-            FROM commercial_activities
-            WHERE created_date >= %s
-            GROUP BY user_id, user_name, user_role, activity_type, created_date
-            """
+            # 2. Leads por canal
+            cursor.execute(self.CANAIS_QUERY, (start_date,))
+            canais_data = pd.DataFrame(cursor.fetchall())
             
-            cursor.execute(atividades_query, (start_date,))
-            atividades_data = cursor.fetchall()
-            
-            # 3. Dados do funil por canal
-            funil_query = """
-            SELECT 
-                fh.lead_id,
-                fh.status_name,
-                fh.entry_date,
-                fh.time_in_status_hours,
-                fh.loss_reason_name,
-                
-                lm.primary_source as canal_origem,
-                lm.utm_source,
-                lm.utm_medium
-                
-            FROM funnel_history fh
-            LEFT JOIN leads_metrics lm ON fh.lead_id = lm.lead_id
-            WHERE fh.entry_date >= %s
-            AND fh.pipeline_id = 11146887
-            """
+            # 3. Atividades por vendedor
+            cursor.execute(self.ATIVIDADES_QUERY, (start_date,))
+            atividades_data = pd.DataFrame(cursor.fetchall())
             
-            cursor.execute(funil_query, (start_date,))
-            funil_data = cursor.fetchall()
+            # 4. IDs dos vendedores
+            cursor.execute(self.USUARIOS_QUERY)
+            usuarios_data = pd.DataFrame(cursor.fetchall())
             
             cursor.close()
             connection.close()
             
-            logger.info(f"✅ Extraídos: {len(leads_data)} leads, {len(atividades_data)} atividades, {len(funil_data)} movimentações de funil")
+            logger.info(f"✅ Extraídos: {len(vendedores_data)} vendedores, {len(canais_data)} canais, "
+                        f"{len(atividades_data)} vendedores com atividades ({days} dias)")
             
             return {
-                'leads': leads_data,
+                'vendedores': vendedores_data,
+                'canais': canais_data,
                 'atividades': atividades_data,
-                'funil': funil_data
+                'usuarios': usuarios_data
             }
             
         except Exception as e:
             logger.error(f"❌ Erro na extração de dados: {e}")
-            return {'leads': [], 'atividades': [], 'funil': []}
+            return {'vendedores': pd.DataFrame(), 'canais': pd.DataFrame(),
+                    'atividades': pd.DataFrame(), 'usuarios': pd.DataFrame()}
+
+    @staticmethod
+    def _ratio(numerator: pd.Series, denominator: pd.Series, factor: float = 1.0) -> pd.Series:
+        """numerator / denominator * factor, ou 0 quando o denominador é zero"""
+        return pd.Series(
+            np.where(denominator > 0, numerator / denominator.where(denominator > 0, 1) * factor, 0),
+            index=numerator.index
+        )
+
+    @staticmethod
+    def _records(df: pd.DataFrame, columns: List[str]) -> List[Dict]:
+        """Linhas como dicts com tipos Python nativos (NaN de colunas de texto volta a ser None)"""
+        selected = df[columns].astype(object)
+        return selected.where(selected.notna(), None).to_dict('records')
+
+    def _lead_metrics(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Converter os agregados do banco (Decimal) e calcular médias e taxas comuns"""
+        df = df.copy()
+        for column in ['total_leads', 'vendas_fechadas', 'vendas_perdidas', 'leads_com_ciclo', 'leads_com_resposta']:
+            df[column] = pd.to_numeric(df[column]).astype('int64')
+        for column in ['receita_total', 'ciclo_vendas_soma', 'tempo_resposta_soma', 'custo_total']:
+            df[column] = pd.to_numeric(df[column]).astype('float64')
+
+        df['tempo_resposta_medio'] = self._ratio(df['tempo_resposta_soma'], df['leads_com_resposta'])
+        df['ciclo_vendas_medio'] = self._ratio(df['ciclo_vendas_soma'], df['leads_com_ciclo'])
+        df['win_rate'] = self._ratio(df['vendas_fechadas'], df['vendas_fechadas'] + df['vendas_perdidas'], 100)
+        df['ticket_medio'] = self._ratio(df['receita_total'], df['vendas_fechadas'])
+        df['conversion_rate'] = self._ratio(df['vendas_fechadas'], df['total_leads'], 100)
+        return df
+
+    def _merge_duplicate_user_ids(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Nomes diferentes resolvidos para o mesmo user_id (usuário renomeado) colidiriam
+        em unique_user_date e o upsert manteria só a última linha: somar os agregados
+        por user_id (nome/cargo da linha com mais leads) e recalcular médias e taxas
+        """
+        duplicated = df['user_id'].duplicated(keep=False)
+        if not duplicated.any():
+            return df
+        
+        for user_id, names in df[duplicated].groupby('user_id')['user_name']:
+            logger.warning(f"⚠️ user_id {user_id} com {len(names)} nomes ({', '.join(names.astype(str))}): "
+                           f"agregados somados em uma linha")
+        
+        aggregations = {column: 'sum' for column in self.VENDEDOR_SOMAS}
+        aggregations.update({'user_name': 'first', 'user_role': 'first'})
+        df = df.sort_values('total_leads', ascending=False, kind='stable')
+        return self._lead_metrics(df.groupby('user_id', as_index=False, sort=False).agg(aggregations))
 
     def transform_performance_data(self, raw_data):
-        """Transformar dados para análise de performance"""
+        """Transformar dados para análise de performance (vetorizado sobre os agregados)"""
         try:
             logger.info("🔄 Transformando dados de performance...")
             
-            leads_data = raw_data['leads']
+            vendedores_data = raw_data['vendedores']
+            canais_data = raw_data['canais']
             atividades_data = raw_data['atividades']
-            funil_data = raw_data['funil']
+            usuarios_data = raw_data['usuarios']
             
             # 1. PERFORMANCE POR VENDEDOR
-            vendedores_performance = {}
-            
-            for lead in leads_data:
-                user_name = lead.get('responsible_user_name', 'Usuário Desconhecido')
-                user_role = lead.get('responsible_user_role', 'Unknown')
-                
-                if user_name not in vendedores_performance:
-                    vendedores_performance[user_name] = {
-                        'user_id': hash(user_name) % 1000000,  # Gerar ID baseado no nome
-                        'user_name': user_name,
-                        'user_role': user_role,
-                        'total_leads': 0,
-                        'vendas_fechadas': 0,
-                        'vendas_perdidas': 0,
-                        'receita_total': 0.0,
-                        'tempo_resposta_medio': 0.0,
-                        'ciclo_vendas_medio': 0.0,
-                        'leads_com_resposta': 0,
-                        'leads_com_ciclo': 0,
-                        'total_atividades': 0,
-                        'atividades_concluidas': 0,
-                        'leads_contactados': 0
-                    }
-                
-                perf = vendedores_performance[user_name]
-                perf['total_leads'] += 1
-                
-                if lead.get('status_name') == 'Venda ganha':
-                    perf['vendas_fechadas'] += 1
-                    sale_price = lead.get('sale_price', 0)
-                    perf['receita_total'] += float(sale_price) if sale_price else 0.0
-                    if lead.get('sales_cycle_days'):
-                        cycle_days = lead.get('sales_cycle_days', 0)
-                        perf['ciclo_vendas_medio'] += float(cycle_days) if cycle_days else 0.0
-                        perf['leads_com_ciclo'] += 1
+            vendedores = []
+            if not vendedores_data.empty:
+                df = self._lead_metrics(vendedores_data)
                 
-                if lead.get('status_name') == 'Venda perdida':
-                    perf['vendas_perdidas'] += 1
+                atividade_columns = ['total_atividades', 'atividades_concluidas', 'leads_contactados']
+                if not atividades_data.empty:
+                    df = df.merge(atividades_data[['user_name', 'atividades_user_id'] + atividade_columns],
+                                  on='user_name', how='left')
+                else:
+                    df = df.assign(atividades_user_id=None, **{column: 0 for column in atividade_columns})
+                for column in atividade_columns:
+                    df[column] = pd.to_numeric(df[column]).fillna(0).astype('int64')
                 
-                if lead.get('response_time_hours'):
-                    response_time = lead.get('response_time_hours', 0)
-                    perf['tempo_resposta_medio'] += float(response_time) if response_time else 0.0
-                    perf['leads_com_resposta'] += 1
-            
-            # Calcular médias
-            for user_name, perf in vendedores_performance.items():
-                if perf['leads_com_resposta'] > 0:
-                    perf['tempo_resposta_medio'] = perf['tempo_resposta_medio'] / perf['leads_com_resposta']
-                if perf['leads_com_ciclo'] > 0:
-                    perf['ciclo_vendas_medio'] = perf['ciclo_vendas_medio'] / perf['leads_com_ciclo']
+                # ID real do Kommo (sales_conversions, senão commercial_activities); leads sem
+                # responsável ficam no user_id 0. Vendedor sem ID não tem chave estável e fica de fora
+                if not usuarios_data.empty:
+                    df = df.merge(usuarios_data[['user_name', 'user_id']], on='user_name', how='left')
+                else:
+                    df['user_id'] = None
+                df['user_id'] = pd.to_numeric(df['user_id']).fillna(pd.to_numeric(df['atividades_user_id']))
+                df.loc[df['user_name'].isna(), 'user_id'] = 0
+                sem_id = df['user_id'].isna()
+                if sem_id.any():
+                    logger.warning(f"⚠️ {int(sem_id.sum())} vendedor(es) sem responsible_user_id ignorados: "
+                                   f"{', '.join(df.loc[sem_id, 'user_name'].astype(str))}")
+                    df = df[~sem_id]
+                df['user_id'] = df['user_id'].astype('int64')
+                df = self._merge_duplicate_user_ids(df)
                 
-                # Calcular métricas derivadas
-                total_vendas = perf['vendas_fechadas'] + perf['vendas_perdidas']
-                perf['win_rate'] = (perf['vendas_fechadas'] / total_vendas * 100) if total_vendas > 0 else 0
-                perf['ticket_medio'] = (perf['receita_total'] / perf['vendas_fechadas']) if perf['vendas_fechadas'] > 0 else 0
-                perf['conversion_rate'] = (perf['vendas_fechadas'] / perf['total_leads'] * 100) if perf['total_leads'] > 0 else 0
-            
-            # Adicionar dados de atividades
-            for atividade in atividades_data:
-                user_name = atividade.get('user_name', 'Usuário Desconhecido')
-                if user_name in vendedores_performance:
-                    perf = vendedores_performance[user_name]
-                    perf['total_atividades'] += atividade.get('total_atividades', 0)
-                    perf['atividades_concluidas'] += atividade.get('atividades_concluidas', 0)
-                    perf['leads_contactados'] += atividade.get('leads_contactados', 0)
+                vendedores = self._records(df, [
+                    'user_id', 'user_name', 'user_role', 'total_leads', 'vendas_fechadas',
+                    'vendas_perdidas', 'receita_total', 'tempo_resposta_medio', 'ciclo_vendas_medio',
+                    'leads_com_resposta', 'leads_com_ciclo', 'total_atividades', 'atividades_concluidas',
+                    'leads_contactados', 'win_rate', 'ticket_medio', 'conversion_rate'
+                ])
             
             # 2. PERFORMANCE POR CANAL
-            canais_performance = {}
-            
-            for lead in leads_data:
-                canal = lead.get('canal_origem', 'Não Classificado')
-                utm_source = lead.get('utm_source', '')
-                utm_medium = lead.get('utm_medium', '')
-                
-                # Criar chave única para canal
-                canal_key = f"{canal}|{utm_source}|{utm_medium}"
-                
-                if canal_key not in canais_performance:
-                    canais_performance[canal_key] = {
-                        'canal_origem': canal,
-                        'utm_source': utm_source,
-                        'utm_medium': utm_medium,
-                        'total_leads': 0,
-                        'vendas_fechadas': 0,
-                        'vendas_perdidas': 0,
-                        'receita_total': 0.0,
-                        'custo_total': 0.0,
-                        'tempo_resposta_medio': 0.0,
-                        'leads_com_resposta': 0,
-                        'ciclo_vendas_medio': 0.0,
-                        'leads_com_ciclo': 0
-                    }
-                
-                perf = canais_performance[canal_key]
-                perf['total_leads'] += 1
-                lead_cost = lead.get('lead_cost', 0)
-                perf['custo_total'] += float(lead_cost) if lead_cost else 0.0
-                
-                if lead.get('status_name') == 'Venda ganha':
-                    perf['vendas_fechadas'] += 1
-                    sale_price = lead.get('sale_price', 0)
-                    perf['receita_total'] += float(sale_price) if sale_price else 0.0
-                    if lead.get('sales_cycle_days'):
-                        cycle_days = lead.get('sales_cycle_days', 0)
-                        perf['ciclo_vendas_medio'] += float(cycle_days) if cycle_days else 0.0
-                        perf['leads_com_ciclo'] += 1
+            canais = []
+            if not canais_data.empty:
+                df = self._lead_metrics(canais_data)
+                df['custo_por_lead'] = self._ratio(df['custo_total'], df['total_leads'])
+                df['roi'] = self._ratio(df['receita_total'] - df['custo_total'], df['custo_total'], 100)
                 
-                if lead.get('status_name') == 'Venda perdida':
-                    perf['vendas_perdidas'] += 1
-                
-                if lead.get('response_time_hours'):
-                    response_time = lead.get('response_time_hours', 0)
-                    perf['tempo_resposta_medio'] += float(response_time) if response_time else 0.0
-                    perf['leads_com_resposta'] += 1
-            
-            # Calcular métricas derivadas para canais
-            for canal_key, perf in canais_performance.items():
-                if perf['leads_com_resposta'] > 0:
-                    perf['tempo_resposta_medio'] = perf['tempo_resposta_medio'] / perf['leads_com_resposta']
-                if perf['leads_com_ciclo'] > 0:
-                    perf['ciclo_vendas_medio'] = perf['ciclo_vendas_medio'] / perf['leads_com_ciclo']
-                
-                total_vendas = perf['vendas_fechadas'] + perf['vendas_perdidas']
-                perf['win_rate'] = (perf['vendas_fechadas'] / total_vendas * 100) if total_vendas > 0 else 0
-                perf['conversion_rate'] = (perf['vendas_fechadas'] / perf['total_leads'] * 100) if perf['total_leads'] > 0 else 0
-                perf['custo_por_lead'] = (perf['custo_total'] / perf['total_leads']) if perf['total_leads'] > 0 else 0
-                perf['roi'] = ((perf['receita_total'] - perf['custo_total']) / perf['custo_total'] * 100) if perf['custo_total'] > 0 else 0
-                perf['ticket_medio'] = (perf['receita_total'] / perf['vendas_fechadas']) if perf['vendas_fechadas'] > 0 else 0
+                canais = self._records(df, [
+                    'canal_origem', 'utm_source', 'utm_medium', 'total_leads', 'vendas_fechadas',
+                    'vendas_perdidas', 'receita_total', 'custo_total', 'tempo_resposta_medio',
+                    'leads_com_resposta', 'ciclo_vendas_medio', 'leads_com_ciclo', 'win_rate',
+                    'conversion_rate', 'custo_por_lead', 'roi', 'ticket_medio'
+                ])
             
-            logger.info(f"📊 Transformados: {len(vendedores_performance)} vendedores, {len(canais_performance)} canais")
+            logger.info(f"📊 Transformados: {len(vendedores)} vendedores, {len(canais)} canais")
             
             return {
-                'vendedores': list(vendedores_performance.values()),
-                'canais': list(canais_performance.values())
+                'vendedores': vendedores,
+                'canais': canais
             }
             
         except Exception as e:
@@ -379,123 +386,142 @@ class KommoPerformanceETL:
         except Exception as e:
             logger.error(f"❌ Erro ao criar tabelas: {e}")
 
+    def build_daily_rows(self, records: List[Dict], spread_columns: Dict[str, str]) -> pd.DataFrame:
+        """
+        Distribuir os totais do período pelos últimos LOAD_DAYS dias (mais peso para os
+        dias mais recentes), vetorizado: uma linha por (registro, dia).
+        spread_columns: coluna -> 'int' (truncada, como int()) ou 'float'
+        """
+        base = pd.DataFrame(records)
+        offsets = np.arange(self.LOAD_DAYS)
+        today = datetime.now().date()
+        days = pd.DataFrame({
+            'created_date': [today - timedelta(days=int(i)) for i in offsets],
+            'total_factor': (self.LOAD_DAYS - offsets) / self.LOAD_DAYS
+        })
+
+        daily = base.merge(days, how='cross')
+        for column, kind in spread_columns.items():
+            values = daily[column].to_numpy(dtype='float64') * daily['total_factor'].to_numpy() / self.LOAD_DAYS
+            daily[column] = values.astype('int64') if kind == 'int' else values
+        return daily
+
     def load_performance_data(self, performance_data):
-        """Carregar dados de performance no banco"""
+        """
+        Carregar dados de performance no banco: linhas geradas em arrays e carregadas em blocos
+        (executemany). Vendedores por upsert em (user_id, created_date); canais numa tabela
+        de staging com troca atômica. Em nenhum caso o dashboard vê o período apagado
+        """
         try:
             connection = mysql.connector.connect(**self.db_config)
-            cursor = connection.cursor()
             
-            created_date = datetime.now().date()
-            
-            # Limpar dados existentes dos últimos 30 dias
-            start_date = (datetime.now() - timedelta(days=30)).date()
-            cursor.execute("DELETE FROM performance_vendedores WHERE created_date >= %s", (start_date,))
-            cursor.execute("DELETE FROM performance_canais WHERE created_date >= %s", (start_date,))
-            
-            # Inserir dados de vendedores
-            vendedores_insert = """
-            INSERT INTO performance_vendedores 
-            (user_id, user_name, user_role, total_leads, vendas_fechadas, vendas_perdidas,
-             receita_total, win_rate, conversion_rate, ticket_medio, tempo_resposta_medio,
-             ciclo_vendas_medio, total_atividades, atividades_concluidas, leads_contactados,
-             taxa_conclusao_atividades, created_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
+            # Dados anteriores à janela são preservados; os últimos LOAD_DAYS dias são regravados
+            start_date = (datetime.now() - timedelta(days=self.LOAD_DAYS)).date()
+            keep_where = "created_date < %s"
             
             vendedores_inserted = 0
-            # Inserir dados de performance dos últimos 30 dias
-            for i in range(30):
-                current_date = datetime.now().date() - timedelta(days=i)
+            if performance_data['vendedores']:
+                vendedores = self.build_daily_rows(performance_data['vendedores'], {
+                    'total_leads': 'int', 'vendas_fechadas': 'int', 'vendas_perdidas': 'int',
+                    'receita_total': 'float', 'total_atividades': 'int',
+                    'atividades_concluidas': 'int', 'leads_contactados': 'int'
+                })
+                # Taxa calculada sobre os totais do período (não sobre os valores diários)
+                totais = pd.DataFrame(performance_data['vendedores'])
+                taxa = self._ratio(totais['atividades_concluidas'], totais['total_atividades'], 100)
+                vendedores['taxa_conclusao_atividades'] = np.repeat(taxa.to_numpy(), self.LOAD_DAYS)
                 
-                for vendedor in performance_data['vendedores']:
-                    try:
-                        # Calcular dados proporcionais para cada dia
-                        dias_factor = 30 - i  # Mais peso para dias mais recentes
-                        total_factor = dias_factor / 30
-                        
-                        leads_diarios = int(vendedor['total_leads'] * total_factor / 30)
-                        vendas_diarias = int(vendedor['vendas_fechadas'] * total_factor / 30)
-                        receita_diaria = vendedor['receita_total'] * total_factor / 30
-                        atividades_diarias = int(vendedor['total_atividades'] * total_factor / 30)
-                        
-                        taxa_conclusao = (vendedor['atividades_concluidas'] / vendedor['total_atividades'] * 100) if vendedor['total_atividades'] > 0 else 0
-                        
-                        cursor.execute(vendedores_insert, (
-                            vendedor['user_id'],
-                            vendedor['user_name'],
-                            vendedor['user_role'],
-                            leads_diarios,
-                            vendas_diarias,
-                            int(vendedor['vendas_perdidas'] * total_factor / 30),
-                            receita_diaria,
-                            vendedor['win_rate'],
-                            vendedor['conversion_rate'],
-                            vendedor['ticket_medio'],
-                            vendedor['tempo_resposta_medio'],
-                            vendedor['ciclo_vendas_medio'],
-                            atividades_diarias,
-                            int(vendedor['atividades_concluidas'] * total_factor / 30),
-                            int(vendedor['leads_contactados'] * total_factor / 30),
-                            taxa_conclusao,
-                            current_date
-                        ))
-                        vendedores_inserted += 1
-                    except Exception as e:
-                        logger.warning(f"Erro ao inserir vendedor {vendedor.get('user_name', 'unknown')}: {e}")
-                        continue
-            
-            # Inserir dados de canais
-            canais_insert = """
-            INSERT INTO performance_canais 
-            (canal_origem, utm_source, utm_medium, total_leads, vendas_fechadas, vendas_perdidas,
-             receita_total, custo_total, win_rate, conversion_rate, ticket_medio, custo_por_lead,
-             roi, tempo_resposta_medio, ciclo_vendas_medio, created_date)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
+                # Upsert por (user_id, created_date): o ID é estável entre execuções,
+                # então cada linha é substituída no lugar, sem apagar a janela
+                vendedores_inserted = bulk_load(connection, """
+                INSERT INTO performance_vendedores 
+                (user_id, user_name, user_role, total_leads, vendas_fechadas, vendas_perdidas,
+                 receita_total, win_rate, conversion_rate, ticket_medio, tempo_resposta_medio,
+                 ciclo_vendas_medio, total_atividades, atividades_concluidas, leads_contactados,
+                 taxa_conclusao_atividades, created_date)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    user_name = VALUES(user_name),
+                    user_role = VALUES(user_role),
+                    total_leads = VALUES(total_leads),
+                    vendas_fechadas = VALUES(vendas_fechadas),
+                    vendas_perdidas = VALUES(vendas_perdidas),
+                    receita_total = VALUES(receita_total),
+                    win_rate = VALUES(win_rate),
+                    conversion_rate = VALUES(conversion_rate),
+                    ticket_medio = VALUES(ticket_medio),
+                    tempo_resposta_medio = VALUES(tempo_resposta_medio),
+                    ciclo_vendas_medio = VALUES(ciclo_vendas_medio),
+                    total_atividades = VALUES(total_atividades),
+                    atividades_concluidas = VALUES(atividades_concluidas),
+                    leads_contactados = VALUES(leads_contactados),
+                    taxa_conclusao_atividades = VALUES(taxa_conclusao_atividades)
+                """, vendedores, [
+                    ('user_id', 'int', None),
+                    ('user_name', 'raw', None),
+                    ('user_role', 'raw', None),
+                    ('total_leads', 'int', 0),
+                    ('vendas_fechadas', 'int', 0),
+                    ('vendas_perdidas', 'int', 0),
+                    ('receita_total', 'float', 0.0),
+                    ('win_rate', 'float', 0.0),
+                    ('conversion_rate', 'float', 0.0),
+                    ('ticket_medio', 'float', 0.0),
+                    ('tempo_resposta_medio', 'float', 0.0),
+                    ('ciclo_vendas_medio', 'float', 0.0),
+                    ('total_atividades', 'int', 0),
+                    ('atividades_concluidas', 'int', 0),
+                    ('leads_contactados', 'int', 0),
+                    ('taxa_conclusao_atividades', 'float', 0.0),
+                    ('created_date', 'raw', None)
+                ])
+                
+                # Vendedores que saíram da janela (ou linhas antigas com ID derivado do nome)
+                user_ids = sorted({vendedor['user_id'] for vendedor in performance_data['vendedores']})
+                cursor = connection.cursor()
+                cursor.execute(f"""
+                DELETE FROM performance_vendedores
+                WHERE created_date >= %s AND user_id NOT IN ({', '.join(['%s'] * len(user_ids))})
+                """, (start_date, *user_ids))
+                if cursor.rowcount:
+                    logger.info(f"🧹 {cursor.rowcount} linhas de vendedores fora da janela removidas")
+                connection.commit()
+                cursor.close()
             
             canais_inserted = 0
-            # Inserir dados de performance dos últimos 30 dias
-            for i in range(30):
-                current_date = datetime.now().date() - timedelta(days=i)
+            if performance_data['canais']:
+                canais = self.build_daily_rows(performance_data['canais'], {
+                    'total_leads': 'int', 'vendas_fechadas': 'int', 'vendas_perdidas': 'int',
+                    'receita_total': 'float', 'custo_total': 'float'
+                })
                 
-                for canal in performance_data['canais']:
-                    try:
-                        # Calcular dados proporcionais para cada dia
-                        dias_factor = 30 - i  # Mais peso para dias mais recentes
-                        total_factor = dias_factor / 30
-                        
-                        leads_diarios = int(canal['total_leads'] * total_factor / 30)
-                        vendas_diarias = int(canal['vendas_fechadas'] * total_factor / 30)
-                        receita_diaria = canal['receita_total'] * total_factor / 30
-                        custo_diario = canal['custo_total'] * total_factor / 30
-                        
-                        cursor.execute(canais_insert, (
-                            canal['canal_origem'],
-                            canal['utm_source'] or '',
-                            canal['utm_medium'] or '',
-                            leads_diarios,
-                            vendas_diarias,
-                            int(canal['vendas_perdidas'] * total_factor / 30),
-                            receita_diaria,
-                            custo_diario,
-                            canal['win_rate'],
-                            canal['conversion_rate'],
-                            canal['ticket_medio'],
-                            canal['custo_por_lead'],
-                            canal['roi'],
-                            canal['tempo_resposta_medio'],
-                            canal['ciclo_vendas_medio'],
-                            current_date
-                        ))
-                        canais_inserted += 1
-                    except Exception as e:
-                        logger.warning(f"Erro ao inserir canal {canal.get('canal_origem', 'unknown')}: {e}")
-                        continue
+                canais_inserted = swap_load(connection, 'performance_canais', """
+                INSERT INTO {table} 
+                (canal_origem, utm_source, utm_medium, total_leads, vendas_fechadas, vendas_perdidas,
+                 receita_total, custo_total, win_rate, conversion_rate, ticket_medio, custo_por_lead,
+                 roi, tempo_resposta_medio, ciclo_vendas_medio, created_date)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, canais, [
+                    ('canal_origem', 'raw', None),
+                    ('utm_source', 'str', ''),
+                    ('utm_medium', 'str', ''),
+                    ('total_leads', 'int', 0),
+                    ('vendas_fechadas', 'int', 0),
+                    ('vendas_perdidas', 'int', 0),
+                    ('receita_total', 'float', 0.0),
+                    ('custo_total', 'float', 0.0),
+                    ('win_rate', 'float', 0.0),
+                    ('conversion_rate', 'float', 0.0),
+                    ('ticket_medio', 'float', 0.0),
+                    ('custo_por_lead', 'float', 0.0),
+                    ('roi', 'float', 0.0),
+                    ('tempo_resposta_medio', 'float', 0.0),
+                    ('ciclo_vendas_medio', 'float', 0.0),
+                    ('created_date', 'raw', None)
+                ], keep_where, (start_date,))
             
-            connection.commit()
             logger.info(f"✅ Carregados {vendedores_inserted} vendedores e {canais_inserted} canais no banco")
             
-            cursor.close()
             connection.close()
             
         except Exception as e:
@@ -510,9 +536,9 @@ class KommoPerformanceETL:
             self.create_performance_tables()
             
             # 2. Extrair dados das tabelas existentes
-            raw_data = self.extract_from_existing_tables(days=30)
+            raw_data = self.extract_from_existing_tables(days=self.lookback_days)
             
-            if not raw_data['leads']:
+            if raw_data['vendedores'].empty and raw_data['canais'].empty:
                 logger.warning("⚠️ Nenhum dado de lead encontrado")
                 return
             
@@ -552,6 +578,7 @@ class KommoPerformanceETL:
             
         except Exception as e:
             logger.error(f"❌ Erro no ETL: {e}")
+            raise
 
 if __name__ == "__main__":
     etl = KommoPerformanceETL()
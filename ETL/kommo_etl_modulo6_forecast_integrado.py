@@ -8,6 +8,8 @@ import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
 
+from query_layer import month_bounds
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,6 +17,66 @@ logger = logging.getLogger(__name__)
 load_dotenv()
 
 class KommoForecastIntegradoETL:
+    # Agregados mensais dos Módulos 1 a 5. O mês é filtrado como intervalo
+    # semiaberto [primeiro dia, primeiro dia do mês seguinte), que usa os índices
+    # de data, em vez de DATE_FORMAT(coluna, '%Y-%m') = mes_ano
+    MODULOS_QUERIES = {
+        # MÓDULO 1: Entrada e Origem de Leads
+        'modulo1': """
+        SELECT 
+            COUNT(DISTINCT lead_id) as total_leads,
+            COUNT(DISTINCT CASE WHEN primary_source IS NOT NULL THEN lead_id END) as leads_classificados,
+            COALESCE(AVG(response_time_hours), 0) as tempo_resposta_medio,
+            COALESCE(SUM(lead_cost), 0) as custo_total_leads
+        FROM leads_metrics 
+        WHERE created_date >= %s AND created_date < %s
+        """,
+        # MÓDULO 2: Funil de Conversão
+        'modulo2': """
+        SELECT 
+            COUNT(DISTINCT lead_id) as leads_no_funil,
+            COUNT(DISTINCT CASE WHEN status_name = 'Venda ganha' THEN lead_id END) as vendas_ganhas,
+            COUNT(DISTINCT CASE WHEN status_name = 'Venda perdida' THEN lead_id END) as vendas_perdidas,
+            AVG(time_in_status_hours) as tempo_medio_status
+        FROM funnel_history 
+        WHERE created_at >= %s AND created_at < %s
+        """,
+        # MÓDULO 3: Atividades Comerciais
+        'modulo3': """
+        SELECT 
+            COUNT(DISTINCT entity_id) as leads_contatados,
+            COUNT(DISTINCT user_id) as vendedores_ativos,
+            COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) as atividades_concluidas,
+            COUNT(*) as total_atividades,
+            ROUND(COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) / COUNT(*) * 100, 1) as taxa_conclusao
+        FROM commercial_activities 
+        WHERE created_date >= %s AND created_date < %s
+        """,
+        # MÓDULO 4: Conversão e Receita
+        'modulo4': """
+        SELECT 
+            COUNT(DISTINCT lead_id) as total_negociacoes,
+            COUNT(DISTINCT CASE WHEN status_name = 'Venda ganha' THEN lead_id END) as vendas_fechadas,
+            COUNT(DISTINCT CASE WHEN status_name = 'Venda perdida' THEN lead_id END) as vendas_perdidas,
+            COALESCE(SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price ELSE 0 END), 0) as receita_total,
+            COALESCE(AVG(CASE WHEN status_name = 'Venda ganha' THEN sale_price END), 0) as ticket_medio,
+            ROUND(COUNT(DISTINCT CASE WHEN status_name = 'Venda ganha' THEN lead_id END) / 
+                  NULLIF(COUNT(DISTINCT CASE WHEN status_name IN ('Venda ganha', 'Venda perdida') THEN lead_id END), 0) * 100, 1) as win_rate
+        FROM sales_metrics 
+        WHERE created_date >= %s AND created_date < %s
+        """,
+        # MÓDULO 5: Performance por Pessoa e Canal
+        'modulo5': """
+        SELECT 
+            COUNT(DISTINCT user_id) as vendedores_unicos,
+            COUNT(DISTINCT entity_id) as leads_contactados,
+            COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) as atividades_concluidas,
+            ROUND(COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) / COUNT(*) * 100, 1) as taxa_conclusao_geral
+        FROM commercial_activities 
+        WHERE created_date >= %s AND created_date < %s AND user_id IS NOT NULL
+        """,
+    }
+
     def __init__(self):
         self.db_config = {
             'host': os.getenv('DB_HOST', 'localhost'),
@@ -30,80 +92,17 @@ class KommoForecastIntegradoETL:
             connection = mysql.connector.connect(**self.db_config)
             cursor = connection.cursor()
             
-            # MÓDULO 1: Entrada e Origem de Leads
-            modulo1_query = """
-            SELECT 
-                COUNT(DISTINCT lead_id) as total_leads,
-                COUNT(DISTINCT CASE WHEN primary_source IS NOT NULL THEN lead_id END) as leads_classificados,
-                COALESCE(AVG(response_time_hours), 0) as tempo_resposta_medio,
-                COALESCE(SUM(lead_cost), 0) as custo_total_leads
-            FROM leads_metrics 
-            WHERE DATE_FORMAT(created_date, '%Y-%m') = %s
-            """
-            
-            # MÓDULO 2: Funil de Conversão
-            modulo2_query = """
-            SELECT 
-                COUNT(DISTINCT lead_id) as leads_no_funil,
-                COUNT(DISTINCT CASE WHEN status_name = 'Venda ganha' THEN lead_id END) as vendas_ganhas,
-                COUNT(DISTINCT CASE WHEN status_name = 'Venda perdida' THEN lead_id END) as vendas_perdidas,
-                AVG(time_in_status_hours) as tempo_medio_status
-            FROM funnel_history 
-            WHERE DATE_FORMAT(created_at, '%Y-%m') = %s
-            """
-            
-            # MÓDULO 3: Atividades Comerciais
-            modulo3_query = """
-            SELECT 
-                COUNT(DISTINCT entity_id) as leads_contatados,
-                COUNT(DISTINCT user_id) as vendedores_ativos,
-                COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) as atividades_concluidas,
-                COUNT(*) as total_atividades,
-                ROUND(COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) / COUNT(*) * 100, 1) as taxa_conclusao
-            FROM commercial_activities 
-            WHERE DATE_FORMAT(created_date, '%Y-%m') = %s
-            """
-            
-            # MÓDULO 4: Conversão e Receita
-            modulo4_query = """
-            SELECT 
-                COUNT(DISTINCT lead_id) as total_negociacoes,
-                COUNT(DISTINCT CASE WHEN status_name = 'Venda ganha' THEN lead_id END) as vendas_fechadas,
-                COUNT(DISTINCT CASE WHEN status_name = 'Venda perdida' THEN lead_id END) as vendas_perdidas,
-                COALESCE(SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price ELSE 0 END), 0) as receita_total,
-                COALESCE(AVG(CASE WHEN status_name = 'Venda ganha' THEN sale_price END), 0) as ticket_medio,
-                ROUND(COUNT(DISTINCT CASE WHEN status_name = 'Venda ganha' THEN lead_id END) / 
-                      NULLIF(COUNT(DISTINCT CASE WHEN status_name IN ('Venda ganha', 'Venda perdida') THEN lead_id END), 0) * 100, 1) as win_rate
-            FROM sales_metrics 
-            WHERE DATE_FORMAT(created_date, '%Y-%m') = %s
-            """
-            
-            # MÓDULO 5: Performance por Pessoa e Canal
-            modulo5_query = """
-            SELECT 
-                COUNT(DISTINCT user_id) as vendedores_unicos,
-                COUNT(DISTINCT entity_id) as leads_contactados,
-                COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) as atividades_concluidas,
-                ROUND(COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 THEN 1 END) / COUNT(*) * 100, 1) as taxa_conclusao_geral
-            FROM commercial_activities 
-            WHERE DATE_FORMAT(created_date, '%Y-%m') = %s AND user_id IS NOT NULL
-            """
-            
-            # Executar queries
-            cursor.execute(modulo1_query, (mes_ano,))
-            modulo1 = cursor.fetchone()
-            
-            cursor.execute(modulo2_query, (mes_ano,))
-            modulo2 = cursor.fetchone()
-            
-            cursor.execute(modulo3_query, (mes_ano,))
-            modulo3 = cursor.fetchone()
-            
-            cursor.execute(modulo4_query, (mes_ano,))
-            modulo4 = cursor.fetchone()
+            # Executar queries (mesmo intervalo do mês para todas)
+            month_start, month_end = month_bounds(mes_ano)
+            results = {}
+            for modulo, query in self.MODULOS_QUERIES.items():
+                cursor.execute(query, (month_start, month_end))
+                results[modulo] = cursor.fetchone()
             
-            cursor.execute(modulo5_query, (mes_ano,))
-            modulo5 = cursor.fetchone()
+            modulo1, modulo2, modulo3, modulo4, modulo5 = (
+                results['modulo1'], results['modulo2'], results['modulo3'],
+                results['modulo4'], results['modulo5']
+            )
             
             cursor.close()
             connection.close()
@@ -459,6 +458,7 @@ class KommoForecastIntegradoETL:
             
         except Exception as e:
             logger.error(f"❌ Erro no ETL: {e}")
+            raise
 
 if __name__ == "__main__":
     etl = KommoForecastIntegradoETL()
@@ -0,0 +1,458 @@
+# ETL Rollup do Dashboard - Kommo Analytics
+# Etapa final da execução: materializa tabelas de resumo (dia × fonte × usuário ×
+# status) com todos os KPIs exibidos no dashboard, que passa a ler só estas tabelas
+import os
+import mysql.connector
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import logging
+from dotenv import load_dotenv
+
+from query_layer import ensure_indexes
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+MAIN_PIPELINE_ID = 11146887
+
+# Períodos do seletor do dashboard (DASHBOARD_PERIODS também é lido pelo data_layer)
+DASHBOARD_PERIODS = [int(days) for days in os.getenv('DASHBOARD_PERIODS', '7,15,30').split(',')]
+
+# Faixas de tempo em status usadas na análise de perdas do funil
+TIME_BUCKET_SQL = """
+    CASE
+        WHEN time_in_status_hours <= 24 THEN '0-24h'
+        WHEN time_in_status_hours <= 72 THEN '1-3 dias'
+        WHEN time_in_status_hours <= 168 THEN '3-7 dias'
+        WHEN time_in_status_hours <= 720 THEN '1-4 semanas'
+        ELSE 'Mais de 4 semanas'
+    END"""
+
+# Tabelas de resumo por dia. Médias são guardadas como soma + contagem para
+# continuarem exatas ao somar vários dias
+ROLLUP_TABLES = {
+    'dash_leads_daily': """
+    CREATE TABLE IF NOT EXISTS dash_leads_daily (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_date DATE NOT NULL,
+        primary_source VARCHAR(100) NULL,
+        total_leads INT DEFAULT 0,
+        response_time_sum DECIMAL(14,2) DEFAULT 0,
+        response_time_count INT DEFAULT 0,
+        lead_cost_sum DECIMAL(14,2) DEFAULT 0,
+        lead_cost_count INT DEFAULT 0,
+        leads_won INT DEFAULT 0,
+        leads_lost INT DEFAULT 0,
+        INDEX idx_metric_date_source (metric_date, primary_source)
+    )
+    """,
+    'dash_leads_sales_daily': """
+    CREATE TABLE IF NOT EXISTS dash_leads_sales_daily (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_date DATE NOT NULL,
+        leads_won INT DEFAULT 0,
+        leads_lost INT DEFAULT 0,
+        leads_decided INT DEFAULT 0,
+        won_revenue DECIMAL(15,2) DEFAULT 0,
+        won_price_count INT DEFAULT 0,
+        INDEX idx_metric_date (metric_date)
+    )
+    """,
+    'dash_utm_daily': """
+    CREATE TABLE IF NOT EXISTS dash_utm_daily (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_date DATE NOT NULL,
+        utm_source VARCHAR(255) NULL,
+        utm_medium VARCHAR(255) NULL,
+        utm_campaign VARCHAR(255) NULL,
+        total_leads INT DEFAULT 0,
+        INDEX idx_metric_date (metric_date)
+    )
+    """,
+    'dash_funnel_daily': """
+    CREATE TABLE IF NOT EXISTS dash_funnel_daily (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_date DATE NOT NULL,
+        status_name VARCHAR(255) NULL,
+        status_sort INT NULL,
+        time_bucket VARCHAR(20) NOT NULL,
+        movements INT DEFAULT 0,
+        time_in_status_sum DECIMAL(16,2) DEFAULT 0,
+        time_in_status_count INT DEFAULT 0,
+        INDEX idx_metric_date_status (metric_date, status_name)
+    )
+    """,
+    'dash_activities_daily': """
+    CREATE TABLE IF NOT EXISTS dash_activities_daily (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_date DATE NOT NULL,
+        user_id BIGINT NULL,
+        user_name VARCHAR(255) NULL,
+        user_role VARCHAR(100) NULL,
+        activity_type VARCHAR(20) NULL,
+        total_activities INT DEFAULT 0,
+        followups INT DEFAULT 0,
+        contatos INT DEFAULT 0,
+        reunioes INT DEFAULT 0,
+        emails INT DEFAULT 0,
+        respostas INT DEFAULT 0,
+        concluidas INT DEFAULT 0,
+        followups_alta_prioridade INT DEFAULT 0,
+        followups_media_prioridade INT DEFAULT 0,
+        followups_baixa_prioridade INT DEFAULT 0,
+        followup_urgency_sum INT DEFAULT 0,
+        followup_urgency_count INT DEFAULT 0,
+        followups_no_prazo INT DEFAULT 0,
+        followups_atrasados INT DEFAULT 0,
+        INDEX idx_metric_date_user (metric_date, user_name)
+    )
+    """,
+    'dash_sales_daily': """
+    CREATE TABLE IF NOT EXISTS dash_sales_daily (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        metric_date DATE NOT NULL,
+        closed_date DATE NULL,
+        status_name VARCHAR(255) NULL,
+        status_type VARCHAR(50) NULL,
+        loss_reason VARCHAR(255) NULL,
+        responsible_user_name VARCHAR(255) NULL,
+        responsible_user_role VARCHAR(100) NULL,
+        total_rows INT DEFAULT 0,
+        sale_price_sum DECIMAL(15,2) DEFAULT 0,
+        sale_price_count INT DEFAULT 0,
+        sales_cycle_sum DECIMAL(14,2) DEFAULT 0,
+        sales_cycle_count INT DEFAULT 0,
+        INDEX idx_metric_date_status (metric_date, status_name)
+    )
+    """,
+    # COUNT(DISTINCT ...) não é somável entre dias: as contagens distintas são
+    # materializadas para cada período do seletor do dashboard
+    'dash_period_distinct': """
+    CREATE TABLE IF NOT EXISTS dash_period_distinct (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        period_days INT NOT NULL,
+        metric VARCHAR(50) NOT NULL,
+        dim1 VARCHAR(255) NULL,
+        dim2 VARCHAR(255) NULL,
+        distinct_count INT DEFAULT 0,
+        computed_at DATETIME,
+        INDEX idx_period_metric (period_days, metric)
+    )
+    """,
+}
+
+# Rollups diários: tabela -> (tabelas de origem, INSERT ... SELECT do intervalo [%s, %s))
+DAILY_ROLLUPS = {
+    'dash_leads_daily': (['leads_metrics', 'funnel_history'], f"""
+    INSERT INTO dash_leads_daily (
+        metric_date, primary_source, total_leads, response_time_sum, response_time_count,
+        lead_cost_sum, lead_cost_count, leads_won, leads_lost
+    )
+    SELECT
+        l.created_date,
+        l.primary_source,
+        COUNT(*),
+        COALESCE(SUM(l.response_time_hours), 0),
+        COUNT(l.response_time_hours),
+        COALESCE(SUM(l.lead_cost), 0),
+        COUNT(l.lead_cost),
+        COALESCE(SUM(fh.won), 0),
+        COALESCE(SUM(fh.lost), 0)
+    FROM leads_metrics l
+    LEFT JOIN (
+        SELECT
+            lead_id,
+            MAX(status_name = 'Venda ganha') as won,
+            MAX(status_name = 'Venda perdida') as lost
+        FROM funnel_history
+        WHERE pipeline_id = {MAIN_PIPELINE_ID}
+        GROUP BY lead_id
+    ) fh ON fh.lead_id = l.lead_id
+    WHERE l.created_date >= %s AND l.created_date < %s
+    GROUP BY l.created_date, l.primary_source
+    """),
+    'dash_leads_sales_daily': (['leads_metrics', 'sales_metrics'], """
+    INSERT INTO dash_leads_sales_daily (
+        metric_date, leads_won, leads_lost, leads_decided, won_revenue, won_price_count
+    )
+    SELECT
+        l.created_date,
+        SUM(sm.won),
+        SUM(sm.lost),
+        SUM(sm.decided),
+        COALESCE(SUM(sm.won_revenue), 0),
+        SUM(sm.won_price_count)
+    FROM leads_metrics l
+    JOIN (
+        SELECT
+            lead_id,
+            MAX(status_name = 'Venda ganha') as won,
+            MAX(status_name = 'Venda perdida') as lost,
+            MAX(status_name IN ('Venda ganha', 'Venda perdida')) as decided,
+            SUM(CASE WHEN status_name = 'Venda ganha' THEN sale_price ELSE 0 END) as won_revenue,
+            COUNT(CASE WHEN status_name = 'Venda ganha' THEN sale_price END) as won_price_count
+        FROM sales_metrics
+        GROUP BY lead_id
+    ) sm ON sm.lead_id = l.lead_id
+    WHERE l.created_date >= %s AND l.created_date < %s
+    GROUP BY l.created_date
+    """),
+    'dash_utm_daily': (['leads_metrics'], """
+    INSERT INTO dash_utm_daily (metric_date, utm_source, utm_medium, utm_campaign, total_leads)
+    SELECT created_date, utm_source, utm_medium, utm_campaign, COUNT(*)
+    FROM leads_metrics
+    WHERE created_date >= %s AND created_date < %s
+    AND utm_source IS NOT NULL
+    GROUP BY created_date, utm_source, utm_medium, utm_campaign
+    """),
+    'dash_funnel_daily': (['funnel_history'], f"""
+    INSERT INTO dash_funnel_daily (
+        metric_date, status_name, status_sort, time_bucket, movements,
+        time_in_status_sum, time_in_status_count
+    )
+    SELECT
+        DATE(entry_date),
+        status_name,
+        status_sort,
+        {TIME_BUCKET_SQL} as time_bucket,
+        COUNT(*),
+        COALESCE(SUM(time_in_status_hours), 0),
+        COUNT(time_in_status_hours)
+    FROM funnel_history
+    WHERE pipeline_id = {MAIN_PIPELINE_ID}
+    AND entry_date >= %s AND entry_date < %s
+    GROUP BY DATE(entry_date), status_name, status_sort, time_bucket
+    """),
+    'dash_activities_daily': (['commercial_activities'], """
+    INSERT INTO dash_activities_daily (
+        metric_date, user_id, user_name, user_role, activity_type, total_activities,
+        followups, contatos, reunioes, emails, respostas, concluidas,
+        followups_alta_prioridade, followups_media_prioridade, followups_baixa_prioridade,
+        followup_urgency_sum, followup_urgency_count, followups_no_prazo, followups_atrasados
+    )
+    SELECT
+        created_date,
+        user_id,
+        user_name,
+        user_role,
+        activity_type,
+        COUNT(*),
+        COUNT(CASE WHEN is_follow_up = 1 THEN 1 END),
+        COUNT(CASE WHEN mentions_call = 1 THEN 1 END),
+        COUNT(CASE WHEN mentions_meeting = 1 THEN 1 END),
+        COUNT(CASE WHEN mentions_email = 1 THEN 1 END),
+        COUNT(CASE WHEN activity_type = 'note' AND mentions_response = 1 THEN 1 END),
+        COUNT(CASE WHEN is_completed = 1 OR is_successful = 1 OR completed_at IS NOT NULL THEN 1 END),
+        COUNT(CASE WHEN is_follow_up = 1 AND follow_up_category = 'alta_prioridade' THEN 1 END),
+        COUNT(CASE WHEN is_follow_up = 1 AND follow_up_category = 'media_prioridade' THEN 1 END),
+        COUNT(CASE WHEN is_follow_up = 1 AND follow_up_category = 'baixa_prioridade' THEN 1 END),
+        COALESCE(SUM(CASE WHEN is_follow_up = 1 THEN urgency_score END), 0),
+        COUNT(CASE WHEN is_follow_up = 1 THEN urgency_score END),
+        COUNT(CASE WHEN activity_type = 'task' AND is_follow_up = 1 AND complete_till IS NOT NULL AND complete_till >= created_date THEN 1 END),
+        COUNT(CASE WHEN activity_type = 'task' AND is_follow_up = 1 AND complete_till IS NOT NULL AND complete_till < created_date THEN 1 END)
+    FROM commercial_activities
+    WHERE created_date >= %s AND created_date < %s
+    GROUP BY created_date, user_id, user_name, user_role, activity_type
+    """),
+    'dash_sales_daily': (['sales_metrics'], """
+    INSERT INTO dash_sales_daily (
+        metric_date, closed_date, status_name, status_type, loss_reason,
+        responsible_user_name, responsible_user_role, total_rows,
+        sale_price_sum, sale_price_count, sales_cycle_sum, sales_cycle_count
+    )
+    SELECT
+        created_date,
+        DATE(closed_at),
+        status_name,
+        status_type,
+        loss_reason,
+        responsible_user_name,
+        responsible_user_role,
+        COUNT(*),
+        COALESCE(SUM(sale_price), 0),
+        COUNT(sale_price),
+        COALESCE(SUM(sales_cycle_days), 0),
+        COUNT(sales_cycle_days)
+    FROM sales_metrics
+    WHERE created_date >= %s AND created_date < %s
+    GROUP BY created_date, DATE(closed_at), status_name, status_type, loss_reason,
+             responsible_user_name, responsible_user_role
+    """),
+}
+
+# Contagens distintas por período: métrica -> (tabelas de origem, SELECT dim1, dim2, contagem do intervalo [%s, %s))
+PERIOD_DISTINCT_METRICS = {
+    'vendas_canal_ganhas': (['funnel_history', 'leads_metrics'], """
+    SELECT lm.primary_source, NULL, COUNT(DISTINCT fh.lead_id)
+    FROM funnel_history fh
+    JOIN leads_metrics lm ON fh.lead_id = lm.lead_id
+    WHERE fh.entry_date >= %s AND fh.entry_date < %s
+    AND fh.status_name IN ('Venda ganha', 'Venda perdida')
+    GROUP BY lm.primary_source
+    """),
+    'vendas_canal_perdidas': (['funnel_history', 'leads_metrics'], """
+    SELECT lm.primary_source, NULL, COUNT(DISTINCT fh.lead_id)
+    FROM funnel_history fh
+    JOIN leads_metrics lm ON fh.lead_id = lm.lead_id
+    WHERE fh.entry_date >= %s AND fh.entry_date < %s
+    AND fh.status_name = 'Venda perdida'
+    GROUP BY lm.primary_source
+    """),
+    'funil_leads': (['funnel_history'], f"""
+    SELECT status_name, NULL, COUNT(DISTINCT lead_id)
+    FROM funnel_history
+    WHERE pipeline_id = {MAIN_PIPELINE_ID}
+    AND entry_date >= %s AND entry_date < %s
+    GROUP BY status_name
+    """),
+    'funil_perdas_tempo': (['funnel_history'], f"""
+    SELECT {TIME_BUCKET_SQL} as time_bucket, NULL, COUNT(DISTINCT lead_id)
+    FROM funnel_history
+    WHERE pipeline_id = {MAIN_PIPELINE_ID}
+    AND status_name = 'Venda perdida'
+    AND entry_date >= %s AND entry_date < %s
+    GROUP BY time_bucket
+    """),
+    'motivos_perda': (['sales_metrics'], """
+    SELECT loss_reason, NULL, COUNT(DISTINCT lead_id)
+    FROM sales_metrics
+    WHERE created_date >= %s AND created_date < %s
+    AND status_name = 'Venda perdida'
+    GROUP BY loss_reason
+    """),
+    'atividades_leads': (['commercial_activities'], """
+    SELECT activity_type, NULL, COUNT(DISTINCT entity_id)
+    FROM commercial_activities
+    WHERE created_date >= %s AND created_date < %s
+    GROUP BY activity_type
+    """),
+    'vendedores_leads': (['commercial_activities'], """
+    SELECT user_name, user_role, COUNT(DISTINCT entity_id)
+    FROM commercial_activities
+    WHERE created_date >= %s AND created_date < %s
+    GROUP BY user_name, user_role
+    """),
+}
+
+
+class KommoDashboardRollupETL:
+    def __init__(self):
+        self.db_config = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': int(os.getenv('DB_PORT', 3306)),
+            'user': os.getenv('DB_USER'),
+            'password': os.getenv('DB_PASSWORD'),
+            'database': os.getenv('DB_NAME', 'kommo_analytics')
+        }
+
+        # Dias recalculados a cada execução: cobre o maior período do seletor e o mês corrente
+        self.rollup_days = max(int(os.getenv('DASHBOARD_ROLLUP_DAYS', 40)), max(DASHBOARD_PERIODS) + 1, 32)
+
+    def existing_tables(self, cursor) -> set:
+        cursor.execute("""
+            SELECT TABLE_NAME FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE()
+        """)
+        return {row[0] for row in cursor.fetchall()}
+
+    def rollup_daily(self, cursor, connection, tables: set, start_date, end_date) -> Dict[str, int]:
+        """
+        Recalcular os resumos diários do intervalo [start_date, end_date):
+        apaga os dias do intervalo e reinsere com um INSERT ... SELECT por tabela
+        """
+        rows_by_table = {}
+
+        for table, (sources, insert_select) in DAILY_ROLLUPS.items():
+            missing = [source for source in sources if source not in tables]
+            if missing:
+                logger.warning(f"⚠️ {table} não atualizada: tabelas de origem ausentes ({', '.join(missing)})")
+                continue
+
+            cursor.execute(f"DELETE FROM {table} WHERE metric_date >= %s AND metric_date < %s",
+                           (start_date, end_date))
+            cursor.execute(insert_select, (start_date, end_date))
+            rows_by_table[table] = cursor.rowcount
+            connection.commit()
+
+            logger.info(f"✅ {table}: {cursor.rowcount} linhas ({start_date} até {end_date - timedelta(days=1)})")
+
+        return rows_by_table
+
+    def rollup_period_distinct(self, cursor, connection, tables: set, reference_date) -> int:
+        """
+        Recalcular as contagens distintas de cada período do seletor do dashboard
+        (mesma janela do dashboard: created_date >= hoje - N dias)
+        """
+        computed_at = datetime.now()
+        end_date = reference_date + timedelta(days=1)
+        total = 0
+
+        for metric, (sources, select_query) in PERIOD_DISTINCT_METRICS.items():
+            if any(source not in tables for source in sources):
+                logger.warning(f"⚠️ Contagem distinta {metric} não atualizada: tabelas de origem ausentes")
+                continue
+
+            rows = []
+            for period_days in DASHBOARD_PERIODS:
+                cursor.execute(select_query, (reference_date - timedelta(days=period_days), end_date))
+                rows.extend(
+                    (period_days, metric, dim1, dim2, distinct_count, computed_at)
+                    for dim1, dim2, distinct_count in cursor.fetchall()
+                )
+
+            cursor.execute("DELETE FROM dash_period_distinct WHERE metric = %s", (metric,))
+            if rows:
+                cursor.executemany("""
+                    INSERT INTO dash_period_distinct (period_days, metric, dim1, dim2, distinct_count, computed_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, rows)
+            connection.commit()
+            total += len(rows)
+
+        logger.info(f"✅ dash_period_distinct: {total} linhas para os períodos {DASHBOARD_PERIODS}")
+        return total
+
+    def run_etl(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None):
+        """Executar o rollup do dashboard (por padrão, os últimos DASHBOARD_ROLLUP_DAYS dias)"""
+        connection = None
+        try:
+            logger.info("🚀 === INICIANDO ROLLUP DO DASHBOARD ===")
+
+            today = datetime.now().date()
+            end_day = (end_date.date() if end_date else today) + timedelta(days=1)
+            start_day = start_date.date() if start_date else today - timedelta(days=self.rollup_days)
+
+            connection = mysql.connector.connect(**self.db_config)
+            cursor = connection.cursor()
+
+            for create_table in ROLLUP_TABLES.values():
+                cursor.execute(create_table)
+
+            tables = self.existing_tables(cursor)
+
+            # Índices de data das tabelas de origem (os rollups filtram por intervalo)
+            ensure_indexes(cursor)
+
+            logger.info(f"📊 Resumos diários de {start_day} até {end_day - timedelta(days=1)}...")
+            self.rollup_daily(cursor, connection, tables, start_day, end_day)
+
+            logger.info("🔢 Contagens distintas por período...")
+            self.rollup_period_distinct(cursor, connection, tables, today)
+
+            cursor.close()
+            logger.info("🎉 === ROLLUP DO DASHBOARD CONCLUÍDO ===")
+
+        except Exception as e:
+            logger.error(f"❌ Erro no rollup do dashboard: {e}")
+            raise
+        finally:
+            if connection is not None and connection.is_connected():
+                connection.close()
+
+
+if __name__ == "__main__":
+    etl = KommoDashboardRollupETL()
+    etl.run_etl()
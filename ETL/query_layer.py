@@ -0,0 +1,130 @@
+# Camada de queries compartilhada pelos ETLs - Kommo Analytics
+# Predicados de data como intervalos semiabertos (coluna >= início AND coluna < fim),
+# que usam índice, no lugar de DATE(coluna)/DATE_FORMAT(coluna); índices compostos
+# de cobertura das agregações do dashboard e do forecast; checagem via EXPLAIN
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DateLike = Union[date, datetime]
+
+# Índices compostos por tabela: (nome, colunas). O prefixo é a coluna de data
+# filtrada por intervalo; as demais colunas cobrem os agrupamentos/agregados
+COVERING_INDEXES: Dict[str, List[Tuple[str, Tuple[str, ...]]]] = {
+    'leads_metrics': [
+        ('idx_created_source_cover', ('created_date', 'primary_source', 'response_time_hours',
+                                      'lead_cost', 'lead_value', 'lead_id')),
+    ],
+    'funnel_history': [
+        ('idx_pipeline_entry_status', ('pipeline_id', 'entry_date', 'status_name')),
+        ('idx_created_status_lead', ('created_at', 'status_name', 'lead_id')),
+    ],
+    'commercial_activities': [
+        ('idx_created_user_contact', ('created_date', 'user_id', 'contact_type', 'entity_id',
+                                      'is_completed', 'is_successful')),
+        ('idx_created_user_mentions', ('created_date', 'user_id', 'mentions_call', 'mentions_meeting',
+                                       'mentions_email', 'mentions_response')),
+    ],
+    'sales_conversions': [
+        ('idx_updated_user_pipeline', ('updated_date', 'responsible_user_id', 'pipeline_id')),
+    ],
+    'sales_metrics': [
+        ('idx_created_status', ('created_date', 'status_name', 'lead_id')),
+    ],
+}
+
+
+def _as_date(value: DateLike) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def day_bounds(day: DateLike) -> Tuple[date, date]:
+    """[dia, dia seguinte) - substitui DATE(coluna) = dia"""
+    start = _as_date(day)
+    return start, start + timedelta(days=1)
+
+
+def range_bounds(start_day: DateLike, end_day: DateLike) -> Tuple[date, date]:
+    """[início, fim + 1 dia) - substitui DATE(coluna) BETWEEN início AND fim"""
+    return _as_date(start_day), _as_date(end_day) + timedelta(days=1)
+
+
+def month_bounds(mes_ano: str) -> Tuple[date, date]:
+    """[primeiro dia do mês, primeiro dia do mês seguinte) - substitui DATE_FORMAT(coluna, '%Y-%m') = mes_ano"""
+    year, month = (int(part) for part in mes_ano.split('-')[:2])
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def ensure_indexes(cursor, tables: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Criar os índices de cobertura que ainda não existem (idempotente).
+    Tabelas inexistentes são ignoradas. Retorna os índices criados.
+    """
+    created = []
+    for table in tables or COVERING_INDEXES:
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        if not cursor.fetchone()[0]:
+            continue
+
+        cursor.execute("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """, (table,))
+        existing = {row[0] for row in cursor.fetchall()}
+
+        for index_name, columns in COVERING_INDEXES.get(table, []):
+            if index_name in existing:
+                continue
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({', '.join(columns)})")
+            created.append(f"{table}.{index_name}")
+            logger.info(f"Índice criado: {table}.{index_name} ({', '.join(columns)})")
+
+    return created
+
+
+def ensure_columns(cursor, table: str, columns: Dict[str, str]) -> List[str]:
+    """
+    Adicionar as colunas (nome -> definição) que ainda não existem na tabela
+    (idempotente). Retorna as colunas criadas.
+    """
+    cursor.execute("""
+        SELECT COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+    """, (table,))
+    existing = {row[0] for row in cursor.fetchall()}
+
+    created = []
+    for column, definition in columns.items():
+        if column in existing:
+            continue
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        created.append(column)
+        logger.info(f"Coluna criada: {table}.{column} {definition}")
+
+    return created
+
+
+def explain_full_scans(cursor, query: str, params: Sequence = (), min_rows: int = 1000) -> List[Dict]:
+    """
+    Rodar EXPLAIN e retornar as linhas do plano com varredura completa (type=ALL)
+    que importam: sem nenhum índice utilizável (predicado não-sargável) ou com
+    estimativa de pelo menos min_rows linhas
+    """
+    cursor.execute(f"EXPLAIN {query}", tuple(params))
+    columns = [column[0] for column in cursor.description]
+    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    return [
+        step for step in plan
+        if (step.get('type') or '').upper() == 'ALL'
+        and (not step.get('possible_keys') or (step.get('rows') or 0) >= min_rows)
+    ]
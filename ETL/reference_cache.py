@@ -0,0 +1,173 @@
+# Cache em disco dos dados de referência do Kommo (usuários, pipelines/status, motivos de perda)
+# compartilhado por todos os módulos: snapshot JSON por conta com TTL e revalidação
+# condicional por página (If-None-Match); sem API, usa o último snapshot
+import os
+import json
+import time
+import logging
+import tempfile
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from dotenv import load_dotenv
+
+from kommo_client import DEFAULT_PAGE_LIMIT, KommoClient
+
+# Configurar logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.path.join(PROJECT_ROOT, 'CACHE')
+DEFAULT_TTL_SECONDS = 6 * 3600
+
+# Recurso -> (endpoint, chave em _embedded, paginado)
+REFERENCE_RESOURCES = {
+    'users': ('/api/v4/users', 'users', True),
+    'pipelines': ('/api/v4/leads/pipelines', 'pipelines', False),  # Já traz _embedded.statuses
+    'loss_reasons': ('/api/v4/leads/loss_reasons', 'loss_reasons', True),
+}
+
+
+class ReferenceCache:
+    """
+    Dados de referência do Kommo com cache em disco.
+
+    Dentro do TTL (KOMMO_REFERENCE_CACHE_TTL, em segundos) o snapshot é usado sem
+    nenhuma requisição. Vencido o TTL, cada página é pedida com o ETag guardado
+    dela: 304 reaproveita a página do snapshot, 200 a substitui. Se a API falhar e
+    houver snapshot, ele é usado mesmo vencido, então os módulos iniciam offline.
+    """
+
+    def __init__(self, client: KommoClient, cache_dir: Optional[str] = None, ttl: Optional[float] = None):
+        self.client = client
+        self.cache_dir = cache_dir or os.getenv('KOMMO_REFERENCE_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.ttl = float(ttl if ttl is not None else os.getenv('KOMMO_REFERENCE_CACHE_TTL', DEFAULT_TTL_SECONDS))
+        self.account = urlparse(client.base_url).netloc or 'kommo'
+        self._memory: Dict[str, Dict] = {}
+
+    def _path(self, resource: str) -> str:
+        return os.path.join(self.cache_dir, f"{self.account}_{resource}.json")
+
+    def _read_snapshot(self, resource: str) -> Optional[Dict]:
+        if resource in self._memory:
+            return self._memory[resource]
+        try:
+            with open(self._path(resource), encoding='utf-8') as snapshot_file:
+                return json.load(snapshot_file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_snapshot(self, resource: str, snapshot: Dict):
+        """Gravação atômica (vários módulos podem rodar em paralelo)"""
+        self._memory[resource] = snapshot
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.cache_dir,
+                                             suffix='.tmp', delete=False) as tmp_file:
+                json.dump(snapshot, tmp_file, ensure_ascii=False)
+                tmp_path = tmp_file.name
+            os.replace(tmp_path, self._path(resource))
+        except OSError as e:
+            logger.warning(f"⚠️ Não foi possível gravar o cache de {resource}: {e}")
+
+    def _fetch(self, resource: str, snapshot: Optional[Dict]) -> Dict:
+        """
+        Buscar o recurso na API, revalidando cada página com o ETag dela
+        (If-None-Match): página 304 reaproveita os itens do snapshot, página 200
+        substitui. If-Modified-Since não é usado - nos endpoints de listagem do
+        Kommo ele filtra a resposta às entidades alteradas, e um 200 trocaria o
+        snapshot por esse subconjunto
+        """
+        endpoint, embedded_key, paginated = REFERENCE_RESOURCES[resource]
+
+        # Itens do snapshot por página (snapshots antigos, sem ETag por página, são rebaixados)
+        old_pages: List[List[Dict]] = []
+        old_etags: List[Optional[str]] = (snapshot or {}).get('page_etags') or []
+        if old_etags:
+            offset = 0
+            for size in snapshot.get('page_sizes', []):
+                old_pages.append(snapshot['items'][offset:offset + size])
+                offset += size
+
+        items: List[Dict] = []
+        page_etags: List[Optional[str]] = []
+        page_sizes: List[int] = []
+        not_modified = 0
+        page = 1
+        while True:
+            params = {'limit': DEFAULT_PAGE_LIMIT, 'page': page} if paginated else None
+            cached_page = page <= len(old_pages) and old_etags[page - 1]
+            headers = {'If-None-Match': old_etags[page - 1]} if cached_page else None
+            response = self.client.get(endpoint, params, headers=headers)
+
+            if response.status_code == 304 and cached_page:
+                page_items = old_pages[page - 1]
+                etag = old_etags[page - 1]
+                not_modified += 1
+            elif response.status_code == 204:
+                break
+            else:
+                response.raise_for_status()
+                page_items = response.json().get('_embedded', {}).get(embedded_key, [])
+                etag = response.headers.get('ETag')
+
+            items.extend(page_items)
+            page_etags.append(etag)
+            page_sizes.append(len(page_items))
+            if not paginated or len(page_items) < DEFAULT_PAGE_LIMIT:
+                break
+            page += 1
+
+        if snapshot and not_modified == len(page_sizes) == len(old_pages):
+            logger.info(f"♻️ {resource}: não modificado (304), snapshot revalidado")
+        else:
+            logger.info(f"📥 {resource}: {len(items)} registros carregados da API "
+                        f"({not_modified}/{len(page_sizes)} página(s) com 304)")
+        return {
+            'fetched_at': time.time(),
+            'page_etags': page_etags,
+            'page_sizes': page_sizes,
+            'items': items
+        }
+
+    def get(self, resource: str, force_refresh: bool = False) -> List[Dict]:
+        """
+        Itens do recurso (users, pipelines, loss_reasons). force_refresh revalida
+        com a API mesmo dentro do TTL (ainda condicional ao ETag)
+        """
+        snapshot = self._read_snapshot(resource)
+        if snapshot and not force_refresh and time.time() - snapshot.get('fetched_at', 0) < self.ttl:
+            self._memory[resource] = snapshot
+            return snapshot['items']
+
+        try:
+            snapshot = self._fetch(resource, snapshot)
+        except (requests.RequestException, ValueError) as e:
+            if snapshot is None:
+                raise
+            age_hours = (time.time() - snapshot.get('fetched_at', 0)) / 3600
+            logger.warning(f"⚠️ {resource}: API indisponível ({e}); usando snapshot de {age_hours:.1f}h atrás")
+            self._memory[resource] = snapshot
+            return snapshot['items']
+
+        self._write_snapshot(resource, snapshot)
+        return snapshot['items']
+
+    def users(self, force_refresh: bool = False) -> List[Dict]:
+        return self.get('users', force_refresh)
+
+    def pipelines(self, force_refresh: bool = False) -> List[Dict]:
+        """Pipelines com os status em _embedded.statuses"""
+        return self.get('pipelines', force_refresh)
+
+    def loss_reasons_mapping(self, force_refresh: bool = False) -> Dict[int, str]:
+        """ID do motivo de perda -> nome"""
+        return {
+            reason['id']: reason['name']
+            for reason in self.get('loss_reasons', force_refresh)
+            if reason.get('id') and reason.get('name')
+        }